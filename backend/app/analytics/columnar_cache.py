@@ -0,0 +1,365 @@
+import json
+import os
+import shutil
+import threading
+
+import numpy as np
+from dotenv import load_dotenv
+
+
+load_dotenv()
+COLUMNAR_CACHE_DIR = os.getenv("COLUMNAR_CACHE_DIR", "columnar_cache")
+COLUMNAR_MAX_SEGMENTS = int(os.getenv("COLUMNAR_MAX_SEGMENTS", 16))
+
+
+# ===============================
+# Columnar Cache Layout
+# ===============================
+# One row per match participant, flattened out of match_detail, stored column by column:
+#   <cache_dir>/manifest.json                   segments, dictionaries, match_detail ingested_at watermark
+#   <cache_dir>/segment_<n>/<column>.npy        one array per column and appended segment
+# String columns are dictionary encoded: the .npy holds int32 codes into manifest["dictionaries"][column],
+# codes are stable across appends (new values are added to the end of the dictionary).
+# Segments are memory mapped on load, so a single (compacted) segment is never copied into memory.
+
+# column -> numpy dtype, None for dictionary encoded string columns
+COLUMNS = {
+    "match_id": None,
+    "puuid": None,
+    "champion_name": None,
+    "team_position": None,
+    "champion_id": np.int32,
+    "player_index": np.int8,
+    "kills": np.int32,
+    "deaths": np.int32,
+    "assists": np.int32,
+    "win": np.bool_,
+    "game_creation": np.int64,
+    "game_duration": np.int32,
+    "queue_id": np.int32,
+}
+
+MANIFEST_FILE = "manifest.json"
+# manifests of another version (e.g. the old _id watermark) are rebuilt instead of appended to
+MANIFEST_VERSION = 2
+
+
+def _empty_manifest():
+    return {
+        "version": MANIFEST_VERSION,
+        "segments": [],  # [{"name", "rows"}]
+        "dictionaries": {column: [] for column, dtype in COLUMNS.items() if dtype is None},
+        "watermark": None,  # ISO string of the match_detail ingested_at the cache was read up to
+        # match_id -> ingested_at (ISO) of the matches in the cache that the next incremental read overlaps,
+        # skipped then so they are never appended twice
+        "overlap_match_ids": {},
+        "rows": 0,
+        "next_segment": 0,
+    }
+
+
+def read_manifest(cache_dir=COLUMNAR_CACHE_DIR):
+    """
+    :param cache_dir: directory of the cache
+    :return: the manifest of the cache, an empty manifest if the cache does not exist yet
+    """
+    try:
+        with open(os.path.join(cache_dir, MANIFEST_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return _empty_manifest()
+
+
+def _write_manifest(cache_dir, manifest):
+    # write then rename, readers see either the old or the new manifest, never a partial one
+    path = os.path.join(cache_dir, MANIFEST_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f)
+    os.replace(path + ".tmp", path)
+
+
+def _write_segment(cache_dir, manifest, columns):
+    name = f"segment_{manifest['next_segment']:06d}"
+    manifest["next_segment"] += 1
+    segment_dir = os.path.join(cache_dir, name)
+    os.makedirs(segment_dir, exist_ok=True)
+    for column, values in columns.items():
+        np.save(os.path.join(segment_dir, f"{column}.npy"), values)
+    return name
+
+
+# ===============================
+# Writes
+# ===============================
+
+
+def _encode_rows(rows, dictionaries):
+    # rows -> dict of column arrays, extending the dictionaries with unseen strings
+    lookups = {column: {value: code for code, value in enumerate(values)} for column, values in dictionaries.items()}
+    columns = {}
+    for column, dtype in COLUMNS.items():
+        if dtype is None:
+            lookup, values = lookups[column], dictionaries[column]
+            codes = np.empty(len(rows), dtype=np.int32)
+            for i, row in enumerate(rows):
+                value = row.get(column) or ""
+                code = lookup.get(value)
+                if code is None:
+                    code = lookup[value] = len(values)
+                    values.append(value)
+                codes[i] = code
+            columns[column] = codes
+        else:
+            columns[column] = np.fromiter((row.get(column) or 0 for row in rows), dtype=dtype, count=len(rows))
+    return columns
+
+
+def append_rows(row_chunks, watermark, cache_dir=COLUMNAR_CACHE_DIR, overlap_match_ids=None):
+    """
+    Append participant rows to the cache, one segment per chunk, and move the watermark.
+
+    The manifest (and so the watermark) is only rewritten after every segment is on disk, so an
+    interrupted append leaves the cache as it was and the same rows are appended again next time.
+
+    :param row_chunks: iterable of lists of row dicts keyed by the names in COLUMNS
+    :param watermark: match_detail ingested_at the rows were read up to, stored as an ISO string
+    :param cache_dir: directory of the cache
+    :param overlap_match_ids: dict of match_id -> ingested_at (ISO) replacing manifest["overlap_match_ids"],
+        read once every chunk is consumed so it can be filled while row_chunks is iterated
+    :return: number of rows appended
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    manifest = read_manifest(cache_dir)
+
+    appended = 0
+    for rows in row_chunks:
+        if not rows:
+            continue
+        columns = _encode_rows(rows, manifest["dictionaries"])
+        name = _write_segment(cache_dir, manifest, columns)
+        manifest["segments"].append({"name": name, "rows": len(rows)})
+        appended += len(rows)
+
+    manifest["rows"] += appended
+    if watermark is not None:
+        manifest["watermark"] = watermark.isoformat() if hasattr(watermark, "isoformat") else str(watermark)
+    if overlap_match_ids is not None:
+        manifest["overlap_match_ids"] = overlap_match_ids
+    _write_manifest(cache_dir, manifest)
+    return appended
+
+
+def compact(cache_dir=COLUMNAR_CACHE_DIR, max_segments=COLUMNAR_MAX_SEGMENTS):
+    """
+    Merge every segment into one when there are more than max_segments, so loads memory map a
+    single file per column instead of concatenating many.
+
+    :param cache_dir: directory of the cache
+    :param max_segments: segment count above which the cache is compacted
+    :return: True if the cache was compacted
+    """
+    manifest = read_manifest(cache_dir)
+    if len(manifest["segments"]) <= max_segments:
+        return False
+
+    table = load_table(cache_dir)
+    old_segments = [segment["name"] for segment in manifest["segments"]]
+    name = _write_segment(cache_dir, manifest, {column: np.asarray(values) for column, values in table.columns.items()})
+    manifest["segments"] = [{"name": name, "rows": table.rows}]
+    _write_manifest(cache_dir, manifest)
+    for old_segment in old_segments:
+        shutil.rmtree(os.path.join(cache_dir, old_segment), ignore_errors=True)
+    return True
+
+
+# ===============================
+# Reads
+# ===============================
+
+
+class ColumnarTable:
+    """
+    The cached columns in memory (memory mapped when the cache has a single segment).
+
+    columns: dict of column -> numpy array, codes for dictionary encoded columns
+    dictionaries: dict of column -> numpy array of the strings behind the codes
+    """
+
+    def __init__(self, columns, dictionaries, watermark):
+        self.columns = columns
+        self.dictionaries = dictionaries
+        self.watermark = watermark
+        self.rows = len(next(iter(columns.values()))) if columns else 0
+
+    def code(self, column, value):
+        """
+        :return: the code of value in a dictionary encoded column, -1 if the value never occurs
+        """
+        matches = np.flatnonzero(self.dictionaries[column] == value)
+        return int(matches[0]) if len(matches) else -1
+
+    def mask(self, where=None):
+        """
+        :param where: dict of column -> value or list of values, strings are matched through the dictionary
+        :return: boolean array of the rows matching every condition
+        """
+        mask = np.ones(self.rows, dtype=bool)
+        for column, value in (where or {}).items():
+            values = value if isinstance(value, (list, tuple, set)) else [value]
+            if column in self.dictionaries:
+                values = [self.code(column, v) for v in values]
+            mask &= np.isin(self.columns[column], values)
+        return mask
+
+
+_table_cache = {}  # cache_dir -> (manifest segments, ColumnarTable)
+_table_lock = threading.Lock()
+
+
+def load_table(cache_dir=COLUMNAR_CACHE_DIR):
+    """
+    Load the cache, reusing the table already loaded by this process if no segment was appended since.
+
+    :param cache_dir: directory of the cache
+    :return: ColumnarTable
+    """
+    manifest = read_manifest(cache_dir)
+    key = tuple(segment["name"] for segment in manifest["segments"])
+    with _table_lock:
+        cached = _table_cache.get(cache_dir)
+        if cached and cached[0] == key:
+            return cached[1]
+
+    columns = {}
+    for column, dtype in COLUMNS.items():
+        parts = [np.load(os.path.join(cache_dir, segment, f"{column}.npy"), mmap_mode="r") for segment in key]
+        if len(parts) == 1:
+            columns[column] = parts[0]
+        elif parts:
+            columns[column] = np.concatenate(parts)
+        else:
+            columns[column] = np.empty(0, dtype=dtype or np.int32)
+    dictionaries = {column: np.array(values, dtype=object) for column, values in manifest["dictionaries"].items()}
+    table = ColumnarTable(columns, dictionaries, manifest["watermark"])
+
+    with _table_lock:
+        _table_cache[cache_dir] = (key, table)
+    return table
+
+
+# ===============================
+# Vectorized Queries
+# ===============================
+
+
+def _group_codes(table, by, mask):
+    # one int64 group id per selected row, and the key columns of each group
+    key_codes = [np.asarray(table.columns[column])[mask].astype(np.int64) for column in by]
+    if not key_codes or not len(key_codes[0]):
+        return np.empty(0, dtype=np.int64), [np.empty(0, dtype=np.int64) for _ in by]
+    stacked = np.stack(key_codes)
+    group_keys, group_ids = np.unique(stacked, axis=1, return_inverse=True)
+    return group_ids.reshape(-1), list(group_keys)
+
+
+def _decode(table, column, codes):
+    if column in table.dictionaries:
+        return table.dictionaries[column][codes]
+    return codes
+
+
+def group_stats(table, by=("champion_name",), where=None, min_games=1):
+    """
+    Games, win rate, average kills/deaths/assists and KDA per group, computed with bincount over the
+    selected rows.
+
+    :param table: ColumnarTable from load_table
+    :param by: columns to group by, e.g. ("champion_name",), ("team_position",), ("puuid", "champion_name")
+    :param where: row filter, see ColumnarTable.mask
+    :param min_games: drop groups with fewer games
+    :return: list of dicts (one per group, most games first) with the group columns and
+        games, wins, win_rate, average_kills, average_deaths, average_assists, kda
+    """
+    by = [by] if isinstance(by, str) else list(by)
+    mask = table.mask(where)
+    group_ids, group_keys = _group_codes(table, by, mask)
+    group_count = len(group_keys[0]) if group_keys else 0
+    if not group_count:
+        return []
+
+    def sums(column):
+        return np.bincount(group_ids, weights=np.asarray(table.columns[column])[mask], minlength=group_count)
+
+    games = np.bincount(group_ids, minlength=group_count)
+    wins, kills, deaths, assists = sums("win"), sums("kills"), sums("deaths"), sums("assists")
+    kda = (kills + assists) / np.maximum(deaths, 1)
+
+    keep = np.flatnonzero(games >= min_games)
+    keep = keep[np.argsort(-games[keep], kind="stable")]
+    decoded = [_decode(table, column, keys[keep]) for column, keys in zip(by, group_keys)]
+
+    return [
+        {
+            **{column: values[i].item() if hasattr(values[i], "item") else values[i] for column, values in zip(by, decoded)},
+            "games": int(games[g]),
+            "wins": int(wins[g]),
+            "win_rate": float(wins[g] / games[g]),
+            "average_kills": float(kills[g] / games[g]),
+            "average_deaths": float(deaths[g] / games[g]),
+            "average_assists": float(assists[g] / games[g]),
+            "kda": float(kda[g]),
+        }
+        for i, g in enumerate(keep)
+    ]
+
+
+def percentiles(table, value="kills", q=(50, 90, 99), by=None, where=None, min_games=1):
+    """
+    Percentiles of a numeric column, ladder wide or per group.
+
+    :param table: ColumnarTable from load_table
+    :param value: numeric column, or "kda" for the per game (kills + assists) / max(deaths, 1)
+    :param q: percentiles to compute, 0-100
+    :param by: optional columns to group by
+    :param where: row filter, see ColumnarTable.mask
+    :param min_games: drop groups with fewer games
+    :return: dict of percentile -> value without by, else list of dicts with the group columns,
+        games and one "p<q>" key per percentile
+    """
+    mask = table.mask(where)
+    if value == "kda":
+        values = ((np.asarray(table.columns["kills"])[mask] + np.asarray(table.columns["assists"])[mask])
+                  / np.maximum(np.asarray(table.columns["deaths"])[mask], 1))
+    else:
+        values = np.asarray(table.columns[value])[mask].astype(np.float64)
+
+    if not by:
+        if not len(values):
+            return {}
+        return {p: float(v) for p, v in zip(q, np.percentile(values, q))}
+
+    by = [by] if isinstance(by, str) else list(by)
+    group_ids, group_keys = _group_codes(table, by, mask)
+    if not len(group_ids):
+        return []
+
+    # sort once by (group, value), each group is then a contiguous sorted slice
+    order = np.lexsort((values, group_ids))
+    sorted_values = values[order]
+    games = np.bincount(group_ids, minlength=len(group_keys[0]))
+    ends = np.cumsum(games)
+    starts = ends - games
+
+    keep = np.flatnonzero(games >= min_games)
+    keep = keep[np.argsort(-games[keep], kind="stable")]
+    decoded = [_decode(table, column, keys[keep]) for column, keys in zip(by, group_keys)]
+
+    results = []
+    for i, g in enumerate(keep):
+        group_percentiles = np.percentile(sorted_values[starts[g]:ends[g]], q)
+        results.append({
+            **{column: values_[i].item() if hasattr(values_[i], "item") else values_[i] for column, values_ in zip(by, decoded)},
+            "games": int(games[g]),
+            **{f"p{p}": float(v) for p, v in zip(q, group_percentiles)},
+        })
+    return results
@@ -1,8 +1,16 @@
 import os
+import json
 import httpx
 from dotenv import load_dotenv
 import asyncio
 
+from backend.app.api.http_client import get_client
+from backend.app.instrumentation import increment
+from backend.app.api.rate_limiter import acquire, update_from_response
+from backend.app.api.response_store import MATCH_STORE_ENABLED, get_match_bytes, put_match
+from backend.app.api.validation import (LeaguePayload, SummonerPayload, AccountPayload, MatchIdsPayload,
+                                        MatchDetailPayload, validate_payload)
+
 
 # ===============================
 # Environment Variables Section
@@ -11,9 +19,19 @@ import asyncio
 load_dotenv()
 API_KEY = os.getenv("DEFAULT_RIOT_API_KEY")
 SEASON_START_TIME_UNIX = os.getenv("SEASON_START_TIME_UNIX")
-RATE_LIMIT = float(os.getenv("RATE_LIMIT"))
 MAX_RETRIES = int(os.getenv("MAX_RETRIES"))
 INITIAL_BACKOFF = float(os.getenv("INITIAL_BACKOFF"))
+FETCH_CONCURRENCY = int(os.getenv("FETCH_CONCURRENCY", 20))
+
+APEX_RANKS = ("challenger", "grandmaster", "master")
+
+# platform routing value (league-v4, summoner-v4) -> regional routing value (account-v1, match-v5)
+PLATFORM_ROUTING = {
+    "na1": "americas", "br1": "americas", "la1": "americas", "la2": "americas",
+    "euw1": "europe", "eun1": "europe", "tr1": "europe", "ru": "europe", "me1": "europe",
+    "kr": "asia", "jp1": "asia",
+    "oc1": "sea", "ph2": "sea", "sg2": "sea", "th2": "sea", "tw2": "sea", "vn2": "sea",
+}
 
 
 # ===============================
@@ -40,6 +58,7 @@ async def backoff_api_call(api_func, *args, **kwargs):
         except httpx.HTTPStatusError as e:
             if e.response.status_code == 429:
                 retries += 1
+                increment("riot_api_retries_total", function=api_func.__name__)
                 retry_after = int(e.response.headers.get("Retry-After", backoff))
                 print(f"Rate limited. Retrying after {retry_after} seconds... ({retries}/{MAX_RETRIES})")
                 await asyncio.sleep(retry_after)
@@ -50,6 +69,131 @@ async def backoff_api_call(api_func, *args, **kwargs):
     raise Exception("Max retries exceeded for API call.")
 
 
+def get_routing_region(platform, default="americas"):
+    """
+    :param platform: platform routing value (e.g. "euw1"), case insensitive
+    :param default: returned for a missing or unknown platform
+    :return: the regional routing value that serves the platform's accounts and matches (e.g. "europe")
+    """
+    return PLATFORM_ROUTING.get((platform or "").lower(), default)
+
+
+def get_match_routing_region(match_id, default="americas"):
+    """
+    :param match_id: match-v5 id, prefixed by its platform (e.g. "EUW1_123")
+    :param default: returned when the prefix is not a known platform
+    :return: the regional routing value that serves the match
+    """
+    return get_routing_region(match_id.split("_", 1)[0], default=default)
+
+
+async def riot_get_bytes(region, method, path):
+    """
+    GET a Riot API path using the shared pooled client for the routing region.
+    Waits for app and method rate limit budget before sending, and feeds the
+    rate limit headers of the response back into the limiters.
+
+    :param region: platform or regional routing value (e.g. "na1", "americas")
+    :param method: rate limit method key (see rate_limiter.DEFAULT_METHOD_RATE_LIMITS)
+    :param path: request path and query string, relative to the region's API host
+    :return: the raw API response body (bytes)
+    """
+    await acquire(region, method)
+    client = get_client(region)
+    response = await client.get(path)
+    update_from_response(region, method, response)
+    increment("riot_api_requests_total", method=method, status=response.status_code)
+    increment("riot_api_response_bytes_total", len(response.content), method=method)
+    if response.status_code == 429:
+        increment("riot_api_rate_limited_total", method=method,
+                  limit_type=response.headers.get("X-Rate-Limit-Type", "unknown"))
+    response.raise_for_status()  # Raise an error for bad responses
+    return response.content
+
+
+async def riot_get(region, method, path, payload_type=None):
+    """
+    riot_get_bytes, parsed. With a payload_type the raw bytes are parsed and validated in one pass
+    (see validation.validate_payload), a payload that does not match raises pydantic.ValidationError.
+
+    :param payload_type: validation type of the response (e.g. validation.LeaguePayload), None to only parse
+    :return: the API response (JSON)
+    """
+    payload = await riot_get_bytes(region, method, path)
+    if payload_type is None:
+        return json.loads(payload)
+    return validate_payload(payload_type, payload)
+
+
+async def bounded_call_stream(call, keys, concurrency=FETCH_CONCURRENCY):
+    """
+    Run call(key) once per key, keeping up to `concurrency` calls in flight, and yield
+    results as they complete (not in input order). The rate limiters decide how fast
+    requests actually go out, the concurrency bound only caps how many wait at once.
+
+    A failed call is yielded with its error instead of stopping the remaining keys.
+
+    :param call: function taking a key and returning an awaitable
+    :param keys: iterable or async iterable of keys (e.g. db_match_queue.iter_claimed_match_ids), consumed lazily
+    :param concurrency: maximum number of calls in flight
+    :return: async iterator of (key, result, error) tuples, error is None on success
+    """
+    if hasattr(keys, "__aiter__"):
+        key_iter = aiter(keys)
+
+        async def next_key():
+            return await anext(key_iter, None)
+    else:
+        key_iter = iter(keys)
+
+        async def next_key():
+            return next(key_iter, None)
+
+    pending = {}  # task -> key
+
+    async def schedule():
+        while len(pending) < concurrency:
+            key = await next_key()
+            if key is None:
+                return
+            task = asyncio.create_task(call(key))
+            pending[task] = key
+
+    await schedule()
+    try:
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            finished = [(pending.pop(task), task) for task in done]
+            await schedule()  # refill before handing results to the caller
+            for key, task in finished:
+                if task.exception():
+                    yield key, None, task.exception()
+                else:
+                    yield key, task.result(), None
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def backoff_api_call_stream(api_func, key_name, keys, concurrency=FETCH_CONCURRENCY, **kwargs):
+    """
+    Call api_func through backoff_api_call once per key with bounded concurrency,
+    see bounded_call_stream.
+
+    :param api_func: the asynchronous function to call (e.g., fetch_match_details)
+    :param key_name: name of the keyword argument each key is passed as (e.g., "match_id")
+    :param keys: iterable of keys, consumed lazily
+    :param concurrency: maximum number of calls in flight
+    :param kwargs: keyword arguments shared by every call
+    :return: async iterator of (key, result, error) tuples, error is None on success
+    """
+    def call(key):
+        return backoff_api_call(api_func, **{key_name: key}, **kwargs)
+
+    async for key, result, error in bounded_call_stream(call, keys, concurrency=concurrency):
+        yield key, result, error
+
+
 # ===============================
 # Leagues and Accounts
 # ===============================
@@ -60,11 +204,8 @@ async def fetch_challenger_leagues(queue="RANKED_SOLO_5x5", region="na1", api_ke
         # 30 requests every 10 seconds
         # 500 requests every 10 minutes
 
-    url = f"https://{region}.api.riotgames.com/lol/league/v4/challengerleagues/by-queue/{queue}?api_key={api_key}"
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url)
-        response.raise_for_status()  # Raise an error for bad responses
-        return response.json()
+    path = f"/lol/league/v4/challengerleagues/by-queue/{queue}?api_key={api_key}"
+    return await riot_get(region, "league-v4.challengerleagues", path, LeaguePayload)
 
 
 async def fetch_grandmaster_leagues(queue="RANKED_SOLO_5x5", region="na1", api_key=API_KEY):
@@ -72,11 +213,8 @@ async def fetch_grandmaster_leagues(queue="RANKED_SOLO_5x5", region="na1", api_k
         # 30 requests every 10 seconds
         # 500 requests every 10 minutes
 
-    url = f"https://{region}.api.riotgames.com/lol/league/v4/grandmasterleagues/by-queue/{queue}?api_key={api_key}"
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url)
-        response.raise_for_status()  # Raise an error for bad responses
-        return response.json()
+    path = f"/lol/league/v4/grandmasterleagues/by-queue/{queue}?api_key={api_key}"
+    return await riot_get(region, "league-v4.grandmasterleagues", path, LeaguePayload)
 
 
 async def fetch_master_leagues(queue="RANKED_SOLO_5x5", region="na1", api_key=API_KEY):
@@ -84,11 +222,8 @@ async def fetch_master_leagues(queue="RANKED_SOLO_5x5", region="na1", api_key=AP
         # 30 requests every 10 seconds
         # 500 requests every 10 minutes
 
-    url = f"https://{region}.api.riotgames.com/lol/league/v4/masterleagues/by-queue/{queue}?api_key={api_key}"
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url)
-        response.raise_for_status()  # Raise an error for bad responses
-        return response.json()
+    path = f"/lol/league/v4/masterleagues/by-queue/{queue}?api_key={api_key}"
+    return await riot_get(region, "league-v4.masterleagues", path, LeaguePayload)
 
 
 async def fetch_apex_leagues(apex_rank=None, queue="RANKED_SOLO_5x5", region="na1", api_key=API_KEY):
@@ -112,40 +247,73 @@ async def fetch_apex_leagues(apex_rank=None, queue="RANKED_SOLO_5x5", region="na
         raise ValueError(f"Invalid apex_rank '{apex_rank}'. Must be one of 'challenger', 'grandmaster', or 'master'.")
 
 
+async def fetch_apex_leagues_stream(platforms=("na1",), apex_ranks=APEX_RANKS, queue="RANKED_SOLO_5x5", api_key=API_KEY):
+    """
+    fetch every apex league of every platform at once. Each platform has its own rate limiters,
+    so the whole ladder takes about one request round per platform.
+
+    :param platforms: platform routing values (e.g. ["na1", "euw1", "kr"])
+    :param apex_ranks: subset of APEX_RANKS
+    :param queue:
+    :param api_key:
+    :return: async iterator of ((platform, apex_rank), league_data, error) tuples, error is None on success
+    """
+    keys = [(platform, apex_rank) for platform in platforms for apex_rank in apex_ranks]
+
+    def call(key):
+        platform, apex_rank = key
+        return backoff_api_call(fetch_apex_leagues, apex_rank=apex_rank, queue=queue, region=platform, api_key=api_key)
+
+    async for key, league_data, error in bounded_call_stream(call, keys, concurrency=max(len(keys), 1)):
+        yield key, league_data, error
+
+
 async def fetch_account_ids(region="na1", summoner_id=None, api_key=API_KEY):
     if not summoner_id:
         raise ValueError("Summoner ID cannot be blank.")
 
-    url = f"https://{region}.api.riotgames.com/lol/summoner/v4/summoners/{summoner_id}?api_key={api_key}"
+    path = f"/lol/summoner/v4/summoners/{summoner_id}?api_key={api_key}"
+    return await riot_get(region, "summoner-v4.summoners", path, SummonerPayload)
 
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url)
-        response.raise_for_status()
-        return response.json()
+
+async def fetch_account_ids_stream(summoner_id_platforms=None, concurrency=FETCH_CONCURRENCY, api_key=API_KEY):
+    """
+    resolve many summoners concurrently, each on its own platform, yielding each one as soon as it arrives
+
+    :param summoner_id_platforms: iterable of (summoner_id, platform) tuples, consumed lazily
+    :param concurrency: maximum number of requests in flight
+    :param api_key:
+    :return: async iterator of (summoner_id, account_data, error) tuples, error is None on success
+    """
+    if summoner_id_platforms is None:
+        raise ValueError("Summoner ID list cannot be blank.")
+
+    def call(summoner_id_platform):
+        summoner_id, platform = summoner_id_platform
+        return backoff_api_call(fetch_account_ids, region=platform, summoner_id=summoner_id, api_key=api_key)
+
+    async for (summoner_id, _), account_data, error in bounded_call_stream(call, summoner_id_platforms,
+                                                                           concurrency=concurrency):
+        yield summoner_id, account_data, error
 
 
 async def fetch_game_name_tagline(region="americas", puuid=None, api_key=API_KEY):
-    url = f"https://{region}.api.riotgames.com/riot/account/v1/accounts/by-puuid/{puuid}?api_key={api_key}"
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url)
-        response.raise_for_status()
-        return response.json()
-
-async def fetch_game_name_tagline_all(region="americas", puuid_list=None, api_key=API_KEY):
-    if not puuid_list:
-        raise ValueError("puuid list cannot be blank.")
-    game_name_tagline_all_list = []
-    for puuid in puuid_list:
-        try:
-            api_data = await backoff_api_call(fetch_game_name_tagline, region=region, puuid=puuid, api_key=api_key)
-            game_name_tagline_all_list.append(api_data)
-        except Exception as e:
-            print(f"Error fetching game_name_tagline for player puuid {puuid}: {e}")
-            break
+    path = f"/riot/account/v1/accounts/by-puuid/{puuid}?api_key={api_key}"
+    return await riot_get(region, "account-v1.accounts-by-puuid", path, AccountPayload)
 
-        await asyncio.sleep(RATE_LIMIT)  # Respect rate limiting between requests
+async def fetch_game_name_tagline_stream(region="americas", puuid_list=None, concurrency=FETCH_CONCURRENCY, api_key=API_KEY):
+    """
+    fetch the Riot IDs of many players concurrently, yielding each one as soon as it arrives
 
-    return game_name_tagline_all_list
+    :param region:
+    :param puuid_list: iterable of puuids, consumed lazily
+    :param concurrency: maximum number of requests in flight
+    :param api_key:
+    :return: async iterator of (puuid, account_data, error) tuples, error is None on success
+    """
+    async for puuid, account_data, error in backoff_api_call_stream(fetch_game_name_tagline, "puuid", puuid_list,
+                                                                    concurrency=concurrency, region=region, api_key=api_key):
+        yield puuid, account_data, error
 
 # ===============================
 # Matches
@@ -178,12 +346,8 @@ async def fetch_matches(region="americas", puuid=None, start_time=SEASON_START_T
     if not puuid:
         raise ValueError("Puuid cannot be blank.")
 
-    url = f"https://{region}.api.riotgames.com/lol/match/v5/matches/by-puuid/{puuid}/ids?startTime={start_time}&queue={queue}&start={start}&count={count}&api_key={api_key}"
-
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url)
-        response.raise_for_status()
-        return response.json()
+    path = f"/lol/match/v5/matches/by-puuid/{puuid}/ids?startTime={start_time}&queue={queue}&start={start}&count={count}&api_key={api_key}"
+    return await riot_get(region, "match-v5.ids-by-puuid", path, MatchIdsPayload)
 
 
 async def fetch_matches_all(region="americas", puuid=None, start_time=SEASON_START_TIME_UNIX, queue="420", count="100", api_key=API_KEY):
@@ -209,7 +373,8 @@ async def fetch_matches_all(region="americas", puuid=None, start_time=SEASON_STA
 
     while start_int < 1000: # max get 1000 games from a player
         # list of match ids
-        matches = await fetch_matches(region=region, puuid=puuid, start_time=start_time, queue=queue, start=start_str, count=count, api_key=API_KEY)
+        matches = await backoff_api_call(fetch_matches, region=region, puuid=puuid, start_time=start_time, queue=queue,
+                                         start=start_str, count=count, api_key=api_key)
         # stop early if no matches are in list
         if not matches:
             break
@@ -221,45 +386,96 @@ async def fetch_matches_all(region="americas", puuid=None, start_time=SEASON_STA
         if len(matches_all_list) >= 1000:
             break
 
-        await asyncio.sleep(RATE_LIMIT)
-
     return matches_all_list
 
 
-async def fetch_match_details(region="americas", match_id=None, api_key=API_KEY):
+async def fetch_matches_all_stream(region="americas", puuid_start_times=None, queue="420", count="100",
+                                  concurrency=FETCH_CONCURRENCY, api_key=API_KEY):
+    """
+    crawl the match ids of many players concurrently, yielding each player's ids once all their pages are in
+
+    :param region:
+    :param puuid_start_times: iterable of (puuid, start_time) or (puuid, start_time, region) tuples, consumed lazily,
+        region defaults to the region argument
+    :param queue:
+    :param count:
+    :param concurrency: maximum number of players crawled at once
+    :param api_key:
+    :return: async iterator of (puuid, match_ids, error) tuples, error is None on success
+    """
+    if puuid_start_times is None:
+        raise ValueError("Puuid list cannot be blank.")
+
+    def call(puuid_start_time):
+        puuid, start_time, *player_region = puuid_start_time
+        return fetch_matches_all(region=player_region[0] if player_region else region, puuid=puuid,
+                                 start_time=start_time, queue=queue, count=count, api_key=api_key)
+
+    async for (puuid, *_), match_ids, error in bounded_call_stream(call, puuid_start_times, concurrency=concurrency):
+        yield puuid, match_ids, error
+
+
+async def fetch_match_details(region="americas", match_id=None, api_key=API_KEY, use_store=MATCH_STORE_ENABLED):
+    """
+    get the details of a match, from the local response store when it was downloaded before
+    (see response_store), otherwise from the API, storing the response for next time
+    :param region:
+    :param match_id:
+    :param api_key:
+    :param use_store: read and write the local response store
+    :return:
+    """
     if not match_id:
         raise ValueError("Match ID cannot be blank.")
 
-    url = f"https://{region}.api.riotgames.com/lol/match/v5/matches/{match_id}?api_key={api_key}"
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url)
-        response.raise_for_status()
-        return response.json()
+    if use_store:
+        payload = await asyncio.to_thread(get_match_bytes, match_id)
+        increment("match_store_lookups_total", hit=payload is not None)
+        if payload is not None:
+            return validate_payload(MatchDetailPayload, payload)
+
+    path = f"/lol/match/v5/matches/{match_id}?api_key={api_key}"
+    payload = await riot_get_bytes(region, "match-v5.matches", path)
+    match_details = validate_payload(MatchDetailPayload, payload)  # only valid payloads are stored
+    if use_store:
+        await asyncio.to_thread(put_match, match_id, payload)
+    return match_details
+
+
+async def fetch_match_details_stream(region="americas", match_id_list=None, concurrency=FETCH_CONCURRENCY, api_key=API_KEY):
+    """
+    fetch match details concurrently, yielding each one as soon as it arrives.
+    Each match is fetched from the routing region of its platform prefix.
+
+    :param region: routing region of match ids without a known platform prefix
+    :param match_id_list: iterable or async iterable of match ids, consumed lazily
+    :param concurrency: maximum number of requests in flight
+    :param api_key:
+    :return: async iterator of (match_id, match_details, error) tuples, error is None on success
+    """
+    if match_id_list is None:
+        raise ValueError("Match ID list cannot be blank.")
 
+    def call(match_id):
+        return backoff_api_call(fetch_match_details, region=get_match_routing_region(match_id, default=region),
+                                match_id=match_id, api_key=api_key)
 
-async def fetch_match_details_all(region="americas", match_id_list=None, api_key=API_KEY):
+    async for match_id, match_details, error in bounded_call_stream(call, match_id_list, concurrency=concurrency):
+        yield match_id, match_details, error
+
+
+async def fetch_match_details_all(region="americas", match_id_list=None, concurrency=FETCH_CONCURRENCY, api_key=API_KEY):
     if not match_id_list:
         raise ValueError("Match ID list cannot be blank.")
 
     match_details_all_list = []
 
-    # for match_id in match_id_list:
-    #     match_details = await fetch_match_details(region=region, match_id=match_id, api_key=API_KEY)
-    #     match_details_all_list.append(match_details)
-    #     await asyncio.sleep(RATE_LIMIT)
-    #
-    # return match_details_all_list
-    for match_id in match_id_list:
-        try:
-            # Use backoff_api_call to fetch match details with retry logic
-            match_details = await backoff_api_call(fetch_match_details, region=region, match_id=match_id,
-                                                   api_key=api_key)
-            match_details_all_list.append(match_details)
-        except Exception as e:
-            print(f"Error fetching match details for match ID {match_id}: {e}")
-            break
-
-        await asyncio.sleep(RATE_LIMIT)  # Respect rate limiting between requests
+    async for match_id, match_details, error in fetch_match_details_stream(region=region, match_id_list=match_id_list,
+                                                                           concurrency=concurrency, api_key=api_key):
+        if error:
+            print(f"Error fetching match details for match ID {match_id}: {error}")
+            continue
+        match_details_all_list.append(match_details)
 
     return match_details_all_list
 
@@ -0,0 +1,138 @@
+import os
+from contextlib import asynccontextmanager
+
+import httpx
+from dotenv import load_dotenv
+
+
+# ===============================
+# Environment Variables Section
+# ===============================
+
+load_dotenv()
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", 100))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", 20))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", 30.0))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 5.0))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", 15.0))
+HTTP_POOL_TIMEOUT = float(os.getenv("HTTP_POOL_TIMEOUT", 30.0))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "false").lower() in ("1", "true", "yes")
+
+
+# ===============================
+# Client Registry
+# ===============================
+# One long-lived AsyncClient per routing host (na1, americas, ...) so every
+# request to the same host reuses pooled keep-alive connections.
+# Clients are bound to the event loop they were created in, so services open
+# and close them around each run with client_session().
+# set_transport() swaps the network for another httpx transport (e.g. the fake Riot API of backend/benchmarks).
+
+_clients = {}
+_request_counts = {}
+_transport = None
+
+
+def _http2_available():
+    if not HTTP2_ENABLED:
+        return False
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        print("HTTP2_ENABLED is set but the 'h2' package is not installed, falling back to HTTP/1.1.")
+        return False
+
+
+def _build_client(region):
+    host = f"{region}.api.riotgames.com"
+    _request_counts.setdefault(host, 0)
+
+    async def count_request(request):
+        _request_counts[host] += 1
+
+    return httpx.AsyncClient(
+        base_url=f"https://{host}",
+        http2=_http2_available(),
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(
+            HTTP_READ_TIMEOUT,
+            connect=HTTP_CONNECT_TIMEOUT,
+            pool=HTTP_POOL_TIMEOUT,
+        ),
+        event_hooks={"request": [count_request]},
+        transport=_transport,
+    )
+
+
+def get_client(region):
+    """
+    Return the shared client for a routing region, creating it on first use.
+
+    :param region: platform or regional routing value (e.g. "na1", "americas")
+    :return: httpx.AsyncClient whose base_url is the region's API host
+    """
+    client = _clients.get(region)
+    if client is None or client.is_closed:
+        client = _build_client(region)
+        _clients[region] = client
+    return client
+
+
+def set_transport(transport):
+    """
+    Send every request of the clients created from now on through a custom transport.
+    Call it outside client_session(), clients already open keep their transport until closed.
+
+    :param transport: httpx.AsyncBaseTransport (e.g. httpx.MockTransport), None to go back to the network
+    """
+    global _transport
+    _transport = transport
+
+
+async def close_clients():
+    """
+    Close every pooled client and drop it from the registry.
+    """
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        await client.aclose()
+
+
+def get_pool_stats():
+    """
+    Report per-host request counts and connection pool usage.
+
+    :return: dict keyed by host with requests, connections, idle_connections and http2
+    """
+    stats = {}
+    for region, client in _clients.items():
+        host = f"{region}.api.riotgames.com"
+        # httpx does not expose its pool publicly, read it defensively from httpcore
+        pool = getattr(getattr(client, "_transport", None), "_pool", None)
+        connections = list(getattr(pool, "connections", []))
+        stats[host] = {
+            "requests": _request_counts.get(host, 0),
+            "connections": len(connections),
+            "idle_connections": sum(1 for connection in connections if connection.is_idle()),
+            "http2": any("HTTP/2" in connection.info() for connection in connections),
+        }
+    return stats
+
+
+@asynccontextmanager
+async def client_session():
+    """
+    Keep pooled clients open for the duration of a service run, then close them.
+
+    :return: async context manager yielding get_pool_stats so callers can report pool usage
+    """
+    try:
+        yield get_pool_stats
+    finally:
+        await close_clients()
@@ -0,0 +1,194 @@
+import asyncio
+import os
+import time
+from collections import deque
+
+from dotenv import load_dotenv
+
+
+# ===============================
+# Environment Variables Section
+# ===============================
+
+load_dotenv()
+# "limit:seconds" pairs, same format as the X-App-Rate-Limit header. Defaults to a development key.
+APP_RATE_LIMIT = os.getenv("APP_RATE_LIMIT", "20:1,100:120")
+
+
+# ===============================
+# Default Method Limits
+# ===============================
+# Used until the first response for a method tells us the real limits
+# through the X-Method-Rate-Limit header.
+
+DEFAULT_METHOD_RATE_LIMITS = {
+    "league-v4.challengerleagues": "30:10,500:600",
+    "league-v4.grandmasterleagues": "30:10,500:600",
+    "league-v4.masterleagues": "30:10,500:600",
+    "summoner-v4.summoners": "1600:60",
+    "account-v1.accounts-by-puuid": "1000:60",
+    "match-v5.ids-by-puuid": "2000:10",
+    "match-v5.matches": "2000:10",
+}
+
+
+def parse_rate_limit_header(value):
+    """
+    Parse a Riot rate limit header into (first, seconds) pairs.
+
+    :param value: header such as "20:1,100:120" (limits) or "3:1,40:120" (counts)
+    :return: list of (int, int) tuples, empty if the header is missing
+    """
+    if not value:
+        return []
+    pairs = []
+    for part in value.split(","):
+        first, seconds = part.strip().split(":")
+        pairs.append((int(first), int(seconds)))
+    return pairs
+
+
+# ===============================
+# Buckets
+# ===============================
+
+
+class RateWindow:
+    """
+    Token bucket for one "limit per seconds" window.
+
+    The bucket holds `limit` tokens and every spent token refills exactly `seconds`
+    after it was spent, so no interval of `seconds` ever admits more than `limit` requests.
+    """
+
+    def __init__(self, limit, seconds):
+        self.limit = limit
+        self.seconds = seconds
+        self.spent = deque()  # monotonic timestamps of spent tokens, oldest first
+
+    def _refill(self, now):
+        while self.spent and self.spent[0] <= now - self.seconds:
+            self.spent.popleft()
+
+    def wait_time(self, now):
+        self._refill(now)
+        if len(self.spent) < self.limit:
+            return 0.0
+        return self.spent[-self.limit] + self.seconds - now
+
+    def spend(self, now):
+        self.spent.append(now)
+
+    def sync_count(self, count, now):
+        # The server has seen more requests than we have (e.g. another process shares the key)
+        self._refill(now)
+        while len(self.spent) < count:
+            self.spent.append(now)
+
+
+class RateLimiter:
+    """
+    A set of RateWindows that must all have a token before a request is admitted.
+    """
+
+    def __init__(self, limits):
+        self.windows = [RateWindow(limit, seconds) for limit, seconds in limits]
+        self.blocked_until = 0.0
+
+    def wait_time(self, now):
+        waits = [window.wait_time(now) for window in self.windows]
+        waits.append(self.blocked_until - now)
+        return max(waits)
+
+    def spend(self, now):
+        for window in self.windows:
+            window.spend(now)
+
+    def update_limits(self, limits):
+        if not limits or limits == [(window.limit, window.seconds) for window in self.windows]:
+            return
+        spent_by_seconds = {window.seconds: window.spent for window in self.windows}
+        self.windows = []
+        for limit, seconds in limits:
+            window = RateWindow(limit, seconds)
+            window.spent = spent_by_seconds.get(seconds, deque())
+            self.windows.append(window)
+
+    def update_counts(self, counts, now):
+        windows_by_seconds = {window.seconds: window for window in self.windows}
+        for count, seconds in counts:
+            window = windows_by_seconds.get(seconds)
+            if window:
+                window.sync_count(count, now)
+
+    def block(self, seconds, now):
+        self.blocked_until = max(self.blocked_until, now + seconds)
+
+
+# ===============================
+# Limiter Registry
+# ===============================
+# Riot enforces the application limit per routing region and each method limit
+# per routing region and endpoint, so limiters are keyed the same way.
+
+_app_limiters = {}
+_method_limiters = {}
+
+
+def get_app_limiter(region):
+    if region not in _app_limiters:
+        _app_limiters[region] = RateLimiter(parse_rate_limit_header(APP_RATE_LIMIT))
+    return _app_limiters[region]
+
+
+def get_method_limiter(region, method):
+    key = (region, method)
+    if key not in _method_limiters:
+        _method_limiters[key] = RateLimiter(parse_rate_limit_header(DEFAULT_METHOD_RATE_LIMITS.get(method)))
+    return _method_limiters[key]
+
+
+async def acquire(region, method):
+    """
+    Wait until both the app and method limiters of a region have budget, then spend it.
+
+    :param region: routing region of the request (e.g. "na1", "americas")
+    :param method: method key, see DEFAULT_METHOD_RATE_LIMITS
+    """
+    app_limiter = get_app_limiter(region)
+    method_limiter = get_method_limiter(region, method)
+    while True:
+        now = time.monotonic()
+        wait = max(app_limiter.wait_time(now), method_limiter.wait_time(now))
+        if wait <= 0:
+            app_limiter.spend(now)
+            method_limiter.spend(now)
+            return
+        await asyncio.sleep(wait)
+
+
+def update_from_response(region, method, response):
+    """
+    Correct the limiters of a region from the rate limit headers of a response.
+
+    :param region: routing region the request was sent to
+    :param method: method key the request was admitted under
+    :param response: httpx.Response
+    """
+    now = time.monotonic()
+    headers = response.headers
+    app_limiter = get_app_limiter(region)
+    method_limiter = get_method_limiter(region, method)
+
+    app_limiter.update_limits(parse_rate_limit_header(headers.get("X-App-Rate-Limit")))
+    app_limiter.update_counts(parse_rate_limit_header(headers.get("X-App-Rate-Limit-Count")), now)
+    method_limiter.update_limits(parse_rate_limit_header(headers.get("X-Method-Rate-Limit")))
+    method_limiter.update_counts(parse_rate_limit_header(headers.get("X-Method-Rate-Limit-Count")), now)
+
+    if response.status_code == 429:
+        retry_after = float(headers.get("Retry-After", 1))
+        if headers.get("X-Rate-Limit-Type") == "application":
+            app_limiter.block(retry_after, now)
+        else:
+            # "method" and "service" limits both only affect this endpoint
+            method_limiter.block(retry_after, now)
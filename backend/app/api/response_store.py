@@ -0,0 +1,136 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+
+
+# ===============================
+# Environment Variables Section
+# ===============================
+
+load_dotenv()
+# opt in: the store grows with every match ever downloaded, point MATCH_STORE_DIR at a data volume
+MATCH_STORE_DIR = os.getenv("MATCH_STORE_DIR", "match_store")
+MATCH_STORE_ENABLED = os.getenv("MATCH_STORE_ENABLED", "false").lower() in ("1", "true", "yes")
+MATCH_STORE_COMPRESS_LEVEL = int(os.getenv("MATCH_STORE_COMPRESS_LEVEL", 6))
+
+
+# ===============================
+# Match Response Store
+# ===============================
+# A match-v5 payload never changes once the game is over, so every downloaded response is kept on disk
+# and never requested again:
+#   <store_dir>/<aa>/<bb>/<match_id>.json.gz    raw response bytes, gzip compressed
+#   <store_dir>/index.jsonl                     one line per stored match: match_id, path, sha256, bytes, stored_at
+# aa/bb are the first bytes of sha1(match_id), so the files spread evenly over 65536 directories.
+# Files are written to a temporary name and renamed, a reader never sees a partial payload.
+
+INDEX_FILE = "index.jsonl"
+
+_index_lock = threading.Lock()
+
+
+def _match_path(match_id, store_dir):
+    digest = hashlib.sha1(match_id.encode()).hexdigest()
+    return os.path.join(store_dir, digest[:2], digest[2:4], f"{match_id}.json.gz")
+
+
+def has_match(match_id, store_dir=MATCH_STORE_DIR):
+    return os.path.exists(_match_path(match_id, store_dir))
+
+
+def get_match_bytes(match_id, store_dir=MATCH_STORE_DIR):
+    """
+    :param match_id: match-v5 id (e.g. "NA1_123")
+    :param store_dir: directory of the store
+    :return: the raw response bytes of the match, None if it is not stored
+    """
+    try:
+        with gzip.open(_match_path(match_id, store_dir), "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def get_match(match_id, store_dir=MATCH_STORE_DIR):
+    """
+    :return: the stored match details (parsed JSON), None if the match is not stored
+    """
+    payload = get_match_bytes(match_id, store_dir)
+    return json.loads(payload) if payload is not None else None
+
+
+def put_match(match_id, payload, store_dir=MATCH_STORE_DIR):
+    """
+    Store the raw response bytes of a match, a match that is already stored is left as is.
+
+    :param match_id: match-v5 id (e.g. "NA1_123")
+    :param payload: raw response body (bytes)
+    :param store_dir: directory of the store
+    :return: True if the match was written, False if it was already stored
+    """
+    path = _match_path(match_id, store_dir)
+    if os.path.exists(path):
+        return False
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temporary_path, "wb") as f:
+        f.write(gzip.compress(payload, compresslevel=MATCH_STORE_COMPRESS_LEVEL))
+    os.replace(temporary_path, path)
+
+    entry = {
+        "match_id": match_id,
+        "path": os.path.relpath(path, store_dir),
+        "sha256": hashlib.sha256(payload).hexdigest(),
+        "bytes": len(payload),
+        "stored_at": datetime.now(timezone.utc).isoformat(),
+    }
+    with _index_lock, open(os.path.join(store_dir, INDEX_FILE), "a") as f:
+        f.write(json.dumps(entry) + "\n")
+    return True
+
+
+def iter_stored_match_ids(store_dir=MATCH_STORE_DIR):
+    """
+    Every match id in the store. Read from the index, or from the shard directories when the index
+    is missing (e.g. the store was copied without it).
+
+    :param store_dir: directory of the store
+    :return: iterator of match ids, each once
+    """
+    seen = set()
+    try:
+        with open(os.path.join(store_dir, INDEX_FILE)) as f:
+            for line in f:
+                try:
+                    match_id = json.loads(line)["match_id"]
+                except (ValueError, KeyError):
+                    continue  # a line cut short by an interrupted write
+                if match_id not in seen:
+                    seen.add(match_id)
+                    yield match_id
+        return
+    except FileNotFoundError:
+        pass
+
+    for root, _, files in os.walk(store_dir):
+        for file_name in files:
+            if file_name.endswith(".json.gz"):
+                yield file_name[:-len(".json.gz")]
+
+
+def iter_stored_matches(match_ids=None, store_dir=MATCH_STORE_DIR):
+    """
+    :param match_ids: match ids to read, defaults to every stored match
+    :param store_dir: directory of the store
+    :return: iterator of (match_id, match_details) tuples, match ids that are not stored are skipped
+    """
+    for match_id in match_ids if match_ids is not None else iter_stored_match_ids(store_dir):
+        match_details = get_match(match_id, store_dir)
+        if match_details is not None:
+            yield match_id, match_details
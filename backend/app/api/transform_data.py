@@ -1,6 +1,6 @@
 # Might need to transform the data before storing it in db. Add functionality here as needed
 
-from typing import Dict
+from typing import Dict, List, Optional
 from datetime import datetime
 
 
@@ -9,3 +9,34 @@ def add_timestamps(data: Dict, field: str) -> Dict:
     data[field] = datetime.now()
     return data
 
+
+
+# fields whose changes are kept in league history deltas
+LEAGUE_DELTA_FIELDS = ("leaguePoints", "wins", "losses")
+
+
+def league_snapshot_delta(league: Dict, previous_entries: Optional[List[Dict]]) -> Dict:
+    # History document of a league snapshot relative to the previous one of the same platform and tier:
+    # new players are stored whole, known players only when LEAGUE_DELTA_FIELDS changed (and only those
+    # fields), players who left are listed in removed_summoner_ids. Without a previous snapshot the
+    # full entries are stored as a base.
+    delta = {field: value for field, value in league.items() if field != "entries"}
+    if previous_entries is None:
+        delta["snapshot_type"] = "full"
+        delta["entries"] = league["entries"]
+        delta["removed_summoner_ids"] = []
+        return delta
+
+    previous = {entry["summonerId"]: entry for entry in previous_entries}
+    entries = []
+    for entry in league["entries"]:
+        previous_entry = previous.pop(entry["summonerId"], None)
+        if previous_entry is None:
+            entries.append(entry)
+        elif any(entry.get(field) != previous_entry.get(field) for field in LEAGUE_DELTA_FIELDS):
+            entries.append({"summonerId": entry["summonerId"], **{field: entry.get(field) for field in LEAGUE_DELTA_FIELDS}})
+
+    delta["snapshot_type"] = "delta"
+    delta["entries"] = entries
+    delta["removed_summoner_ids"] = list(previous)
+    return delta
@@ -1,8 +1,21 @@
-from pydantic import BaseModel
+import functools
 from typing import List
-from datetime import datetime
 
-class LeagueEntry(BaseModel):
+from pydantic import ConfigDict, TypeAdapter
+from typing_extensions import NotRequired, TypedDict
+
+# ===============================
+# Riot API Payloads
+# ===============================
+# TypedDicts validated straight from the raw response bytes with validate_json (see riot_get).
+# Validation yields plain dicts that go to Mongo as is, with no model instances and no model_dump copies.
+# Only the fields the services rely on are declared, the rest of each payload is kept untouched (extra="allow").
+
+_PAYLOAD_CONFIG = ConfigDict(extra="allow")
+
+
+class LeagueEntryPayload(TypedDict):
+    __pydantic_config__ = _PAYLOAD_CONFIG
     summonerId: str
     leaguePoints: int
     rank: str
@@ -13,34 +26,82 @@ class LeagueEntry(BaseModel):
     freshBlood: bool
     hotStreak: bool
 
-class League(BaseModel):
+
+class LeaguePayload(TypedDict):
+    __pydantic_config__ = _PAYLOAD_CONFIG
     tier: str
     leagueId: str
     queue: str
     name: str
-    entries: List[LeagueEntry]
-    added_at: datetime
-
-    class Config:
-        json_schema_extra = {
-            "example": {
-                "tier": "Diamond",
-                "leagueId": "123abc",
-                "queue": "RANKED_SOLO_5x5",
-                "name": "The Best League",
-                "entries": [
-                    {
-                        "summonerId": "summoner123",
-                        "leaguePoints": 250,
-                        "rank": "I",
-                        "wins": 150,
-                        "losses": 100,
-                        "veteran": True,
-                        "inactive": False,
-                        "freshBlood": False,
-                        "hotStreak": True
-                    }
-                ],
-                "added_at": "2024-10-11T12:00:00"
-            }
-        }
\ No newline at end of file
+    entries: List[LeagueEntryPayload]
+
+
+class SummonerPayload(TypedDict):
+    __pydantic_config__ = _PAYLOAD_CONFIG
+    id: str
+    accountId: str
+    puuid: str
+    profileIconId: int
+    revisionDate: int
+    summonerLevel: int
+
+
+class AccountPayload(TypedDict):
+    __pydantic_config__ = _PAYLOAD_CONFIG
+    puuid: str
+    gameName: NotRequired[str]
+    tagLine: NotRequired[str]
+
+
+MatchIdsPayload = List[str]
+
+
+class MatchParticipantPayload(TypedDict):
+    __pydantic_config__ = _PAYLOAD_CONFIG
+    puuid: str
+    kills: int
+    deaths: int
+    assists: int
+    championName: str
+    championId: int
+    teamPosition: str
+    win: bool
+
+
+class MatchMetadataPayload(TypedDict):
+    __pydantic_config__ = _PAYLOAD_CONFIG
+    matchId: str
+    participants: List[str]
+
+
+class MatchInfoPayload(TypedDict):
+    __pydantic_config__ = _PAYLOAD_CONFIG
+    gameCreation: int
+    gameDuration: int
+    queueId: int
+    participants: List[MatchParticipantPayload]
+
+
+class MatchDetailPayload(TypedDict):
+    __pydantic_config__ = _PAYLOAD_CONFIG
+    metadata: MatchMetadataPayload
+    info: MatchInfoPayload
+
+
+@functools.cache
+def get_adapter(payload_type):
+    """
+    :param payload_type: one of the payload types above
+    :return: the TypeAdapter of the type, built (and its validator compiled) once per process
+    """
+    return TypeAdapter(payload_type)
+
+
+def validate_payload(payload_type, payload):
+    """
+    :param payload_type: one of the payload types above
+    :param payload: raw JSON response body (bytes)
+    :return: the parsed and validated payload (plain dicts and lists)
+    :raises pydantic.ValidationError: the payload does not match the type
+    """
+    return get_adapter(payload_type).validate_json(payload)
@@ -1,4 +1,22 @@
+import asyncio
+from itertools import islice
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
 from backend.app.db.db_connection import get_db
+from backend.app.db.db_indexes import INDEXES
+from backend.app.instrumentation import increment
+
+
+# Streamed writes (iterables passed to replace_collection_data / upsert_data) are sent in chunks of this size
+WRITE_CHUNK_SIZE = 1000
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
 
 
 def insert_data(db_uri, db_name, collection_name, data):
@@ -7,35 +25,178 @@ def insert_data(db_uri, db_name, collection_name, data):
 
     if isinstance(data, list):
         result = collection.insert_many(data)
+        increment("mongo_documents_written_total", len(result.inserted_ids), collection=collection_name, operation="insert")
         return result.inserted_ids
     else:
         result = collection.insert_one(data)
+        increment("mongo_documents_written_total", collection=collection_name, operation="insert")
         return result.inserted_id
 
 
-def clear_and_insert_data(db_uri, db_name, collection_name, data):
+def insert_data_unordered(db_uri, db_name, collection_name, data):
+    """
+    Bulk insert a list of documents without stopping at the first failure.
+
+    Documents rejected as duplicates (the document already exists) count as written.
+
+    :param db_uri: URI for the MongoDB database connection
+    :param db_name: Name of the database
+    :param collection_name: Name of the collection to insert into
+    :param data: list of documents
+    :return: list of the documents that are now stored in the collection
+    """
     db = get_db(db_uri, db_name)
     collection = db[collection_name]
 
-    # Clear previous entries
-    collection.delete_many({})
+    if not data:
+        return []
 
-    # Insert new data
-    if isinstance(data, list):
-        result = collection.insert_many(data)
-        return result.inserted_ids
-    else:
-        result = collection.insert_one(data)
-        return result.inserted_id
+    try:
+        collection.insert_many(data, ordered=False)
+        written = data
+    except BulkWriteError as e:
+        failed_indexes = {error['index'] for error in e.details['writeErrors'] if error['code'] != 11000}
+        written = [document for index, document in enumerate(data) if index not in failed_indexes]
+    increment("mongo_documents_written_total", len(written), collection=collection_name, operation="insert")
+    return written
 
 
-def get_data(db_uri, db_name, collection_name, filter=None, sort_field=None, limit=None, projection=None, pipeline=None):
+def stamp_current_date(db_uri, db_name, collection_name, key, values, field):
+    """
+    Set a field to the server's current date on the documents that do not have it yet.
+
+    The date is taken by the server when the update is applied ($currentDate), so across concurrent
+    writers it follows the order documents became visible, unlike client generated ObjectIds.
+
+    :param db_uri: URI for the MongoDB database connection
+    :param db_name: Name of the database
+    :param collection_name: Name of the collection to update
+    :param key: field identifying the documents (dotted paths allowed, e.g. "metadata.matchId")
+    :param values: values of key of the documents to stamp
+    :param field: date field to set (e.g. "ingested_at")
+    :return: number of documents stamped
+    """
+    db = get_db(db_uri, db_name)
+    values = list(values)
+    if not values:
+        return 0
+    result = db[collection_name].update_many({key: {"$in": values}, field: {"$exists": False}},
+                                             {"$currentDate": {field: True}})
+    return result.modified_count
+
+
+def replace_collection_data(db_uri, db_name, collection_name, data):
+    """
+    Replace the contents of a collection without readers ever seeing it empty or half written.
+
+    The new documents are written to a staging collection, the target's indexes (and the ones
+    declared in db_indexes.INDEXES) are rebuilt on it, and it is swapped in with an atomic renameCollection (dropTarget).
+
+    :param db_uri: URI for the MongoDB database connection
+    :param db_name: Name of the database
+    :param collection_name: Name of the collection to replace
+    :param data: list (or any iterable, written in chunks) of documents that make up the new contents
+    :return: list of inserted ids
+    """
+    db = get_db(db_uri, db_name)
+    collection = db[collection_name]
+    staging = db[f"{collection_name}__staging"]
+
+    # Leftover from an interrupted run
+    staging.drop()
+
+    inserted_ids = []
+    for chunk in _chunks(data, WRITE_CHUNK_SIZE):
+        inserted_ids.extend(staging.insert_many(chunk, ordered=False).inserted_ids)
+    if not inserted_ids:
+        db.create_collection(staging.name)
+
+    # Build indexes after the bulk insert, it is faster than maintaining them during it
+    for index_name, index_info in collection.index_information().items():
+        if index_name == '_id_':
+            continue
+        options = {key: value for key, value in index_info.items() if key not in ('key', 'v', 'ns')}
+        staging.create_index(index_info['key'], name=index_name, **options)
+    if INDEXES.get(collection_name):
+        staging.create_indexes(INDEXES[collection_name])
+
+    staging.rename(collection_name, dropTarget=True)
+    increment("mongo_documents_written_total", len(inserted_ids), collection=collection_name, operation="replace")
+    return inserted_ids
+
+
+def _get_field(document, dotted_key):
+    value = document
+    for part in dotted_key.split('.'):
+        value = value[part]
+    return value
+
+
+def upsert_data(db_uri, db_name, collection_name, data, key, set_on_insert=None):
+    """
+    Idempotently upsert documents keyed on a natural key with one unordered bulk_write.
+
+    Fields are written with $set, so documents whose values did not change are matched but not
+    modified (no write, no oplog entry).
+
+    :param db_uri: URI for the MongoDB database connection
+    :param db_name: Name of the database
+    :param collection_name: Name of the collection to upsert into
+    :param data: list (or any iterable, written in chunks) of documents
+    :param key: field (dotted paths allowed, e.g. "metadata.matchId") or list of fields identifying a document
+    :param set_on_insert: fields only written when the document is first inserted (e.g. "inserted_at"),
+        with every field listed existing documents are left untouched
+    :return: dict with matched, modified and upserted counts
+    """
+    db = get_db(db_uri, db_name)
+    collection = db[collection_name]
+
+    keys = [key] if isinstance(key, str) else list(key)
+    set_on_insert = set(set_on_insert or [])
+
+    counts = {"matched": 0, "modified": 0, "upserted": 0}
+    for chunk in _chunks(data, WRITE_CHUNK_SIZE):
+        operations = []
+        for document in chunk:
+            key_filter = {field: _get_field(document, field) for field in keys}
+            update = {}
+            set_fields = {field: value for field, value in document.items()
+                          if field != '_id' and field not in set_on_insert}
+            if set_fields:
+                update["$set"] = set_fields
+            insert_only = {field: value for field, value in document.items() if field in set_on_insert}
+            if insert_only:
+                update["$setOnInsert"] = insert_only
+            operations.append(UpdateOne(key_filter, update, upsert=True))
+
+        result = collection.bulk_write(operations, ordered=False)
+        counts["matched"] += result.matched_count
+        counts["modified"] += result.modified_count
+        counts["upserted"] += result.upserted_count
+    increment("mongo_documents_written_total", counts["modified"] + counts["upserted"], collection=collection_name,
+              operation="upsert")
+    return counts
+
+
+def iter_data(db_uri, db_name, collection_name, filter=None, sort_field=None, limit=None, projection=None, pipeline=None,
+              batch_size=None, allow_disk_use=False, chunk_size=None):
+    """
+    Stream the results of a find or aggregation instead of loading them all into memory.
+
+    :param batch_size: documents per round trip to the server (driver default if None)
+    :param allow_disk_use: let aggregation stages ($sort, $group, ...) spill to disk past their memory limit
+    :param chunk_size: yield lists of up to chunk_size documents instead of single documents
+    :return: iterator of documents (or of lists of documents when chunk_size is set)
+    """
     db = get_db(db_uri, db_name)
     collection = db[collection_name]
 
     # If a pipeline is provided, use it for aggregation
     if pipeline:
-        cursor = collection.aggregate(pipeline)
+        options = {"allowDiskUse": allow_disk_use}
+        if batch_size:
+            options["batchSize"] = batch_size
+        cursor = collection.aggregate(pipeline, **options)
     else:
         # Apply the filter, sort, and limit if specified
         cursor = collection.find(filter, projection)
@@ -43,8 +204,46 @@ def get_data(db_uri, db_name, collection_name, filter=None, sort_field=None, lim
             cursor = cursor.sort(*sort_field)
         if limit:
             cursor = cursor.limit(limit)
+        if batch_size:
+            cursor = cursor.batch_size(batch_size)
+
+    with cursor:
+        if chunk_size:
+            yield from _chunks(cursor, chunk_size)
+        else:
+            yield from cursor
+
+
+async def aiter_data(db_uri, db_name, collection_name, chunk_size=1000, chunked=False, **kwargs):
+    """
+    Async variant of iter_data. Each chunk is pulled from the cursor in a worker thread, so the
+    event loop keeps running while waiting on the database.
 
-    return list(cursor)
+    :param chunk_size: documents fetched per worker thread hop
+    :param chunked: yield lists of documents instead of single documents
+    :param kwargs: any other iter_data argument
+    :return: async iterator of documents (or of lists of documents when chunked)
+    """
+    iterator = iter_data(db_uri, db_name, collection_name, chunk_size=chunk_size, **kwargs)
+    try:
+        while True:
+            chunk = await asyncio.to_thread(next, iterator, None)
+            if chunk is None:
+                return
+            if chunked:
+                yield chunk
+            else:
+                for document in chunk:
+                    yield document
+    finally:
+        iterator.close()
+
+
+def get_data(db_uri, db_name, collection_name, filter=None, sort_field=None, limit=None, projection=None, pipeline=None,
+             batch_size=None, allow_disk_use=False):
+    return list(iter_data(db_uri, db_name, collection_name, filter=filter, sort_field=sort_field, limit=limit,
+                          projection=projection, pipeline=pipeline, batch_size=batch_size,
+                          allow_disk_use=allow_disk_use))
 
 
 def clear_collection_data(db_uri, db_name, collection_name):
@@ -64,6 +263,32 @@ def clear_collection_data(db_uri, db_name, collection_name):
     return result.deleted_count  # Returns the number of documents deleted
 
 
+def remove_duplicates(db_uri, db_name, collection_name, key):
+    """
+    Keep one document (the first inserted) per value of key and delete the others.
+
+    :param db_uri: URI for the MongoDB database connection
+    :param db_name: Name of the database
+    :param collection_name: Name of the collection to dedupe
+    :param key: field whose values must be unique
+    :return: number of documents deleted
+    """
+    db = get_db(db_uri, db_name)
+    collection = db[collection_name]
+
+    pipeline = [
+        {"$sort": {"_id": 1}},
+        {"$group": {"_id": f"${key}", "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+    ]
+    duplicate_ids = (_id for group in collection.aggregate(pipeline, allowDiskUse=True) for _id in group["ids"][1:])
+
+    deleted = 0
+    for chunk in _chunks(duplicate_ids, WRITE_CHUNK_SIZE):
+        deleted += collection.delete_many({"_id": {"$in": chunk}}).deleted_count
+    return deleted
+
+
 def remove_records(db_uri, db_name, collection_name, data, unique_id):
     db = get_db(db_uri, db_name)
     collection = db[collection_name]
@@ -1,21 +1,156 @@
+import atexit
 import os
+import threading
 
-from pymongo import MongoClient
+from pymongo import MongoClient, monitoring
 from dotenv import load_dotenv
 
+from backend.app.instrumentation import increment
+
 
 load_dotenv()
 # MONGO_DB_URI = os.getenv("MONGO_URI")
 # MONGO_DB_NAME = os.getenv("MONGO_DB_NAME")
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", 100))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", 0))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", 10000))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", 30000))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", 0)) or None  # 0 means no timeout
+MONGO_COMPRESSORS = os.getenv("MONGO_COMPRESSORS", "")  # e.g. "zstd,snappy,zlib"
+MONGO_READ_PREFERENCE = os.getenv("MONGO_READ_PREFERENCE", "primary")
+
+
+# ===============================
+# Metrics
+# ===============================
+# Registered on every client so the pool/command counters cover all of db_actions and db_queries.
+# Counters also go to instrumentation (mongo_commands_total, mongo_connections_created_total, ...) and are
+# exported with every service run, the pool gauges are read with get_db_metrics.
+
+
+class _MetricsListener(monitoring.CommandListener, monitoring.ConnectionPoolListener):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.commands = {}  # command name -> {"count", "failed", "total_ms"}
+        self.connections_created = 0
+        self.connections_closed = 0
+        self.connections_checked_out = 0
+        self.checkout_failures = 0
+
+    def _record(self, event, failed):
+        with self._lock:
+            stats = self.commands.setdefault(event.command_name, {"count": 0, "failed": 0, "total_ms": 0.0})
+            stats["count"] += 1
+            stats["failed"] += int(failed)
+            stats["total_ms"] += event.duration_micros / 1000
+        increment("mongo_commands_total", command=event.command_name)
+        increment("mongo_command_seconds_total", event.duration_micros / 1e6, command=event.command_name)
+        if failed:
+            increment("mongo_command_failures_total", command=event.command_name)
+
+    # CommandListener
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._record(event, failed=False)
+
+    def failed(self, event):
+        self._record(event, failed=True)
+
+    # ConnectionPoolListener
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        with self._lock:
+            self.connections_created += 1
+        increment("mongo_connections_created_total")
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.connections_closed += 1
+        increment("mongo_connections_closed_total")
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.checkout_failures += 1
+        increment("mongo_connection_checkout_failures_total")
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.connections_checked_out += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.connections_checked_out -= 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "connections_open": self.connections_created - self.connections_closed,
+                "connections_in_use": self.connections_checked_out,
+                "connections_created": self.connections_created,
+                "checkout_failures": self.checkout_failures,
+                "commands": {name: dict(stats) for name, stats in self.commands.items()},
+            }
+
+
+# ===============================
+# Client Registry
+# ===============================
+# MongoClient is thread safe and owns a connection pool plus monitor threads,
+# so one client per URI is shared by the whole process instead of one per call.
+
+_clients = {}
+_listeners = {}
+_clients_lock = threading.Lock()
+
+
+def _client_options():
+    options = {
+        "maxPoolSize": MONGO_MAX_POOL_SIZE,
+        "minPoolSize": MONGO_MIN_POOL_SIZE,
+        "connectTimeoutMS": MONGO_CONNECT_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "socketTimeoutMS": MONGO_SOCKET_TIMEOUT_MS,
+        "readPreference": MONGO_READ_PREFERENCE,
+    }
+    if MONGO_COMPRESSORS:
+        options["compressors"] = MONGO_COMPRESSORS
+    return options
+
 
 # Helper
 def get_db_client(db_uri):
-    try:
-        client = MongoClient(db_uri)
+    with _clients_lock:
+        client = _clients.get(db_uri)
+        if client is not None:
+            return client
+        try:
+            listener = _MetricsListener()
+            client = MongoClient(db_uri, event_listeners=[listener], **_client_options())
+        except Exception as e:
+            print(f"Failed to connect to MongoDB uri: {e}")
+            return None
+        _clients[db_uri] = client
+        _listeners[db_uri] = listener
         return client
-    except Exception as e:
-        print(f"Failed to connect to MongoDB uri: {e}")
-        return None
 
 # Use this one
 def get_db(db_uri, db_name):
@@ -23,4 +158,34 @@ def get_db(db_uri, db_name):
     if client:
         return client[db_name]
     else:
-        raise Exception("Could not connect to MongoDB db_name")
\ No newline at end of file
+        raise Exception("Could not connect to MongoDB db_name")
+
+
+def get_db_metrics():
+    """
+    Pool and command metrics for every cached client.
+
+    :return: dict keyed by client address (host:port list) with the counters of each client
+    """
+    with _clients_lock:
+        items = list(_clients.items())
+    metrics = {}
+    for db_uri, client in items:
+        nodes = ",".join(f"{host}:{port}" for host, port in client.topology_description.server_descriptions())
+        metrics[nodes or "unknown"] = _listeners[db_uri].snapshot()
+    return metrics
+
+
+def close_db_clients():
+    """
+    Close every cached client, releasing its pooled connections and monitor threads.
+    """
+    with _clients_lock:
+        clients = list(_clients.values())
+        _clients.clear()
+        _listeners.clear()
+    for client in clients:
+        client.close()
+
+
+atexit.register(close_db_clients)
@@ -0,0 +1,145 @@
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+from backend.app.db.db_connection import get_db
+
+
+# ===============================
+# Index Registry
+# ===============================
+# Every index a collection needs, declared next to the query that needs it.
+# ensure_indexes() applies them idempotently (create_indexes is a no-op for existing indexes).
+
+INDEXES = {
+    'league': [
+        # snapshot history of one platform and tier, newest first
+        IndexModel([("platform", ASCENDING), ("tier", ASCENDING), ("added_at", DESCENDING)]),
+    ],
+    'league_latest': [
+        # upsert_data key of update_league_data, get_recent_players
+        IndexModel([("tier", ASCENDING), ("platform", ASCENDING)], unique=True),
+    ],
+    'player_ids': [
+        IndexModel([("puuid", ASCENDING)]),
+        IndexModel([("summonerId", ASCENDING)]),
+    ],
+    'summoner_cache': [
+        # get_summoner_cache and upsert_data key
+        IndexModel([("summonerId", ASCENDING)], unique=True),
+    ],
+    'game_name_taglines': [
+        # upsert_data key
+        IndexModel([("puuid", ASCENDING)], unique=True),
+    ],
+    'match_id': [
+        # upsert_data key
+        IndexModel([("match_id", ASCENDING)], unique=True),
+    ],
+    'match_id_crawl': [
+        # upsert_data key
+        IndexModel([("puuid", ASCENDING)], unique=True),
+    ],
+    'processed_match_id': [
+        # get_processed_match_ids: covered by the index
+        IndexModel([("processed_with_api_call", ASCENDING), ("match_id", ASCENDING)]),
+        # upsert_data key of the processed markers, remove_records by match_id.
+        # Databases written before it was unique need the dedupe_processed_match_id migration first
+        IndexModel([("match_id", ASCENDING)], unique=True),
+    ],
+    'match_queue': [
+        IndexModel([("match_id", ASCENDING)], unique=True),
+        # claim_match_ids: pending, or leased with an expired lease
+        IndexModel([("status", ASCENDING), ("lease_expires_at", ASCENDING)]),
+    ],
+    'match_detail': [
+        IndexModel([("metadata.matchId", ASCENDING)], unique=True),
+        # get_match_detail_from_puuid: multikey index over the participants array
+        IndexModel([("metadata.participants", ASCENDING)]),
+        # incremental readers of match_detail: ingest time range and its maximum
+        IndexModel([("ingested_at", ASCENDING)]),
+    ],
+    'match_detail_archive': [
+        # archive_match_details upsert key, get_full_match_details
+        IndexModel([("match_id", ASCENDING)], unique=True),
+    ],
+    'player_matches_stats': [
+        # get_player_summarized_stats
+        IndexModel([("puuid", ASCENDING)]),
+        # upsert_data key of update_player_matches_stats
+        IndexModel([("match_id", ASCENDING), ("puuid", ASCENDING)], unique=True),
+        # materialize_player_summarized_stats: players with rows changed since the last refresh
+        IndexModel([("updated_at", ASCENDING)]),
+    ],
+    'player_summarized_stats': [
+        # get_player_summarized_stats_last_refresh
+        IndexModel([("refreshed_at", DESCENDING)]),
+    ],
+}
+
+
+# Representative filters/sorts of the queries in db_queries, used to check for collection scans
+QUERY_SHAPES = [
+    ('league_latest', {"tier": {"$in": ["CHALLENGER", "GRANDMASTER", "MASTER"]}}, None),
+    ('processed_match_id', {"processed_with_api_call": True}, None),
+    ('match_queue', {"status": "pending"}, None),
+    ('match_detail', {"metadata.participants": ""}, None),
+    ('match_detail', {"metadata.matchId": ""}, None),
+    ('player_matches_stats', {"puuid": ""}, None),
+    ('game_name_taglines', {"puuid": ""}, None),
+]
+
+
+def ensure_indexes(db_uri, db_name, collection_names=None):
+    """
+    Create the declared indexes of each collection if they do not exist yet.
+
+    A failing index (e.g. a unique index over existing duplicates) is reported and skipped
+    instead of stopping the remaining collections.
+
+    :param db_uri: URI for the MongoDB database connection
+    :param db_name: Name of the database
+    :param collection_names: collections to apply, defaults to every collection in INDEXES
+    :return: dict of collection name -> list of index names created or confirmed
+    """
+    db = get_db(db_uri, db_name)
+
+    applied = {}
+    for collection_name in collection_names or INDEXES:
+        applied[collection_name] = []
+        for index in INDEXES.get(collection_name, []):
+            try:
+                applied[collection_name].extend(db[collection_name].create_indexes([index]))
+            except OperationFailure as e:
+                print(f"Failed to create index {index.document['name']} on {collection_name}: {e}")
+    return applied
+
+
+def _has_collection_scan(plan):
+    if isinstance(plan, dict):
+        if plan.get("stage") == "COLLSCAN":
+            return True
+        return any(_has_collection_scan(value) for value in plan.values())
+    if isinstance(plan, list):
+        return any(_has_collection_scan(value) for value in plan)
+    return False
+
+
+def report_collection_scans(db_uri, db_name):
+    """
+    Explain each query shape in QUERY_SHAPES and report the ones that fall back to a collection scan.
+
+    :param db_uri: URI for the MongoDB database connection
+    :param db_name: Name of the database
+    :return: list of (collection_name, filter, sort) shapes whose winning plan is a COLLSCAN
+    """
+    db = get_db(db_uri, db_name)
+
+    collection_scans = []
+    for collection_name, query_filter, sort in QUERY_SHAPES:
+        cursor = db[collection_name].find(query_filter)
+        if sort:
+            cursor = cursor.sort(sort)
+        plan = cursor.explain().get("queryPlanner", {}).get("winningPlan", {})
+        if _has_collection_scan(plan):
+            collection_scans.append((collection_name, query_filter, sort))
+    return collection_scans
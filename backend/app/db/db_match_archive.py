@@ -0,0 +1,245 @@
+import gzip
+import json
+import os
+from datetime import datetime, timezone
+
+from bson import Binary
+from dotenv import load_dotenv
+from pymongo import UpdateOne, ReplaceOne
+
+from backend.app.api.response_store import MATCH_STORE_ENABLED, get_match, put_match
+from backend.app.db.db_actions import WRITE_CHUNK_SIZE, _chunks
+from backend.app.db.db_connection import get_db
+from backend.app.db.db_queries import PLAYER_STATS_FIELDS, MATCH_ROW_FIELDS
+
+
+load_dotenv()
+MATCH_DETAIL_TRIM = os.getenv("MATCH_DETAIL_TRIM", "true").lower() in ("1", "true", "yes")
+# extra dotted paths kept in match_detail on top of MATCH_DETAIL_FIELDS, e.g. "info.participants.challenges.kda"
+MATCH_DETAIL_EXTRA_FIELDS = [field.strip() for field in os.getenv("MATCH_DETAIL_EXTRA_FIELDS", "").split(",") if field.strip()]
+
+
+# ===============================
+# Match Detail Schema
+# ===============================
+# match_detail keeps only the declared fields below (what db_queries reads plus a few match and
+# participant summaries). The full match-v5 payload is kept cold, compressed, in exactly one place:
+# the local response store (api/response_store.py) when MATCH_STORE_ENABLED, which fetch_match_details
+# already fills, otherwise 'match_detail_archive':
+#   {match_id, payload: <gzip of the JSON>, bytes, archived_at}
+# Either can be read back whole with get_full_match_details / restore_full_match_details. Fields stamped on
+# the live document (ingested_at, trimmed) are not part of the payload and survive trims and restores.
+# Paths through an array (info.participants.kills) apply to every element of the array.
+
+ARCHIVE_COLLECTION = 'match_detail_archive'
+# live match_detail fields that are not part of the match-v5 payload
+LIVE_FIELDS = ("_id", "ingested_at", "trimmed")
+
+MATCH_DETAIL_FIELDS = [
+    "metadata.matchId",
+    "metadata.participants",
+    "metadata.dataVersion",
+    "info.gameCreation",
+    "info.gameStartTimestamp",
+    "info.gameEndTimestamp",
+    "info.gameDuration",
+    "info.gameVersion",
+    "info.gameMode",
+    "info.queueId",
+    "info.platformId",
+    "info.teams.teamId",
+    "info.teams.win",
+    "info.participants.participantId",
+    "info.participants.teamId",
+    "info.participants.riotIdGameName",
+    "info.participants.riotIdTagline",
+    "info.participants.individualPosition",
+    "info.participants.champLevel",
+    "info.participants.goldEarned",
+    "info.participants.totalMinionsKilled",
+    "info.participants.neutralMinionsKilled",
+    "info.participants.totalDamageDealtToChampions",
+    "info.participants.visionScore",
+    *[f"info.participants.{field}" for field in PLAYER_STATS_FIELDS.values()],
+    *MATCH_ROW_FIELDS.values(),
+    *MATCH_DETAIL_EXTRA_FIELDS,
+]
+
+
+def _field_tree(fields):
+    # ["a.b", "a.c"] -> {"a": {"b": True, "c": True}}, True keeps the whole value
+    tree = {}
+    for field in fields:
+        node = tree
+        parts = field.split(".")
+        for part in parts[:-1]:
+            node = node.setdefault(part, {})
+            if node is True:
+                break
+        else:
+            node[parts[-1]] = True
+    return tree
+
+
+def _project(value, tree):
+    if tree is True:
+        return value
+    if isinstance(value, list):
+        return [_project(item, tree) for item in value]
+    if isinstance(value, dict):
+        return {key: _project(value[key], subtree) for key, subtree in tree.items() if key in value}
+    return value
+
+
+_MATCH_DETAIL_TREE = _field_tree(MATCH_DETAIL_FIELDS)
+
+
+def trim_match_detail(match_details, fields=None):
+    """
+    :param match_details: full match-v5 payload
+    :param fields: dotted paths to keep, defaults to MATCH_DETAIL_FIELDS
+    :return: a new document with only the kept fields, flagged with trimmed=True
+    """
+    tree = _field_tree(fields) if fields is not None else _MATCH_DETAIL_TREE
+    return {**_project(match_details, tree), "trimmed": True}
+
+
+# ===============================
+# Archive
+# ===============================
+
+
+def _payload_bytes(match_details):
+    return json.dumps({key: value for key, value in match_details.items() if key not in LIVE_FIELDS},
+                      separators=(",", ":")).encode()
+
+
+def archive_match_details(db_uri, db_name, data, collection_name=ARCHIVE_COLLECTION, use_store=MATCH_STORE_ENABLED):
+    """
+    Keep full match-v5 payloads cold: in the response store when it is enabled (a match fetched through it
+    is already there), otherwise compressed in the archive collection. A match already kept is left as is.
+
+    :param db_uri: URI for the MongoDB database connection
+    :param db_name: Name of the database
+    :param data: iterable of full match-v5 payloads
+    :param collection_name: Name of the archive collection
+    :param use_store: keep the payloads in the response store instead of the archive collection
+    :return: number of matches newly archived
+    """
+    if use_store:
+        return sum(put_match(match_details["metadata"]["matchId"], _payload_bytes(match_details))
+                   for match_details in data)
+
+    db = get_db(db_uri, db_name)
+    collection = db[collection_name]
+
+    archived = 0
+    for chunk in _chunks(data, WRITE_CHUNK_SIZE):
+        archived_at = datetime.now(timezone.utc)
+        operations = []
+        for match_details in chunk:
+            payload = _payload_bytes(match_details)
+            operations.append(UpdateOne(
+                {"match_id": match_details["metadata"]["matchId"]},
+                {"$setOnInsert": {"payload": Binary(gzip.compress(payload)), "bytes": len(payload),
+                                  "archived_at": archived_at}},
+                upsert=True,
+            ))
+        archived += collection.bulk_write(operations, ordered=False).upserted_count
+    return archived
+
+
+def get_full_match_details(db_uri, db_name, match_ids, collection_name=ARCHIVE_COLLECTION, use_store=MATCH_STORE_ENABLED):
+    """
+    Rehydrate full match-v5 payloads from the response store (when enabled) and the archive collection.
+
+    :param db_uri: URI for the MongoDB database connection
+    :param db_name: Name of the database
+    :param match_ids: match ids to read
+    :param collection_name: Name of the archive collection
+    :param use_store: read the response store first, the archive collection only for the matches not in it
+    :return: iterator of full match-v5 payloads, match ids that are not archived are skipped
+    """
+    match_ids = list(match_ids)
+    if use_store:
+        archived_match_ids = []
+        for match_id in match_ids:
+            match_details = get_match(match_id)
+            if match_details is None:
+                archived_match_ids.append(match_id)
+            else:
+                yield match_details
+        match_ids = archived_match_ids
+        if not match_ids:
+            return
+
+    db = get_db(db_uri, db_name)
+    cursor = db[collection_name].find({"match_id": {"$in": match_ids}}, {"_id": 0, "payload": 1})
+    with cursor:
+        for document in cursor:
+            yield json.loads(gzip.decompress(document["payload"]))
+
+
+def restore_full_match_details(db_uri, db_name, match_ids, collection_name='match_detail',
+                               archive_collection_name=ARCHIVE_COLLECTION, use_store=MATCH_STORE_ENABLED):
+    """
+    Put the full archived payload back in place of the trimmed match_detail documents (same _id). The live
+    ingested_at and trimmed flag are kept, so incremental readers and the trim migration leave them alone.
+
+    :param db_uri: URI for the MongoDB database connection
+    :param db_name: Name of the database
+    :param match_ids: match ids to restore
+    :param collection_name: Name of the match detail collection
+    :param archive_collection_name: Name of the archive collection
+    :param use_store: read the payloads from the response store first, see get_full_match_details
+    :return: number of documents restored
+    """
+    db = get_db(db_uri, db_name)
+    collection = db[collection_name]
+
+    restored = 0
+    full_match_details = get_full_match_details(db_uri, db_name, match_ids, archive_collection_name, use_store=use_store)
+    for chunk in _chunks(full_match_details, WRITE_CHUNK_SIZE):
+        chunk_match_ids = [match_details["metadata"]["matchId"] for match_details in chunk]
+        live_fields = {document["metadata"]["matchId"]: document for document in
+                       collection.find({"metadata.matchId": {"$in": chunk_match_ids}},
+                                       {"_id": 0, "metadata.matchId": 1, "ingested_at": 1, "trimmed": 1})}
+        operations = []
+        for match_id, match_details in zip(chunk_match_ids, chunk):
+            live = live_fields.get(match_id, {})
+            payload = {key: value for key, value in match_details.items() if key not in LIVE_FIELDS}
+            operations.append(ReplaceOne({"metadata.matchId": match_id},
+                                         {**payload, **{field: live[field] for field in LIVE_FIELDS if field in live}}))
+        restored += collection.bulk_write(operations, ordered=False).modified_count
+    return restored
+
+
+def trim_stored_match_details(db_uri, db_name, collection_name='match_detail', batch_size=WRITE_CHUNK_SIZE,
+                              use_store=MATCH_STORE_ENABLED):
+    """
+    Archive and trim the match_detail documents stored before trimming (no trimmed flag), in place.
+
+    :param db_uri: URI for the MongoDB database connection
+    :param db_name: Name of the database
+    :param collection_name: Name of the match detail collection
+    :param batch_size: documents archived and replaced per round
+    :param use_store: archive into the response store instead of the archive collection
+    :return: number of documents trimmed
+    """
+    db = get_db(db_uri, db_name)
+    collection = db[collection_name]
+
+    trimmed = 0
+    cursor = collection.find({"trimmed": {"$exists": False}}, batch_size=batch_size)
+    with cursor:
+        for chunk in _chunks(cursor, batch_size):
+            archive_match_details(db_uri, db_name, chunk, use_store=use_store)
+            # _id and ingested_at stay the same, so incremental readers of match_detail do not see the
+            # trimmed documents as new, nor lose them from their ingested_at range
+            operations = [ReplaceOne({"_id": match_details["_id"]},
+                                     {**trim_match_detail(match_details),
+                                      **{field: match_details[field] for field in ("_id", "ingested_at")
+                                         if field in match_details}})
+                          for match_details in chunk]
+            trimmed += collection.bulk_write(operations, ordered=False).modified_count
+    return trimmed
@@ -0,0 +1,224 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from pymongo import UpdateOne
+
+from backend.app.db.db_connection import get_db
+from backend.app.db.db_indexes import ensure_indexes
+
+
+# ===============================
+# Match Work Queue
+# ===============================
+# One document per match_id in the 'match_queue' collection:
+#   {match_id, status, attempts, lease_id, worker_id, lease_expires_at, last_error, updated_at}
+# status moves pending -> leased -> done, or back to pending on failure until max_attempts,
+# after which it becomes failed. A leased match whose lease expired (the worker died) is
+# claimable again, so several workers can pull disjoint batches without coordinating.
+# update_match_ids_data enqueues every match id it crawls, seed_match_queue only backfills deployments that
+# crawled before the queue existed.
+
+QUEUE_COLLECTION = 'match_queue'
+
+PENDING = 'pending'
+LEASED = 'leased'
+DONE = 'done'
+FAILED = 'failed'
+
+
+def _claimable_filter(now):
+    return {
+        "$or": [
+            {"status": PENDING},
+            {"status": LEASED, "lease_expires_at": {"$lt": now}},
+        ]
+    }
+
+
+def seed_match_queue(db_uri, db_name, collection_name=QUEUE_COLLECTION, match_id_collection='match_id',
+                     processed_collection='processed_match_id'):
+    """
+    One-off migration: add every match in match_id to the queue as pending and mark the ones already in
+    processed_match_id as done. Scans both collections, entirely server side with $merge, and is idempotent.
+
+    :param db_uri: URI for the MongoDB database connection
+    :param db_name: Name of the database
+    :param collection_name: Name of the queue collection
+    :param match_id_collection: Name of the collection holding crawled match ids
+    :param processed_collection: Name of the collection holding processed match ids
+    """
+    db = get_db(db_uri, db_name)
+    # $merge on match_id needs the unique match_id index to exist
+    ensure_indexes(db_uri, db_name, collection_names=[collection_name])
+    now = datetime.now(timezone.utc)
+
+    db[match_id_collection].aggregate([
+        {"$group": {"_id": "$match_id"}},
+        {"$project": {"_id": 0, "match_id": "$_id", "status": PENDING, "attempts": {"$literal": 0},
+                      "updated_at": {"$literal": now}}},
+        {"$merge": {"into": collection_name, "on": "match_id",
+                    "whenMatched": "keepExisting", "whenNotMatched": "insert"}},
+    ])
+
+    db[processed_collection].aggregate([
+        {"$match": {"processed_with_api_call": True}},
+        {"$group": {"_id": "$match_id"}},
+        {"$project": {"_id": 0, "match_id": "$_id", "status": DONE, "attempts": {"$literal": 0},
+                      "updated_at": {"$literal": now}}},
+        {"$merge": {"into": collection_name, "on": "match_id",
+                    "whenMatched": [{"$set": {"status": DONE}}], "whenNotMatched": "insert"}},
+    ])
+
+
+def enqueue_match_ids(db_uri, db_name, match_ids, collection_name=QUEUE_COLLECTION):
+    """
+    Add match ids to the queue as pending, leaving ids already in the queue untouched.
+
+    :return: number of newly queued match ids
+    """
+    db = get_db(db_uri, db_name)
+    collection = db[collection_name]
+
+    if not match_ids:
+        return 0
+
+    now = datetime.now(timezone.utc)
+    operations = [
+        UpdateOne({"match_id": match_id},
+                  {"$setOnInsert": {"status": PENDING, "attempts": 0, "updated_at": now}},
+                  upsert=True)
+        for match_id in match_ids
+    ]
+    result = collection.bulk_write(operations, ordered=False)
+    return result.upserted_count
+
+
+def requeue_match_ids(db_uri, db_name, match_ids, collection_name=QUEUE_COLLECTION):
+    """
+    Put match ids back in the queue as pending with a fresh attempt count, whatever their status,
+    adding the ones that are not queued yet.
+
+    :return: number of queue entries added or updated
+    """
+    db = get_db(db_uri, db_name)
+    collection = db[collection_name]
+
+    if not match_ids:
+        return 0
+
+    now = datetime.now(timezone.utc)
+    operations = [
+        UpdateOne({"match_id": match_id},
+                  {"$set": {"status": PENDING, "attempts": 0, "updated_at": now},
+                   "$unset": {"lease_id": "", "worker_id": "", "lease_expires_at": "", "last_error": ""}},
+                  upsert=True)
+        for match_id in match_ids
+    ]
+    result = collection.bulk_write(operations, ordered=False)
+    return result.upserted_count + result.modified_count
+
+
+def claim_match_ids(db_uri, db_name, worker_id, batch_size=100, lease_seconds=600, collection_name=QUEUE_COLLECTION):
+    """
+    Lease up to batch_size claimable matches to a worker.
+
+    Candidates are picked with an indexed query and leased with one update_many that re-checks
+    they are still claimable, so two workers racing for the same candidates never both get them.
+
+    :param worker_id: identifier of the claiming worker, stored for debugging
+    :param batch_size: maximum number of matches to lease
+    :param lease_seconds: how long the worker owns the matches before they become claimable again
+    :return: list of leased match ids (may be shorter than batch_size, empty when nothing is left)
+    """
+    db = get_db(db_uri, db_name)
+    collection = db[collection_name]
+
+    now = datetime.now(timezone.utc)
+    candidate_ids = [doc['_id'] for doc in collection.find(_claimable_filter(now), {"_id": 1}).limit(batch_size)]
+    if not candidate_ids:
+        return []
+
+    lease_id = uuid.uuid4().hex
+    collection.update_many(
+        {"_id": {"$in": candidate_ids}, **_claimable_filter(now)},
+        {
+            "$set": {"status": LEASED, "lease_id": lease_id, "worker_id": worker_id,
+                     "lease_expires_at": now + timedelta(seconds=lease_seconds), "updated_at": now},
+            "$inc": {"attempts": 1},
+        },
+    )
+    return [doc['match_id'] for doc in collection.find({"lease_id": lease_id}, {"_id": 0, "match_id": 1})]
+
+
+async def iter_claimed_match_ids(db_uri, db_name, worker_id, batch_size=100, lease_seconds=600,
+                                 collection_name=QUEUE_COLLECTION):
+    """
+    Yield leased match ids, claiming the next batch whenever the previous one is used up.
+    Claims run in a worker thread, so the fetches in flight on the event loop never wait on Mongo.
+
+    :return: async iterator of match ids
+    """
+    while True:
+        match_ids = await asyncio.to_thread(claim_match_ids, db_uri, db_name, worker_id, batch_size=batch_size,
+                                            lease_seconds=lease_seconds, collection_name=collection_name)
+        if not match_ids:
+            return
+        for match_id in match_ids:
+            yield match_id
+
+
+def complete_match_ids(db_uri, db_name, match_ids, collection_name=QUEUE_COLLECTION):
+    db = get_db(db_uri, db_name)
+    collection = db[collection_name]
+
+    if not match_ids:
+        return 0
+
+    result = collection.update_many(
+        {"match_id": {"$in": match_ids}},
+        {
+            "$set": {"status": DONE, "updated_at": datetime.now(timezone.utc)},
+            "$unset": {"lease_id": "", "worker_id": "", "lease_expires_at": "", "last_error": ""},
+        },
+    )
+    return result.modified_count
+
+
+def fail_match_ids(db_uri, db_name, failures, max_attempts=3, collection_name=QUEUE_COLLECTION):
+    """
+    Release matches after a failed attempt: back to pending, or failed once max_attempts is reached.
+
+    :param failures: dict of match_id -> error message
+    :param max_attempts: number of claims after which a match is given up on
+    :return: number of queue entries updated
+    """
+    db = get_db(db_uri, db_name)
+    collection = db[collection_name]
+
+    if not failures:
+        return 0
+
+    now = datetime.now(timezone.utc)
+    release = {"lease_id": "", "worker_id": "", "lease_expires_at": ""}
+    # attempts is counted at claim time, so exactly one of the two updates matches each entry
+    operations = []
+    for match_id, error in failures.items():
+        operations.append(UpdateOne(
+            {"match_id": match_id, "attempts": {"$gte": max_attempts}},
+            {"$set": {"status": FAILED, "last_error": error, "updated_at": now}, "$unset": release},
+        ))
+        operations.append(UpdateOne(
+            {"match_id": match_id, "attempts": {"$lt": max_attempts}},
+            {"$set": {"status": PENDING, "last_error": error, "updated_at": now}, "$unset": release},
+        ))
+    result = collection.bulk_write(operations, ordered=False)
+    return result.modified_count
+
+
+def count_match_queue_status(db_uri, db_name, collection_name=QUEUE_COLLECTION):
+    db = get_db(db_uri, db_name)
+    collection = db[collection_name]
+
+    pipeline = [{"$group": {"_id": "$status", "count": {"$sum": 1}}}]
+    return {doc['_id']: doc['count'] for doc in collection.aggregate(pipeline)}
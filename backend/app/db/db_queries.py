@@ -1,4 +1,7 @@
-from backend.app.db.db_actions import get_data
+from datetime import datetime, timezone
+
+from backend.app.db.db_actions import get_data, iter_data
+from backend.app.db.db_connection import get_db
 from dotenv import load_dotenv
 import os
 
@@ -8,15 +11,16 @@ MONGO_DB_URI = os.getenv("MONGO_URI")
 MONGO_DB_NAME = os.getenv("MONGO_DB_NAME")
 
 
-def get_recent_players(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, collection_name='league'):
+def get_recent_players(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, collection_name='league_latest'):
     """
-    Retrieve recent player entries from the 'league' MongoDB collection for specific tiers.
+    Retrieve recent player entries from the 'league_latest' MongoDB collection for specific tiers.
 
     The expected flow is to update that table, then clear and update the player_ids table using this.
 
-    This function queries the MongoDB collection for player data, filters for entries
-    belonging to the tiers 'challenger', 'grandmaster', and 'master', and returns a
-    list of entries sorted by leaguePoints in descending order.
+    'league_latest' holds exactly one document per (platform, tier), the newest snapshot written by
+    update_league_data, so the current ladder is read directly instead of sorting and grouping the
+    snapshot history in 'league'. This function filters for the tiers 'challenger', 'grandmaster',
+    and 'master', and returns a list of entries sorted by leaguePoints in descending order.
 
     Parameters:
     ----------
@@ -25,15 +29,16 @@ def get_recent_players(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, collection_na
     db_name : str
         The name of the MongoDB database to use.
     collection_name : str, optional
-        The name of the MongoDB collection to query (default is 'league').
+        The name of the MongoDB collection to query (default is 'league_latest').
 
     Returns:
     -------
     list
-        A list of dictionaries, each containing the tier and corresponding player entry.
+        A list of dictionaries, each containing the tier, platform and corresponding player entry.
         Each dictionary has the format:
         {
             'tier': <tier_value>,
+            'platform': <platform_value>,
             ...  # Other fields from the entry
         }
 
@@ -41,45 +46,23 @@ def get_recent_players(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, collection_na
     --------
     >>> players = get_recent_players()
     >>> print(players)
-    [{'tier': 'challenger', 'entry': {...}}, {'tier': 'grandmaster', 'entry': {...}}, ...]
+    [{'tier': 'CHALLENGER', 'platform': 'na1', ...}, {'tier': 'GRANDMASTER', 'platform': 'euw1', ...}, ...]
     """
-    # Define the aggregation pipeline
-    pipeline = [
-        {
-            '$match': {
-                'tier': {'$in': ['CHALLENGER', 'GRANDMASTER', 'MASTER']}  # Filter for specific tiers
-            }
-        },
-        {
-            '$sort': {
-                'added_at': -1  # Sort by added_date in descending order
-            }
-        },
-        {
-            '$group': {
-                '_id': '$tier',  # Group by tier
-                'entries': {'$first': '$entries'},  # Get the entries list from the most recent record
-            }
-        },
-        {
-            '$unwind': '$entries',
-        },
-        {
-            '$project': {
-                '_id': 0,  # Exclude the _id field from the output
-                'tier': '$_id',  # Rename _id to tier
-                'entry': '$entries',  # Include the entries field
-            }
-        }
-    ]
-
-    # Use the modified get_data function with the pipeline
-    data = get_data(db_uri, db_name, collection_name, pipeline=pipeline)
+    projection = {
+        "_id": 0,
+        "tier": 1,
+        "platform": 1,
+        "entries": 1,
+    }
+    filter = {
+        'tier': {'$in': ['CHALLENGER', 'GRANDMASTER', 'MASTER']}  # Filter for specific tiers
+    }
+    data = iter_data(db_uri, db_name, collection_name, filter=filter, projection=projection)
 
-    # Extract the entry objects from the results and add the tier at the front
+    # Extract the entry objects from the results and add the tier and platform at the front
     results = [
-        {'tier': result['tier'], **result['entry']}  # Place tier first, then entry fields
-        for result in data if 'entry' in result
+        {'tier': league['tier'], 'platform': league['platform'], **entry}  # Place tier and platform first, then entry fields
+        for league in data for entry in league.get('entries', [])
     ]
 
     results.sort(key=lambda x: x.get('leaguePoints', 0), reverse=True)
@@ -87,6 +70,69 @@ def get_recent_players(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, collection_na
     return results
 
 
+def get_league_latest_entries(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, collection_name='league_latest'):
+    """
+    get the entries of the newest snapshot of every league, the base of the next history delta
+    :param db_uri:
+    :param db_name:
+    :param collection_name:
+    :return: dict of (platform, tier) -> list of entries
+    """
+    projection = {
+        "_id": 0,
+        "platform": 1,
+        "tier": 1,
+        "entries": 1,
+    }
+    data = iter_data(db_uri, db_name, collection_name, projection=projection)
+    return {(league['platform'], league['tier']): league['entries'] for league in data}
+
+
+def get_newest_league_snapshots(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, collection_name='league',
+                                default_platform='na1'):
+    """
+    get the newest full snapshot of every league in the 'league' history, to seed 'league_latest'
+    :param db_uri:
+    :param db_name:
+    :param collection_name:
+    :param default_platform: platform of snapshots stored before leagues carried one (all were fetched from na1)
+    :return: list of league documents (tier, platform, entries, ...) without _id, one per (platform, tier)
+    """
+    pipeline = [
+        # deltas only exist once league_latest is written, older documents are all full snapshots
+        {"$match": {"snapshot_type": {"$ne": "delta"}}},
+        {"$sort": {"added_at": -1}},
+        {"$group": {
+            "_id": {"platform": {"$ifNull": ["$platform", default_platform]}, "tier": "$tier"},
+            "league": {"$first": "$$ROOT"},
+        }},
+    ]
+    data = iter_data(db_uri, db_name, collection_name, pipeline=pipeline, allow_disk_use=True)
+    skipped_fields = ("_id", "snapshot_type", "removed_summoner_ids")
+    return [{**{field: value for field, value in group['league'].items() if field not in skipped_fields},
+             "platform": group['_id']['platform']}
+            for group in data]
+
+
+def get_summoner_cache(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, collection_name='summoner_cache', summoner_ids=None):
+    """
+    get cached summoner-v4 resolutions (summonerId -> puuid, accountId, ...) for the given summoners
+    :param db_uri:
+    :param db_name:
+    :param collection_name:
+    :param summoner_ids: list of summonerIds to look up
+    :return: dict of summonerId -> cached entry, entries carry the verified_at time of their last resolution
+    """
+    projection = {
+        "_id": 0,
+    }
+    filter = {
+        "summonerId": {"$in": summoner_ids}
+    }
+    data = iter_data(db_uri, db_name, collection_name, filter=filter, projection=projection)
+    return {item['summonerId']: item for item in data}
+
+
 def get_player_puuids(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, collection_name='player_ids'):
     projection = {
         "_id": 0,
@@ -98,21 +144,83 @@ def get_player_puuids(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, collection_nam
     return results
 
 
-def get_match_ids(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, collection_name='match_id'):
+def get_game_name_tagline_fetched_at(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, collection_name='game_name_taglines'):
     """
-    get all match ids stored in database
+    get the time each stored Riot ID (gameName#tagLine) was last fetched
     :param db_uri:
     :param db_name:
     :param collection_name:
-    :return:
+    :return: dict of puuid -> fetched_at, None for entries stored before fetched_at was tracked
+    """
+    projection = {
+        "_id": 0,
+        "puuid": 1,
+        "fetched_at": 1,
+    }
+    data = iter_data(db_uri, db_name, collection_name, projection=projection)
+    return {item['puuid']: item.get('fetched_at') for item in data}
+
+
+def get_player_platforms(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, collection_name='player_ids'):
+    """
+    get the platform each tracked player was found on
+    :param db_uri:
+    :param db_name:
+    :param collection_name:
+    :return: dict of puuid -> platform routing value, na1 for players stored before platforms were tracked
+    """
+    projection = {
+        "_id": 0,
+        "puuid": 1,
+        "platform": 1,
+    }
+    data = iter_data(db_uri, db_name, collection_name, projection=projection)
+    return {item['puuid']: item.get('platform', 'na1') for item in data}
+
+
+def iter_match_ids(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, collection_name='match_id', batch_size=10000):
+    """
+    stream all match ids stored in database
+    :param db_uri:
+    :param db_name:
+    :param collection_name:
+    :param batch_size: match ids per round trip
+    :return: iterator of match ids
     """
     projection = {
         "_id": 0,
         "match_id": 1,
     }
-    data = get_data(db_uri, db_name, collection_name, projection=projection)
-    results = [item['match_id'] for item in data]
-    return results
+    for item in iter_data(db_uri, db_name, collection_name, projection=projection, batch_size=batch_size):
+        yield item['match_id']
+
+
+def get_match_id_crawl_watermarks(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, collection_name='match_id_crawl'):
+    """
+    get the time (unix seconds) each player's match ids were last crawled
+    :param db_uri:
+    :param db_name:
+    :param collection_name:
+    :return: dict of puuid -> last_crawled_at
+    """
+    projection = {
+        "_id": 0,
+        "puuid": 1,
+        "last_crawled_at": 1,
+    }
+    data = iter_data(db_uri, db_name, collection_name, projection=projection)
+    return {item['puuid']: item['last_crawled_at'] for item in data}
+
+
+def get_match_ids(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, collection_name='match_id'):
+    """
+    get all match ids stored in database
+    :param db_uri:
+    :param db_name:
+    :param collection_name:
+    :return:
+    """
+    return list(iter_match_ids(db_uri, db_name, collection_name))
 
 
 def get_processed_match_ids(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, collection_name='processed_match_id'):
@@ -135,32 +243,57 @@ def get_processed_match_ids(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, collecti
     results = [item['match_id'] for item in data]
     return results
 
-def get_match_detail_ids(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, collection_name='match_detail'):
+def iter_match_detail_ids(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, collection_name='match_detail', batch_size=10000):
     """
-    this will mostly be used to validate the data is in match detail before updating processed_match_id
+    stream the match ids of every stored match detail
     :param db_uri:
     :param db_name:
     :param collection_name:
-    :return:
+    :param batch_size: match ids per round trip
+    :return: iterator of match ids
     """
     projection = {
         "_id": 0,
         "metadata.matchId": 1
     }
-    data = get_data(db_uri, db_name, collection_name, projection=projection)
-    results = [doc['metadata']['matchId'] for doc in data if 'metadata' in doc and 'matchId' in doc['metadata']]
+    for doc in iter_data(db_uri, db_name, collection_name, projection=projection, batch_size=batch_size):
+        if 'metadata' in doc and 'matchId' in doc['metadata']:
+            yield doc['metadata']['matchId']
 
-    return results
+
+def get_match_detail_ids(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, collection_name='match_detail'):
+    """
+    this will mostly be used to validate the data is in match detail before updating processed_match_id
+    :param db_uri:
+    :param db_name:
+    :param collection_name:
+    :return:
+    """
+    return list(iter_match_detail_ids(db_uri, db_name, collection_name))
 
 
-def get_match_detail_from_puuid(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, collection_name='match_detail',
-                                              player_puuid=None):
+# player_matches_stats row field -> match-v5 participant field
+PLAYER_STATS_FIELDS = {
+    "puuid": "puuid",
+    "kills": "kills",
+    "deaths": "deaths",
+    "assists": "assists",
+    "champion_name": "championName",
+    "champion_id": "championId",
+    "team_position": "teamPosition",
+    "win": "win",
+}
+
+
+def iter_match_detail_from_puuid(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, collection_name='match_detail',
+                                 player_puuid=None, batch_size=100):
     """
-    return list of tuples of all match details which contain specified player, along with the participant index of the player in the match, and the matchId
+    stream (match_id, player_index, match_details) tuples of all match details which contain specified player
     :param db_uri:
     :param db_name:
     :param collection_name:
     :param player_puuid:
+    :param batch_size: full match documents per round trip
     :return:
     """
 
@@ -168,77 +301,185 @@ def get_match_detail_from_puuid(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, coll
         "metadata.participants": player_puuid
     }
 
-    matching_records = get_data(db_uri, db_name, collection_name, filter=filter)
-
-    player_record_tuples = []
-
-    for record in matching_records:
+    for record in iter_data(db_uri, db_name, collection_name, filter=filter, batch_size=batch_size):
         participants = record['metadata']['participants']
         match_id = record['metadata']['matchId']
         if player_puuid in participants:
             index = participants.index(player_puuid)
-            player_record_tuples.append((match_id, index, record))
+            yield match_id, index, record
 
-    return player_record_tuples
+
+def get_match_detail_from_puuid(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, collection_name='match_detail',
+                                              player_puuid=None):
+    """
+    return list of tuples of all match details which contain specified player, along with the participant index of the player in the match, and the matchId
+    :param db_uri:
+    :param db_name:
+    :param collection_name:
+    :param player_puuid:
+    :return:
+    """
+    return list(iter_match_detail_from_puuid(db_uri, db_name, collection_name, player_puuid=player_puuid))
 
 
 def get_player_stats_match_details(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, collection_name='match_detail',
                                               player_puuid=None):
+    """
+    player_matches_stats rows of a single player, the one player case of iter_tracked_players_stats_match_details,
+    so only the player's participant fields leave the server
+    :param db_uri:
+    :param db_name:
+    :param collection_name:
+    :param player_puuid:
+    :return: list of player stats dicts
+    """
+    return list(iter_tracked_players_stats_match_details(db_uri, db_name, collection_name, player_puuids=[player_puuid]))
 
-    # list of tuples [(player_index, match_details)]
-    match_id_index_record_list = get_match_detail_from_puuid(db_uri, db_name, collection_name, player_puuid=player_puuid)
-
-    # List to store player stats
-    player_stats_list = []
-
-    for match_id, player_index, match_details in match_id_index_record_list:
-        try:
-            participant_data = match_details['info']['participants'][player_index]
-            player_stats = {
-                "match_id": match_id,
-                "player_index": player_index,
-                "puuid": participant_data['puuid'],
-                "kills": participant_data['kills'],
-                "deaths": participant_data['deaths'],
-                "assists": participant_data['assists'],
-                "champion_name": participant_data['championName'],
-                "champion_id": participant_data['championId'],
-                "team_position": participant_data['teamPosition'],
-                "win": participant_data['win']
-            }
 
-            # Append stats as a tuple
-            player_stats_list.append(player_stats)
+def get_player_matches_stats_puuids(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, collection_name='player_matches_stats'):
+    """
+    distinct puuids that already have rows in player_matches_stats
+    :param db_uri:
+    :param db_name:
+    :param collection_name:
+    :return:
+    """
+    db = get_db(db_uri, db_name)
+    return db[collection_name].distinct("puuid")
 
-        except (KeyError, IndexError) as e:
-            print(f"Error extracting data for player index {player_index} in match {match_id}: {e}")
 
-    return player_stats_list
+def get_match_detail_max_ingested_at(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, collection_name='match_detail'):
+    """
+    server side ingest time (ingested_at) of the most recently stored match_detail document,
+    None if no document has one yet
+    :param db_uri:
+    :param db_name:
+    :param collection_name:
+    :return:
+    """
+    projection = {
+        "_id": 0,
+        "ingested_at": 1
+    }
+    data = get_data(db_uri, db_name, collection_name, filter={"ingested_at": {"$exists": True}}, projection=projection,
+                    sort_field=("ingested_at", -1), limit=1)
+    return data[0]['ingested_at'] if data else None
 
 
+def _ingested_range(ingested_after, ingested_up_to):
+    ingested_range = {}
+    if ingested_after is not None:
+        ingested_range["$gt"] = ingested_after
+    if ingested_up_to is not None:
+        ingested_range["$lte"] = ingested_up_to
+    return {"ingested_at": ingested_range} if ingested_range else {}
+
+
+def iter_tracked_players_stats_match_details(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, collection_name='match_detail',
+                                             player_puuids=None, ingested_after=None, ingested_up_to=None, batch_size=1000):
+    """
+    player_matches_stats rows for every tracked player in one pass over match_detail
+
+    Each match is read once on the server: it is unwound into its participants and only the
+    participants in player_puuids are kept, instead of one query (and one full read of the match)
+    per tracked player in it.
+    :param db_uri:
+    :param db_name:
+    :param collection_name:
+    :param player_puuids: list of tracked puuids
+    :param ingested_after: only matches stored after this ingest time (exclusive)
+    :param ingested_up_to: only matches stored up to this ingest time (inclusive)
+    :param batch_size: rows per round trip
+    :return: iterator of player stats dicts, same shape as get_player_stats_match_details
+    """
+    match_filter = {"metadata.participants": {"$in": player_puuids},
+                    **_ingested_range(ingested_after, ingested_up_to)}
 
-def get_player_summarized_stats(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, collection_name='player_matches_stats',
-                                              player_puuid=None):
     pipeline = [
-        {"$match": {"puuid": player_puuid}},
+        {"$match": match_filter},
+        {"$unwind": {"path": "$info.participants", "includeArrayIndex": "player_index"}},
+        {"$match": {"info.participants.puuid": {"$in": player_puuids}}},
         {
-            "$group": {
-                "_id": "$puuid",
-                "average_kills": {"$avg": "$kills"},
-                "average_deaths": {"$avg": "$deaths"},
-                "average_assists": {"$avg": "$assists"},
-                "match_count": {"$sum": 1},
-                "average_win_rate": {
-                    "$avg": {
-                        "$cond": {
-                            "if": {"$eq": ["$win", True]},
-                            "then": 1,
-                            "else": 0
-                        }
+            "$project": {
+                "_id": 0,
+                "match_id": "$metadata.matchId",
+                "player_index": 1,
+                **{field: f"$info.participants.{participant_field}"
+                   for field, participant_field in PLAYER_STATS_FIELDS.items()},
+            }
+        },
+    ]
+
+    return iter_data(db_uri, db_name, collection_name, pipeline=pipeline, batch_size=batch_size, allow_disk_use=True)
+
+
+# match level fields added to every participant row of iter_match_participant_rows
+MATCH_ROW_FIELDS = {
+    "game_creation": "info.gameCreation",
+    "game_duration": "info.gameDuration",
+    "queue_id": "info.queueId",
+}
+
+
+def iter_match_participant_rows(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, collection_name='match_detail',
+                                ingested_after=None, ingested_up_to=None, batch_size=1000, chunk_size=None):
+    """
+    one flat row per participant of every match in an ingest time range, for the columnar analytics cache
+    :param db_uri:
+    :param db_name:
+    :param collection_name:
+    :param ingested_after: only matches stored after this ingest time (exclusive)
+    :param ingested_up_to: only matches stored up to this ingest time (inclusive)
+    :param batch_size: rows per round trip
+    :param chunk_size: yield lists of up to chunk_size rows instead of single rows
+    :return: iterator of row dicts: match_id, player_index, ingested_at, PLAYER_STATS_FIELDS and MATCH_ROW_FIELDS
+    """
+    pipeline = [
+        {"$match": _ingested_range(ingested_after, ingested_up_to)},
+        {"$unwind": {"path": "$info.participants", "includeArrayIndex": "player_index"}},
+        {
+            "$project": {
+                "_id": 0,
+                "match_id": "$metadata.matchId",
+                "player_index": 1,
+                "ingested_at": 1,
+                **{field: f"$info.participants.{participant_field}"
+                   for field, participant_field in PLAYER_STATS_FIELDS.items()},
+                **{field: f"${match_field}" for field, match_field in MATCH_ROW_FIELDS.items()},
+            }
+        },
+    ]
+
+    return iter_data(db_uri, db_name, collection_name, pipeline=pipeline, batch_size=batch_size, allow_disk_use=True,
+                     chunk_size=chunk_size)
+
+
+def _player_summarized_stats_group():
+    return {
+        "$group": {
+            "_id": "$puuid",
+            "average_kills": {"$avg": "$kills"},
+            "average_deaths": {"$avg": "$deaths"},
+            "average_assists": {"$avg": "$assists"},
+            "match_count": {"$sum": 1},
+            "average_win_rate": {
+                "$avg": {
+                    "$cond": {
+                        "if": {"$eq": ["$win", True]},
+                        "then": 1,
+                        "else": 0
                     }
                 }
             }
         }
+    }
+
+
+def get_player_summarized_stats(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, collection_name='player_matches_stats',
+                                              player_puuid=None):
+    pipeline = [
+        {"$match": {"puuid": player_puuid}},
+        _player_summarized_stats_group(),
     ]
 
     result = get_data(db_uri, db_name, collection_name, pipeline=pipeline)
@@ -246,4 +487,67 @@ def get_player_summarized_stats(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, coll
     return result
 
 
+def get_player_summarized_stats_last_refresh(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME,
+                                             collection_name='player_summarized_stats'):
+    """
+    time of the most recent materialize_player_summarized_stats run, None if it never ran
+    :param db_uri:
+    :param db_name:
+    :param collection_name:
+    :return:
+    """
+    projection = {
+        "_id": 0,
+        "refreshed_at": 1
+    }
+    filter = {
+        "refreshed_at": {"$exists": True}
+    }
+    data = get_data(db_uri, db_name, collection_name, filter=filter, projection=projection,
+                    sort_field=("refreshed_at", -1), limit=1)
+    return data[0]['refreshed_at'] if data else None
+
+
+def materialize_player_summarized_stats(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, collection_name='player_matches_stats',
+                                        output_collection_name='player_summarized_stats', player_puuids=None,
+                                        changed_since=None):
+    """
+    Compute player_summarized_stats on the server and write it straight into the output collection.
+
+    Full refresh (changed_since is None): one grouped aggregation over all tracked players,
+    written with $out, which atomically replaces the output collection.
+    Incremental (changed_since set): only players with player_matches_stats rows updated after
+    changed_since are regrouped and $merge'd into the output, other players are left as is.
+
+    :param db_uri:
+    :param db_name:
+    :param collection_name: player_matches_stats collection to summarize
+    :param output_collection_name:
+    :param player_puuids: list of tracked puuids
+    :param changed_since: datetime of the previous refresh (see get_player_summarized_stats_last_refresh)
+    :return: number of players recomputed
+    """
+    refreshed_at = datetime.now(timezone.utc)
+
+    if changed_since is None:
+        puuids = player_puuids
+        output_stage = {"$out": output_collection_name}
+    else:
+        db = get_db(db_uri, db_name)
+        puuids = db[collection_name].distinct("puuid", {"puuid": {"$in": player_puuids},
+                                                        "updated_at": {"$gt": changed_since}})
+        output_stage = {"$merge": {"into": output_collection_name, "on": "_id",
+                                   "whenMatched": "replace", "whenNotMatched": "insert"}}
+        if not puuids:
+            return 0
+
+    pipeline = [
+        {"$match": {"puuid": {"$in": puuids}}},
+        _player_summarized_stats_group(),
+        {"$set": {"refreshed_at": {"$literal": refreshed_at}}},
+        output_stage,
+    ]
+    get_data(db_uri, db_name, collection_name, pipeline=pipeline)
+
+    return len(puuids)
 
@@ -0,0 +1,31 @@
+from datetime import datetime, timezone
+
+from backend.app.db.db_connection import get_db
+
+
+# ===============================
+# Watermarks
+# ===============================
+# High-watermarks of incremental jobs, one document per job in the 'watermarks' collection:
+#   {_id: <job name>, value: <last processed value>, updated_at}
+
+WATERMARK_COLLECTION = 'watermarks'
+
+
+def get_watermark(db_uri, db_name, name, collection_name=WATERMARK_COLLECTION):
+    """
+    :param name: job name (e.g. "player_matches_stats.match_detail")
+    :return: the stored watermark value, None if the job never completed
+    """
+    db = get_db(db_uri, db_name)
+    document = db[collection_name].find_one({"_id": name})
+    return document['value'] if document else None
+
+
+def set_watermark(db_uri, db_name, name, value, collection_name=WATERMARK_COLLECTION):
+    db = get_db(db_uri, db_name)
+    db[collection_name].update_one(
+        {"_id": name},
+        {"$set": {"value": value, "updated_at": datetime.now(timezone.utc)}},
+        upsert=True,
+    )
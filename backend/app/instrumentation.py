@@ -0,0 +1,196 @@
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+
+
+load_dotenv()
+METRICS_EXPORT = os.getenv("METRICS_EXPORT", "none").lower()  # "jsonl", "prometheus" or "none"
+METRICS_JSONL_PATH = os.getenv("METRICS_JSONL_PATH", "metrics.jsonl")
+METRICS_PROMETHEUS_PATH = os.getenv("METRICS_PROMETHEUS_PATH", "challenger_stats.prom")
+LOG_SAMPLE_SIZE = int(os.getenv("LOG_SAMPLE_SIZE", 3))
+
+
+# ===============================
+# Counters and Spans
+# ===============================
+# Process wide, thread safe, shared by the api, db and services layers:
+#   counters: (name, labels) -> value, e.g. riot_api_requests_total{method="match-v5.matches"}
+#   spans:    "service/stage/..." -> {count, seconds, max_seconds}
+# A span opened inside another one is recorded under the joined path, the current path lives in a
+# contextvar so it follows asyncio tasks and asyncio.to_thread calls.
+
+_lock = threading.Lock()
+_counters = {}
+_spans = {}
+_span_path = contextvars.ContextVar("span_path", default=())
+
+
+def increment(name, value=1, **labels):
+    """
+    :param name: counter name, Prometheus style (e.g. "mongo_documents_written_total")
+    :param value: amount to add
+    :param labels: label values of the series (e.g. collection="match_detail")
+    """
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+@contextmanager
+def span(name):
+    """
+    Time a block, nested under the span it is opened in.
+
+    :param name: stage name (e.g. "fetch", "insert.match_detail")
+    """
+    path = _span_path.get() + (name,)
+    token = _span_path.set(path)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        _span_path.reset(token)
+        key = "/".join(path)
+        with _lock:
+            stats = _spans.setdefault(key, {"count": 0, "seconds": 0.0, "max_seconds": 0.0})
+            stats["count"] += 1
+            stats["seconds"] += elapsed
+            stats["max_seconds"] = max(stats["max_seconds"], elapsed)
+
+
+def snapshot():
+    """
+    :return: dict with the current counters (list of {name, labels, value}) and spans
+    """
+    with _lock:
+        return {
+            "counters": [{"name": name, "labels": dict(labels), "value": value}
+                         for (name, labels), value in sorted(_counters.items())],
+            "spans": {path: dict(stats) for path, stats in sorted(_spans.items())},
+        }
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _spans.clear()
+
+
+def delta(before, after):
+    """
+    What was recorded between two snapshots, e.g. during one service run. Counters and span
+    count/seconds are differences, max_seconds stays the process wide maximum.
+
+    :param before: snapshot() taken first
+    :param after: snapshot() taken later
+    :return: dict shaped like snapshot(), without the series that did not change
+    """
+    counters_before = {(counter["name"], tuple(sorted(counter["labels"].items()))): counter["value"]
+                       for counter in before["counters"]}
+    counters = []
+    for counter in after["counters"]:
+        value = counter["value"] - counters_before.get((counter["name"], tuple(sorted(counter["labels"].items()))), 0)
+        if value:
+            counters.append({**counter, "value": value})
+
+    spans = {}
+    for path, stats in after["spans"].items():
+        stats_before = before["spans"].get(path, {"count": 0, "seconds": 0.0})
+        count = stats["count"] - stats_before["count"]
+        if count:
+            spans[path] = {"count": count, "seconds": stats["seconds"] - stats_before["seconds"],
+                           "max_seconds": stats["max_seconds"]}
+    return {"counters": counters, "spans": spans}
+
+
+# ===============================
+# Export
+# ===============================
+
+
+def _prometheus_escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _prometheus_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_prometheus_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def to_prometheus(metrics):
+    """
+    :param metrics: snapshot()
+    :return: the metrics in the Prometheus text exposition format
+    """
+    lines = []
+    for counter in metrics["counters"]:
+        lines.append(f"challenger_stats_{counter['name']}{_prometheus_labels(counter['labels'])} {counter['value']}")
+    for path, stats in metrics["spans"].items():
+        labels = _prometheus_labels({"span": path})
+        lines.append(f"challenger_stats_span_count{labels} {stats['count']}")
+        lines.append(f"challenger_stats_span_seconds_total{labels} {stats['seconds']:.6f}")
+        lines.append(f"challenger_stats_span_seconds_max{labels} {stats['max_seconds']:.6f}")
+    return "\n".join(lines) + "\n"
+
+
+def export_metrics(service_name=None, since=None, export=METRICS_EXPORT):
+    """
+    Write the metrics: one JSON line appended to METRICS_JSONL_PATH, or the whole
+    METRICS_PROMETHEUS_PATH textfile replaced (for the node_exporter textfile collector).
+    The JSON line holds only what was recorded after `since`, the textfile stays cumulative
+    as Prometheus counters must be.
+
+    :param service_name: recorded with the JSON line
+    :param since: snapshot() taken when the service started, None for the totals since start up
+    :param export: "jsonl", "prometheus" or "none"
+    :return: the metrics recorded after `since`
+    """
+    metrics = snapshot()
+    recorded = delta(since, metrics) if since is not None else metrics
+    if export == "jsonl":
+        line = {"time": datetime.now(timezone.utc).isoformat(), "service": service_name, **recorded}
+        with _lock, open(METRICS_JSONL_PATH, "a") as f:
+            f.write(json.dumps(line) + "\n")
+    elif export == "prometheus":
+        # write then rename, the collector never reads a partial file
+        with open(METRICS_PROMETHEUS_PATH + ".tmp", "w") as f:
+            f.write(to_prometheus(metrics))
+        os.replace(METRICS_PROMETHEUS_PATH + ".tmp", METRICS_PROMETHEUS_PATH)
+    return recorded
+
+
+# ===============================
+# Lazy Log Payloads
+# ===============================
+
+
+class _Sample:
+    __slots__ = ("data", "size")
+
+    def __init__(self, data, size):
+        self.data = data
+        self.size = size
+
+    def __str__(self):
+        if isinstance(self.data, dict):
+            items = list(self.data.items())[:self.size]
+            return f"length: {len(self.data)}, sample: {dict(items)}"
+        if isinstance(self.data, (list, tuple, set)):
+            return f"length: {len(self.data)}, sample: {list(self.data)[:self.size]}"
+        return str(self.data)
+
+
+def sample(data, size=LOG_SAMPLE_SIZE):
+    """
+    Log argument that is only formatted when the record is actually emitted, and then only as the
+    length and the first `size` items. Use with %-style logging: logging.info("Data: %s", sample(data))
+    """
+    return _Sample(data, size)
@@ -0,0 +1,86 @@
+import asyncio
+
+from backend.app.instrumentation import increment, span
+
+
+# ===============================
+# Staged Async Pipeline
+# ===============================
+# source (async iterator) -> queue -> transform -> queue -> batched writer
+# Queues are bounded, so a slow writer applies backpressure all the way back to the
+# fetches and only queue_size + batch_size items are ever held in memory.
+
+_END = object()
+
+
+async def _feed(source, outbox):
+    async for item in source:
+        increment("pipeline_items_total", stage="source")
+        await outbox.put(item)
+    await outbox.put(_END)
+
+
+async def _transform(inbox, outbox, transform):
+    while True:
+        item = await inbox.get()
+        if item is _END:
+            await outbox.put(_END)
+            return
+        with span("transform"):
+            result = transform(item)
+        if result is not None:
+            increment("pipeline_items_total", stage="transform")
+            await outbox.put(result)
+
+
+def _flush(flush, batch):
+    with span("flush"):
+        flush(batch)
+    increment("pipeline_items_total", len(batch), stage="flush")
+
+
+async def _batch_writer(inbox, flush, batch_size, flush_seconds):
+    loop = asyncio.get_running_loop()
+    batch = []
+    deadline = None
+    while True:
+        timeout = None if not batch else max(0.0, deadline - loop.time())
+        try:
+            item = await asyncio.wait_for(inbox.get(), timeout)
+        except asyncio.TimeoutError:
+            item = None
+
+        if item is not None and item is not _END:
+            if not batch:
+                deadline = loop.time() + flush_seconds
+            batch.append(item)
+
+        if batch and (item is None or item is _END or len(batch) >= batch_size):
+            # flush is blocking database work, keep it off the event loop so fetches continue
+            await asyncio.to_thread(_flush, flush, batch)
+            batch = []
+
+        if item is _END:
+            return
+
+
+async def run_pipeline(source, transform, flush, batch_size=500, flush_seconds=5.0, queue_size=1000):
+    """
+    Run source -> transform -> flush as concurrent stages connected by bounded queues.
+
+    :param source: async iterator producing raw items (e.g., fetch_match_details_stream)
+    :param transform: sync function applied to each item, returning None drops the item
+    :param flush: sync function called with a list of transformed items, run in a worker thread
+    :param batch_size: flush once this many items are buffered
+    :param flush_seconds: flush a partial batch once its oldest item has waited this long
+    :param queue_size: capacity of each queue between stages
+    """
+    raw_queue = asyncio.Queue(maxsize=queue_size)
+    transformed_queue = asyncio.Queue(maxsize=queue_size)
+
+    # stage time is recorded under the caller's span: pipeline/transform (per item) and pipeline/flush (per batch)
+    with span("pipeline"):
+        async with asyncio.TaskGroup() as group:
+            group.create_task(_feed(source, raw_queue))
+            group.create_task(_transform(raw_queue, transformed_queue, transform))
+            group.create_task(_batch_writer(transformed_queue, flush, batch_size, flush_seconds))
@@ -1,14 +1,27 @@
+import functools
+import itertools
+import shutil
+import socket
 import time
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 
-from pydantic.v1 import ValidationError
+from pydantic import ValidationError
 from typing_extensions import assert_never
 
-from backend.app.api.fetch_data import fetch_apex_leagues, fetch_account_ids, fetch_matches_all, fetch_match_details_all, fetch_game_name_tagline_all
-from backend.app.db.db_actions import insert_data, clear_and_insert_data, clear_collection_data, remove_records
-from backend.app.db.db_queries import get_recent_players, get_player_puuids, get_match_ids, get_processed_match_ids, get_match_detail_ids, get_player_stats_match_details, get_player_summarized_stats
-from backend.app.api.validation import League
-from backend.app.api.transform_data import add_timestamps
+from backend.app.api.http_client import client_session
+from backend.app.api.response_store import MATCH_STORE_DIR, iter_stored_match_ids, iter_stored_matches
+from backend.app.api.fetch_data import SEASON_START_TIME_UNIX, get_routing_region, fetch_apex_leagues_stream, fetch_account_ids_stream, fetch_matches_all_stream, fetch_match_details_stream, fetch_game_name_tagline_stream
+from backend.app.db.db_connection import get_db_metrics
+from backend.app.db.db_actions import insert_data, insert_data_unordered, stamp_current_date, replace_collection_data, upsert_data, clear_collection_data, remove_records, remove_duplicates
+from backend.app.db.db_match_archive import MATCH_DETAIL_TRIM, archive_match_details, trim_match_detail, trim_stored_match_details
+from backend.app.db.db_watermarks import get_watermark, set_watermark
+from backend.app.db.db_indexes import ensure_indexes, report_collection_scans
+from backend.app.db.db_match_queue import seed_match_queue, enqueue_match_ids, requeue_match_ids, iter_claimed_match_ids, complete_match_ids, fail_match_ids, count_match_queue_status
+from backend.app.db.db_queries import get_recent_players, get_league_latest_entries, get_newest_league_snapshots, get_summoner_cache, get_player_puuids, get_player_platforms, get_game_name_tagline_fetched_at, get_match_id_crawl_watermarks, get_processed_match_ids, get_match_detail_ids, iter_match_detail_ids, get_match_detail_max_ingested_at, iter_tracked_players_stats_match_details, iter_match_participant_rows, get_player_matches_stats_puuids, get_player_summarized_stats_last_refresh, materialize_player_summarized_stats
+from backend.app.api.transform_data import add_timestamps, league_snapshot_delta
+from backend.app.services.pipeline import run_pipeline
+from backend.app.instrumentation import span, sample, snapshot, export_metrics
+from backend.app.analytics.columnar_cache import COLUMNAR_CACHE_DIR, MANIFEST_VERSION as COLUMNAR_MANIFEST_VERSION, read_manifest, append_rows, compact, load_table, group_stats, percentiles
 
 from dotenv import load_dotenv
 import os
@@ -18,6 +31,32 @@ import logging
 load_dotenv()
 MONGO_DB_URI = os.getenv("MONGO_URI")
 MONGO_DB_NAME = os.getenv("MONGO_DB_NAME")
+MATCH_DETAIL_BATCH_SIZE = int(os.getenv("MATCH_DETAIL_BATCH_SIZE", 200))
+MATCH_DETAIL_FLUSH_SECONDS = float(os.getenv("MATCH_DETAIL_FLUSH_SECONDS", 5.0))
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", 500))
+MATCH_QUEUE_CLAIM_SIZE = int(os.getenv("MATCH_QUEUE_CLAIM_SIZE", 100))
+MATCH_QUEUE_LEASE_SECONDS = int(os.getenv("MATCH_QUEUE_LEASE_SECONDS", 600))
+MATCH_QUEUE_MAX_ATTEMPTS = int(os.getenv("MATCH_QUEUE_MAX_ATTEMPTS", 3))
+PLAYER_MATCHES_STATS_WATERMARK = 'player_matches_stats.match_detail.ingested_at'
+# incremental readers of match_detail re-read this far behind their ingested_at watermark, so matches
+# whose ingest became visible late (concurrent workers) are still picked up
+MATCH_DETAIL_INGEST_OVERLAP_SECONDS = int(os.getenv("MATCH_DETAIL_INGEST_OVERLAP_SECONDS", 600))
+MATCH_ID_CRAWL_OVERLAP_SECONDS = int(os.getenv("MATCH_ID_CRAWL_OVERLAP_SECONDS", 3600))
+MATCH_ID_CRAWL_CONCURRENCY = int(os.getenv("MATCH_ID_CRAWL_CONCURRENCY", 20))
+MATCH_ID_CRAWL_BATCH_PLAYERS = int(os.getenv("MATCH_ID_CRAWL_BATCH_PLAYERS", 50))
+MATCH_ID_CRAWL_FLUSH_SECONDS = float(os.getenv("MATCH_ID_CRAWL_FLUSH_SECONDS", 5.0))
+SUMMONER_CACHE_TTL_DAYS = float(os.getenv("SUMMONER_CACHE_TTL_DAYS", 30))
+SUMMONER_REFRESH_BUDGET = int(os.getenv("SUMMONER_REFRESH_BUDGET", 500))
+SUMMONER_RESOLVE_BATCH_SIZE = int(os.getenv("SUMMONER_RESOLVE_BATCH_SIZE", 200))
+SUMMONER_RESOLVE_FLUSH_SECONDS = float(os.getenv("SUMMONER_RESOLVE_FLUSH_SECONDS", 5.0))
+# platforms whose apex leagues are tracked, e.g. "na1,euw1,kr"
+LEAGUE_PLATFORMS = [platform.strip() for platform in os.getenv("LEAGUE_PLATFORMS", "na1").split(",") if platform.strip()]
+COLUMNAR_SEGMENT_ROWS = int(os.getenv("COLUMNAR_SEGMENT_ROWS", 500000))
+LADDER_STATS_MIN_GAMES = int(os.getenv("LADDER_STATS_MIN_GAMES", 20))
+RIOT_ID_TTL_DAYS = float(os.getenv("RIOT_ID_TTL_DAYS", 7))
+RIOT_ID_REFRESH_BUDGET = int(os.getenv("RIOT_ID_REFRESH_BUDGET", 1000))
+RIOT_ID_BATCH_SIZE = int(os.getenv("RIOT_ID_BATCH_SIZE", 200))
+RIOT_ID_FLUSH_SECONDS = float(os.getenv("RIOT_ID_FLUSH_SECONDS", 5.0))
 
 logging.basicConfig(
     filename="services.log",  # Log file name
@@ -40,160 +79,378 @@ logging.basicConfig(
 
 # Insert Data
 # use db/db_actions.py to preform database inserts
+
+# API Clients
+# Services that call the Riot API are wrapped with @with_client_session so the pooled
+# http clients live for exactly one service run and their pool stats get logged
+
+# Indexes
+# Every service is wrapped with @with_indexes, the first service run in a process applies
+# db/db_indexes.py INDEXES and logs any query that still falls back to a collection scan
+
+# Metrics
+# Every service is wrapped with @with_metrics: the run is a span named after the service, stages inside
+# it are timed with `with span("fetch"|"transform"|"validate"|"insert")`, and the api/db/pipeline counters
+# (requests, 429s, retries, bytes, docs written, mongo commands) recorded during the run are exported when it ends (see
+# instrumentation.py, METRICS_EXPORT is off by default).
+# Payloads are logged lazily through sample(), never as whole f-string dumps
 # =======================================
 
 
+def with_client_session(service):
+    @functools.wraps(service)
+    async def wrapper(*args, **kwargs):
+        async with client_session() as pool_stats:
+            try:
+                return await service(*args, **kwargs)
+            finally:
+                logging.info(f"HTTP pool stats for {service.__name__}: {pool_stats()}")
+    return wrapper
+
+
+def with_metrics(service):
+    @functools.wraps(service)
+    async def wrapper(*args, **kwargs):
+        started = snapshot()
+        try:
+            with span(service.__name__):
+                return await service(*args, **kwargs)
+        finally:
+            recorded = export_metrics(service_name=service.__name__, since=started)
+            logging.info("Metrics of %s: %s", service.__name__, sample(recorded["spans"], size=50))
+            logging.info("Mongo pool stats after %s: %s", service.__name__, sample(get_db_metrics(), size=10))
+    return wrapper
+
+
+_indexes_ensured = False
+
+
+def with_indexes(service):
+    @functools.wraps(service)
+    async def wrapper(*args, **kwargs):
+        global _indexes_ensured
+        if not _indexes_ensured:
+            applied = ensure_indexes(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME)
+            logging.info(f"Indexes ensured: {applied}")
+            for collection_name, query_filter, sort in report_collection_scans(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME):
+                logging.warning(f"Collection scan: {collection_name} filter={query_filter} sort={sort}")
+            _indexes_ensured = True
+        return await service(*args, **kwargs)
+    return wrapper
+
+
+
 # Fetch Data
+# Every apex tier of every platform in LEAGUE_PLATFORMS is fetched at once, each platform under its own
+# rate limiters. league_latest keeps the newest full snapshot of each (platform, tier) for reads, while the
+# league collection keeps the history as per-entry deltas against the previous snapshot (see league_snapshot_delta).
+@with_metrics
+@with_indexes
+@with_client_session
 async def update_league_data():
     logging.info(f"START SERVICE: update_league_data")
     # Fetch Data
-    logging.info(f"Fetching data start: master league from NA")
-    data = await fetch_apex_leagues(apex_rank='master')
-    logging.info(f"Fetching data end: success \n Data: {data}")
+    logging.info(f"Fetching data start: apex leagues from {LEAGUE_PLATFORMS}")
+    league_data_list = []
+    with span("fetch"):
+        async for (platform, apex_rank), data, error in fetch_apex_leagues_stream(platforms=LEAGUE_PLATFORMS):
+            if isinstance(error, ValidationError):
+                logging.error(f"Validation failed for {apex_rank} league from {platform}: {error}")
+                continue
+            if error:
+                logging.error(f"Error fetching {apex_rank} league from {platform}: {error}")
+                continue
+            data["platform"] = platform
+            league_data_list.append(data)
+    logging.info(f"Fetching data end: success \n leagues: {len(league_data_list)}, "
+                 f"entries: {sum(len(data.get('entries', [])) for data in league_data_list)}")
 
     # Transform Data
     logging.info(f"Transforming data start: \n Transformations applied: add_timestamps")
-    data = add_timestamps(data=data, field='added_at')
-    logging.info(f"Transforming data end: success \n Data: {data}")
+    with span("transform"):
+        league_data_list = [add_timestamps(data=data, field='added_at') for data in league_data_list]
+    logging.info(f"Transforming data end: success")
 
     # Validate Data
-    logging.info(f"Validating data start: pydantic model League")
-    try:
-        league_data  = League(**data)
-        # league_data  = League(**data, added_at=datetime.now())
-        validated_data = league_data.model_dump()
-        logging.info(f"Validating data end: success \n Validated data: {validated_data}")
-    except ValidationError as e:
-        logging.info(f"Validation failed: {e}")
+    # validated on fetch straight from the response bytes (validation.LeaguePayload), an invalid league is a fetch error
+    validated_data_list = league_data_list
+
+    if not validated_data_list:
+        logging.info(f"END SERVICE: update_league_data | nothing to insert")
         return
 
+    # Transform Data
+    # diff each snapshot against the current league_latest document of its platform and tier
+    logging.info(f"Transforming data start: \n Transformations applied: league_snapshot_delta")
+    with span("transform"):
+        latest_entries = get_league_latest_entries()
+        delta_list = [league_snapshot_delta(league=league, previous_entries=latest_entries.get((league['platform'], league['tier'])))
+                      for league in validated_data_list]
+    logging.info(f"Transforming data end: success \n entries: {sum(len(league['entries']) for league in validated_data_list)}, "
+                 f"delta entries: {sum(len(delta['entries']) for delta in delta_list)}")
+
     # Insert Data
-    logging.info(f"Inserting data start: database {MONGO_DB_NAME}, collection league")
-    insert_id = insert_data(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, collection_name='league', data=validated_data)
-    logging.info(f"Inserting data end: success \n insert_id: {insert_id}")
+    # history first, then move the pointers: each league_latest document is replaced in a single atomic update
+    logging.info(f"Inserting data start: database {MONGO_DB_NAME}, collections league, league_latest")
+    with span("insert"):
+        insert_id = insert_data(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, collection_name='league', data=delta_list)
+        upsert_counts = upsert_data(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, collection_name='league_latest',
+                                    data=validated_data_list, key=['platform', 'tier'])
+    logging.info("Inserting data end: success \n insert_id: %s, league_latest upsert counts: %s", sample(insert_id), upsert_counts)
 
     logging.info(f"END SERVICE: update_league_data")
 
 # remove maybe belongs in db_queries section??
+@with_metrics
+@with_indexes
 async def query_recent_players():
     logging.info(f"START SERVICE: query_recent_players")
     # Fetch Data
     logging.info(f"Database query start: get_recent_players")
-    data = get_recent_players()
-    logging.info(f"Database query end: length is {len(data)} \n Data: {data}")
+    with span("fetch"):
+        data = get_recent_players()
+    logging.info("Database query end: length is %s \n Data: %s", len(data), sample(data))
 
     logging.info(f"END SERVICE: query_recent_players")
 
 
+# summonerId -> puuid/accountId almost never changes, so resolutions are kept in the summoner_cache collection.
+# Only summoners never seen before, plus the oldest entries past SUMMONER_CACHE_TTL_DAYS (at most
+# SUMMONER_REFRESH_BUDGET per run), are resolved through summoner-v4.
+@with_metrics
+@with_indexes
+@with_client_session
 async def update_player_ids_data():
     logging.info(f"START SERVICE: update_player_ids_data")
     # Fetch Data
     logging.info(f"Fetching data start: \n get recent_player data from db query")
-    apex_league_data = get_recent_players()
-    logging.info(f"Fetching data end: success \n Data: {apex_league_data}")
+    with span("fetch"):
+        apex_league_data = get_recent_players()
+    logging.info("Fetching data end: success \n Data: %s", sample(apex_league_data))
+
+    summoner_platforms = {item['summonerId']: item['platform'] for item in apex_league_data}
+    summoner_ids = list(summoner_platforms)
+
+    logging.info(f"Fetching data start: \n get cached summoner resolutions from db query")
+    with span("fetch"):
+        summoner_cache = get_summoner_cache(summoner_ids=summoner_ids)
+    stale_before = datetime.now(timezone.utc) - timedelta(days=SUMMONER_CACHE_TTL_DAYS)
+    unseen_summoner_ids = [summoner_id for summoner_id in summoner_ids if summoner_id not in summoner_cache]
+    stale_entries = sorted((entry for entry in summoner_cache.values()
+                            if entry["verified_at"].replace(tzinfo=timezone.utc) < stale_before),
+                           key=lambda entry: entry["verified_at"])
+    stale_summoner_ids = [entry["summonerId"] for entry in stale_entries[:SUMMONER_REFRESH_BUDGET]]
+    logging.info(f"Fetching data end: success \n cached: {len(summoner_cache)}, unseen: {len(unseen_summoner_ids)}, "
+                 f"stale: {len(stale_entries)}, refreshing: {len(stale_summoner_ids)}")
 
     # Transform Data
-    logging.info(f"Transforming data start: \n Transformations applied: fetch additional ids from api for each summonerId")
-    summoner_ids = [item['summonerId'] for item in apex_league_data]
-
-
-    player_ids = []
-    for summoner_id in summoner_ids:
-        account_data = await fetch_account_ids(summoner_id=summoner_id)  # Awaiting the async function
-        player_ids.append({
+    # each summoner is resolved on the platform its league entry came from
+    logging.info(f"Transforming data start: \n Transformations applied: fetch additional ids from api for unseen and stale summonerIds")
+    counts = {"resolved": 0, "failed": 0}
+
+    def transform(result):
+        summoner_id, account_data, error = result
+        if error:
+            # a stale entry keeps its cached resolution, an unseen one is retried next run
+            counts["failed"] += 1
+            logging.error(f"Error fetching account ids for summonerId {summoner_id}: {error}")
+            return None
+        return {
             "summonerId": account_data["id"],
             "accountId": account_data["accountId"],
             "puuid": account_data["puuid"],
             "profileIconId": account_data["profileIconId"],
             "revisionDate": account_data["revisionDate"],
             "summonerLevel": account_data["summonerLevel"],
-        })
-        await asyncio.sleep(1.25)
-
-    logging.info(f"Transforming data end: \n Data: {player_ids}")
+            "platform": summoner_platforms[summoner_id],
+            "verified_at": datetime.now(timezone.utc),
+        }
+
+    def flush(resolved_batch):
+        upsert_data(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, collection_name='summoner_cache',
+                    data=resolved_batch, key='summonerId')
+        counts["resolved"] += len(resolved_batch)
+
+    await run_pipeline(
+        source=fetch_account_ids_stream(summoner_id_platforms=[(summoner_id, summoner_platforms[summoner_id])
+                                                              for summoner_id in unseen_summoner_ids + stale_summoner_ids]),
+        transform=transform,
+        flush=flush,
+        batch_size=SUMMONER_RESOLVE_BATCH_SIZE,
+        flush_seconds=SUMMONER_RESOLVE_FLUSH_SECONDS,
+        queue_size=PIPELINE_QUEUE_SIZE,
+    )
+
+    summoner_cache = get_summoner_cache(summoner_ids=summoner_ids)
+    player_fields = ("summonerId", "accountId", "puuid", "profileIconId", "revisionDate", "summonerLevel")
+    player_ids = [{**{field: summoner_cache[summoner_id][field] for field in player_fields},
+                   "platform": summoner_platforms[summoner_id]}
+                  for summoner_id in summoner_ids if summoner_id in summoner_cache]
+
+    logging.info("Transforming data end: \n counts: %s \n Data: %s", counts, sample(player_ids))
 
     # Validate Data
-    logging.info(f"Validating data start: \n need to implement validation...")
-    # need to implement this with pydantic...
+    # summoner-v4 responses are validated on fetch (validation.SummonerPayload), failures are counted above.
+    # An empty ladder (e.g. league_latest not seeded yet, see seed_league_latest) would wipe every tracked player
     validation_check = True
-    logging.info(f"Validating data end: \n success")
+    if not player_ids:
+        validation_check = False
+        logging.error(f"Validating data end: no players resolved, player_ids is left unchanged")
 
     # Insert Data
+    # build the new player_ids in a staging collection and swap it in atomically
     logging.info(f"Inserting data start: \n database: {MONGO_DB_NAME}, collection: player_ids")
     if validation_check:
-        insert_id = clear_and_insert_data(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, collection_name='player_ids', data=player_ids)
-        logging.info(f"Inserting data end: success \n insert_id: {insert_id}")
+        with span("insert"):
+            insert_id = replace_collection_data(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, collection_name='player_ids', data=player_ids)
+        logging.info("Inserting data end: success \n insert_id: %s", sample(insert_id))
 
     logging.info(f"END SERVICE: update_player_ids_data")
 
 
+# Riot IDs change rarely, so each entry records when it was fetched (fetched_at) and a run only fetches
+# puuids never seen before and entries older than RIOT_ID_TTL_DAYS, oldest first, at most RIOT_ID_REFRESH_BUDGET.
+@with_metrics
+@with_indexes
+@with_client_session
 async def update_game_name_taglines():
     # Fetch 1
     logging.info(f"START SERVICE: update_game_name_taglines")
     logging.info(f"Fetching data start: \n get player puuid data from db query")
-    puuid_list = get_player_puuids()
-    logging.info(f"Fetching data end: success \n Data length: {len(puuid_list)}")
-
-    # Fetch 2
+    with span("fetch"):
+        puuid_list = get_player_puuids()
+        fetched_at = get_game_name_tagline_fetched_at()
+    logging.info(f"Fetching data end: success \n Data length: {len(puuid_list)}, stored: {len(fetched_at)}")
+
+    # new puuids first, then stale ones oldest first (entries without fetched_at predate tracking)
+    stale_before = datetime.now(timezone.utc) - timedelta(days=RIOT_ID_TTL_DAYS)
+    oldest = datetime.min.replace(tzinfo=timezone.utc)
+    new_puuids = [puuid for puuid in dict.fromkeys(puuid_list) if puuid not in fetched_at]
+    stale_puuids = sorted((puuid for puuid in set(puuid_list) if puuid in fetched_at
+                           and (fetched_at[puuid] is None or fetched_at[puuid].replace(tzinfo=timezone.utc) < stale_before)),
+                          key=lambda puuid: fetched_at[puuid].replace(tzinfo=timezone.utc) if fetched_at[puuid] else oldest)
+    refresh_puuids = (new_puuids + stale_puuids)[:RIOT_ID_REFRESH_BUDGET]
+    logging.info(f"Selecting data end: \n new: {len(new_puuids)}, stale: {len(stale_puuids)}, refreshing: {len(refresh_puuids)}")
+
+    # Fetch 2, Validation, Insertion
+    # fetched concurrently and upserted on puuid in batches, so a renamed player is updated in place
     logging.info(f"Fetching data start: \n get game name and tagline data from api call")
-    game_name_taglines_list = await fetch_game_name_tagline_all(puuid_list=puuid_list)
-    logging.info(f"Fetching data end: success \n Data length: {len(game_name_taglines_list)}")
-    logging.info(f"Fetching data end: success \n Data sample: {game_name_taglines_list[0:10]}")
-
-    # Validation
-    # validate data before insertion
-    logging.info(f"Validating data start: \n need to implement validation...")
-    # need to implement this with pydantic...
-    validation_check = True
-    logging.info(f"Validating data end: \n success")
-
-    # Insertion
-    # clear table and insert data
-    logging.info(f"Inserting data start: \n database: {MONGO_DB_NAME}, collection: game_name_taglines")
-    if validation_check:
-        insert_id_list = clear_and_insert_data(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, collection_name='game_name_taglines',
-                                     data=game_name_taglines_list)
-        logging.info(f"Inserting data end: success \n insert_id_list length: {len(insert_id_list)}")
-
-    logging.info(f"END SERVICE: update_match_ids_data")
-
+    counts = {"fetched": 0, "failed": 0, "matched": 0, "modified": 0, "upserted": 0}
+
+    def transform(result):
+        puuid, account_data, error = result
+        if error:
+            # keeps the stored name, the entry is retried on a later run
+            counts["failed"] += 1
+            logging.error(f"Error fetching game_name_tagline for player puuid {puuid}: {error}")
+            return None
+        account_data["fetched_at"] = datetime.now(timezone.utc)
+        return account_data
+
+    def flush(game_name_taglines_batch):
+        # account-v1 responses are validated on fetch (validation.AccountPayload)
+        upsert_counts = upsert_data(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, collection_name='game_name_taglines',
+                                    data=game_name_taglines_batch, key='puuid')
+        counts["fetched"] += len(game_name_taglines_batch)
+        for name, count in upsert_counts.items():
+            counts[name] += count
+
+    await run_pipeline(
+        source=fetch_game_name_tagline_stream(puuid_list=refresh_puuids),
+        transform=transform,
+        flush=flush,
+        batch_size=RIOT_ID_BATCH_SIZE,
+        flush_seconds=RIOT_ID_FLUSH_SECONDS,
+        queue_size=PIPELINE_QUEUE_SIZE,
+    )
+    logging.info(f"Inserting data end: success \n database: {MONGO_DB_NAME}, collection: game_name_taglines, counts: {counts}")
+
+    logging.info(f"END SERVICE: update_game_name_taglines")
+
+# Incremental: each player's crawl starts from the time of their previous crawl (match_id_crawl collection),
+# so a routine refresh asks for one page per player. Players never crawled start at SEASON_START_TIME_UNIX.
+# Players are crawled concurrently (bounded, under the match-v5 rate limits) and their ids are
+# deduplicated and written in batches while the crawl continues.
+@with_metrics
+@with_indexes
+@with_client_session
 async def update_match_ids_data():
     logging.info(f"START SERVICE: update_match_ids_data")
-    # ~ 1 HOUR RUN TIME, with sleep time of 3 sec
 
     # Fetches
     # (1) Get puuids data from database
-    # (2) Fetch match Ids from api using puuids
+    # (2) Get each player's last crawl time from database
+    # (3) Fetch match Ids from api using puuids, starting at the last crawl time
     logging.info(f"Fetching data start: \n get player puuid data from db query")
-    puuid_data = get_player_puuids()
+    with span("fetch"):
+        puuid_data = get_player_puuids()
+        player_platforms = get_player_platforms()
     logging.info(f"Fetching data end: success \n Data length: {len(puuid_data)}")
 
-    match_ids_set = set()  # use a set to avoid adding duplicate match_ids
-    for puuid in puuid_data:
-        match_ids = await fetch_matches_all(puuid=puuid)
-        match_ids_set.update(match_ids)
+    logging.info(f"Fetching data start: \n get match id crawl watermarks from db query")
+    with span("fetch"):
+        crawl_watermarks = get_match_id_crawl_watermarks()
+    logging.info(f"Fetching data end: success \n Data length: {len(crawl_watermarks)}")
+
+    # every player's watermark moves to the start of this run, games started during the run are re-asked next time
+    crawl_started_at = int(time.time())
+    season_start = int(SEASON_START_TIME_UNIX)
+    # step back a little so games that were still being played at the last crawl are not missed.
+    # Each player is crawled on the regional routing of their platform
+    puuid_start_times = (
+        (puuid, max(season_start, crawl_watermarks.get(puuid, season_start) - MATCH_ID_CRAWL_OVERLAP_SECONDS),
+         get_routing_region(player_platforms.get(puuid)))
+        for puuid in puuid_data
+    )
+
+    seen_match_ids = set()  # match ids already handed to the writer this run, across all players
+    totals = {"players": 0, "failed_players": 0, "match_ids": 0, "upserted": 0}
 
     # Transforms
-    # transform the match ids into proper format for database insert
-    match_ids_list = list(match_ids_set)  # convert to a list so pymongo can insert it into db
-    insert_timestamp = datetime.now()
-    documents = [{"match_id": match_id, "inserted_at": insert_timestamp} for match_id in match_ids_list]
-
+    # drop failed players and match ids another player already produced this run
+    def transform(result):
+        puuid, match_ids, error = result
+        if error:
+            totals["failed_players"] += 1
+            logging.error(f"Error fetching match ids for player puuid {puuid}: {error}")
+            return None
+        new_match_ids = [match_id for match_id in match_ids if match_id not in seen_match_ids]
+        seen_match_ids.update(new_match_ids)
+        return puuid, new_match_ids
 
     # Validation
-    # validate data before insertion
-    logging.info(f"Validating data start: \n need to implement validation...")
-    # need to implement this with pydantic...
+    # match id pages are validated on fetch (validation.MatchIdsPayload), a failed page fails the player above
     validation_check = True
-    logging.info(f"Validating data end: \n success")
 
     # Insertion
-    # clear table and insert data
-    logging.info(f"Inserting data start: \n database: {MONGO_DB_NAME}, collection: match_id")
-    if validation_check:
-        insert_id = clear_and_insert_data(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, collection_name='match_id',
-                                          data=documents)
-        logging.info(f"Inserting data end: success \n insert_id: {insert_id}")
+    # upsert on match_id, already known match ids keep their original inserted_at.
+    # A player's watermark only moves in the same flush that stores their match ids
+    def flush(batch):
+        if not validation_check:
+            return
+        insert_timestamp = datetime.now()
+        documents = [{"match_id": match_id, "inserted_at": insert_timestamp}
+                     for _, match_ids in batch for match_id in match_ids]
+        upsert_counts = upsert_data(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, collection_name='match_id',
+                                    data=documents, key='match_id', set_on_insert=['inserted_at'])
+        enqueue_match_ids(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, match_ids=[doc["match_id"] for doc in documents])
+        upsert_data(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, collection_name='match_id_crawl',
+                    data=[{"puuid": puuid, "last_crawled_at": crawl_started_at} for puuid, _ in batch], key='puuid')
+        totals["players"] += len(batch)
+        totals["match_ids"] += len(documents)
+        totals["upserted"] += upsert_counts["upserted"]
+        logging.info(f"Inserting data: collection match_id, totals so far: {totals}")
+
+    logging.info(f"Pipeline start: \n crawl match ids -> dedupe -> upsert into match_id and match_queue")
+    await run_pipeline(
+        source=fetch_matches_all_stream(puuid_start_times=puuid_start_times, concurrency=MATCH_ID_CRAWL_CONCURRENCY),
+        transform=transform,
+        flush=flush,
+        batch_size=MATCH_ID_CRAWL_BATCH_PLAYERS,
+        flush_seconds=MATCH_ID_CRAWL_FLUSH_SECONDS,
+        queue_size=PIPELINE_QUEUE_SIZE,
+    )
+    logging.info(f"Pipeline end: \n database: {MONGO_DB_NAME}, collection: match_id, totals: {totals}")
 
     logging.info(f"END SERVICE: update_match_ids_data")
 
@@ -202,65 +459,92 @@ async def update_match_ids_data():
     # From scratch to fully update database is currently expected to take ~ 15 hours or 5 hours per 10k records
     # starting from scratch will take longer as the season gets longer
     # if the table are already populated this should take a matter of minutes
+# Runs as a pipeline: fetch (concurrent, rate limited) -> transform/validate -> batched insert,
+# with bounded queues in between so memory stays flat however many matches are pending
+@with_metrics
+@with_indexes
+@with_client_session
 async def update_match_detail():
     logging.info(f"START SERVICE: update_match_detail")
     # Capture the start time
     start_time = time.time()
 
     # Fetch 1
-    logging.info(f"Fetching data start: \n Get match_id data from db query")
-    match_id_data = get_match_ids()
-    logging.info(f"Fetching data end: success \n length: {len(match_id_data)}")
-
-    logging.info(f"Fetching data start: \n Get processed_match_id data from db query")
-    processed_match_id_data = get_processed_match_ids()
-    logging.info(f"Fetching data end: success \n length: {len(processed_match_id_data)}")
-
-    # Transform 2
-    logging.info(f"Transforming data start: \n Filter to find matches that need to be processed")
-    match_ids_to_process = [match_id for match_id in match_id_data if match_id not in processed_match_id_data]
-    logging.info(f"Transforming data end: success \n length: {len(match_ids_to_process)}")
-
-    logging.info(f"Transforming data start: Truncate match_ids_to_process to 2000 (to limit execution time)")
-    match_ids_to_process = match_ids_to_process[0:2000]
-    logging.info(f"Transforming data end: success \n length: {len(match_ids_to_process)}")
-
-    # Fetch 2
-    logging.info(f"Fetching data start: \n get match_details from api calls")
-    match_details_list = []
-    try:
-        match_details_list = await fetch_match_details_all(match_id_list=match_ids_to_process)
-    except Exception as e:
-        logging.error(f"An error occurred while fetching match details: {e}", exc_info=True)
-
-    logging.info(f"Fetching data end: success \n length: {len(match_details_list)}")
-
-    # Transform 2
-    logging.info(f"Transforming data start: marking processed matches true for database records")
-    match_ids_to_process_list = [{"match_id": match_id, "processed_with_api_call": True} for match_id in match_ids_to_process]
-    logging.info(f"Transforming data end: success , \n length: {len(match_ids_to_process_list)}")
+    # lease work from the match_queue, which update_match_ids_data fills as it crawls new match ids.
+    # Several workers can run this service at once, each leases disjoint batches.
+    logging.info(f"Fetching data start: \n match_queue status: {count_match_queue_status(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME)}")
+
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    match_ids_to_process = iter_claimed_match_ids(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, worker_id=worker_id,
+                                                  batch_size=MATCH_QUEUE_CLAIM_SIZE,
+                                                  lease_seconds=MATCH_QUEUE_LEASE_SECONDS)
+
+    counts = {"fetch_failed": 0, "invalid": 0, "written": 0}
+    failed_match_ids = {}  # match_id -> error, released back to the queue on the next flush
+
+    # Transform 2 / Validation
+    # payloads are validated on fetch (validation.MatchDetailPayload),
+    # drop failed fetches, invalid payloads and payloads that are not the match we asked for
+    def transform(result):
+        match_id, match_details, error = result
+        if isinstance(error, ValidationError):
+            counts["invalid"] += 1
+            failed_match_ids[match_id] = str(error)
+            logging.error(f"Validation failed for match ID {match_id}: {error}")
+            return None
+        if error:
+            counts["fetch_failed"] += 1
+            failed_match_ids[match_id] = str(error)
+            logging.error(f"Error fetching match details for match ID {match_id}: {error}")
+            return None
+        if match_details.get("metadata", {}).get("matchId") != match_id:
+            counts["invalid"] += 1
+            failed_match_ids[match_id] = "metadata.matchId does not match"
+            logging.error(f"Validation failed for match ID {match_id}: metadata.matchId does not match")
+            return None
+        return match_details
+
+    def release_failed():
+        failures = {match_id: failed_match_ids.pop(match_id) for match_id in list(failed_match_ids)}
+        fail_match_ids(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, failures=failures,
+                       max_attempts=MATCH_QUEUE_MAX_ATTEMPTS)
 
-    # Validation
-    # validate data before insertion
-    logging.info(f"Validating data start: \n need to implement validation...")
-    # need to implement this with pydantic...
-    validation_check = True
-    logging.info(f"Validating data end: \n success")
-
-    # Insertion 1
-    logging.info(f"Inserting data start: \n database: {MONGO_DB_NAME}, collection: match_detail")
-    if validation_check:
-        insert_id_list = insert_data(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, collection_name='match_detail',
-                                          data=match_details_list)
-        logging.info(f"Inserting data end: success \n insert_id_list length: {len(insert_id_list)}")
-
-    # Insertion 2
-    # ONLY PREFORM THIS IF DATA HAS ACTUALLY BEEN INSERTED (VALIDATE THIS WITH QUERY?)
-    logging.info(f"Inserting data start: \n database: {MONGO_DB_NAME}, collection: processed_match_id")
-    if validation_check:
-        insert_id_list = insert_data(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, collection_name='processed_match_id',
-                                          data=match_ids_to_process_list)
-        logging.info(f"Inserting data end: success \n insert_id_list length: {len(insert_id_list)}")
+    # Insertion
+    # archive the full payloads (a no-op for matches already in the response store) and insert a batch
+    # of trimmed match_details (see db_match_archive),
+    # then mark processed only the matches that were actually written
+    def flush(match_details_batch):
+        if MATCH_DETAIL_TRIM:
+            archive_match_details(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, data=match_details_batch)
+            match_details_batch = [trim_match_detail(match_details) for match_details in match_details_batch]
+        written_list = insert_data_unordered(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, collection_name='match_detail',
+                                             data=match_details_batch)
+        stamp_current_date(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, collection_name='match_detail',
+                           key='metadata.matchId', values=[match_details["metadata"]["matchId"] for match_details in written_list],
+                           field='ingested_at')
+        processed_list = [{"match_id": match_details["metadata"]["matchId"], "processed_with_api_call": True}
+                          for match_details in written_list]
+        upsert_data(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, collection_name='processed_match_id',
+                    data=processed_list, key='match_id')
+        complete_match_ids(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME,
+                           match_ids=[processed["match_id"] for processed in processed_list])
+        release_failed()
+        counts["written"] += len(written_list)
+        logging.info(f"Inserting data: {len(written_list)}/{len(match_details_batch)} match_detail written, "
+                     f"{counts['written']} total")
+
+    logging.info(f"Pipeline start: \n fetch match_details -> validate -> insert into match_detail and processed_match_id")
+    await run_pipeline(
+        source=fetch_match_details_stream(match_id_list=match_ids_to_process),
+        transform=transform,
+        flush=flush,
+        batch_size=MATCH_DETAIL_BATCH_SIZE,
+        flush_seconds=MATCH_DETAIL_FLUSH_SECONDS,
+        queue_size=PIPELINE_QUEUE_SIZE,
+    )
+    release_failed()
+    logging.info(f"Pipeline end: \n counts: {counts}")
+    logging.info(f"match_queue status: {count_match_queue_status(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME)}")
 
     # Capture the end time
     end_time = time.time()
@@ -268,30 +552,60 @@ async def update_match_detail():
     # Calculate the time difference
     time_difference = end_time - start_time
 
-    # Format time differnce as hours minutes seconds
-    formatted_duration = str(timedelta(seconds=time_difference))
-
     logging.info(f"END SERVICE: update_match_detail | Duration: {time_difference:.2f} seconds")
 
 
-async def update_player_matches_stats():
+# Incremental by default: only match_detail documents ingested after the stored ingested_at watermark (minus
+# MATCH_DETAIL_INGEST_OVERLAP_SECONDS) are read, and rows are upserted on (match_id, puuid) so the overlap and
+# reruns never duplicate them. ingested_at is set by the server when a match is stored (see update_match_detail),
+# a match committed late by another worker still lands inside the overlap of the next run.
+# The first run (or full_refresh=True) rebuilds the whole collection with a staging swap.
+@with_metrics
+@with_indexes
+async def update_player_matches_stats(full_refresh=False):
     logging.info(f"START SERVICE: update_player_matches_stats")
 
     # Fetch list of all players from db query
     logging.info(f"Fetching data start: \n Get puuids data from db query")
     puuids_list = get_player_puuids()
-    logging.info(f"puuids_list sample: {puuids_list[0:10]}")
+    logging.info("puuids_list: %s", sample(puuids_list))
 
     logging.info(f"Fetching data end: success \n length: {len(puuids_list)}")
 
-    logging.info(f"Transform data start: \n Generate player_match_stats data from db query")
-    player_match_stats_list = []
-
-    # Transform Generate player matches stats from database query
-    for puuid in puuids_list:
-        player_match_stats = get_player_stats_match_details(player_puuid=puuid)
-        player_match_stats_list.extend(player_match_stats)
-    logging.info(f"Transform data end: success \n length: {len(player_match_stats_list)}")
+    # Capture the range of match_detail to process before reading it,
+    # matches ingested while this runs are picked up by the next run
+    watermark = None if full_refresh else get_watermark(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME,
+                                                        name=PLAYER_MATCHES_STATS_WATERMARK)
+    ingested_up_to = get_match_detail_max_ingested_at()
+    incremental = watermark is not None
+    ingested_after = watermark - timedelta(seconds=MATCH_DETAIL_INGEST_OVERLAP_SECONDS) if incremental else None
+    logging.info(f"Transform data start: \n Generate player_match_stats data from db query, "
+                 f"mode: {f'incremental after {ingested_after}' if incremental else 'full'}")
+
+    # Transform Generate player matches stats from database query, one pass over match_detail for all players.
+    # Rows are streamed from the cursor into the writes below in chunks, never held in memory all at once
+    player_match_stats_iter = iter_tracked_players_stats_match_details(player_puuids=puuids_list, ingested_after=ingested_after,
+                                                                       ingested_up_to=ingested_up_to if incremental else None)
+    if incremental:
+        # players new to the tracked set have no rows yet, backfill their whole history
+        known_puuids = set(get_player_matches_stats_puuids())
+        new_puuids = [puuid for puuid in puuids_list if puuid not in known_puuids]
+        if new_puuids:
+            player_match_stats_iter = itertools.chain(
+                player_match_stats_iter,
+                iter_tracked_players_stats_match_details(player_puuids=new_puuids),
+            )
+
+    # updated_at lets update_player_summarized_stats recompute only players with new rows
+    updated_at = datetime.now(timezone.utc)
+    row_count = 0
+
+    def stamped_rows():
+        nonlocal row_count
+        for player_match_stats in player_match_stats_iter:
+            player_match_stats["updated_at"] = updated_at
+            row_count += 1
+            yield player_match_stats
 
     # Validation
     logging.info(f"Validating data start: \n need to implement validation...")
@@ -299,49 +613,248 @@ async def update_player_matches_stats():
     logging.info(f"Validating data end: \n success")
 
     # Insert records into player_matches_stats
-    logging.info(f"Data trying to insert: {player_match_stats_list[0:10]}")
-
     logging.info(f"Inserting data start: \n database: {MONGO_DB_NAME}, collection: player_matches_stats")
     if validation_check:
-        insert_id_list = insert_data(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, collection_name='player_matches_stats',
-                                          data=player_match_stats_list)
-        logging.info(f"Inserting data end: success \n insert_id_list length: {len(insert_id_list)}")
+        if incremental:
+            upsert_counts = upsert_data(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, collection_name='player_matches_stats',
+                                        data=stamped_rows(), key=['match_id', 'puuid'])
+            logging.info(f"Inserting data end: success \n rows: {row_count}, upsert counts: {upsert_counts}")
+        else:
+            insert_id_list = replace_collection_data(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME,
+                                                     collection_name='player_matches_stats', data=stamped_rows())
+            logging.info(f"Inserting data end: success \n rows: {row_count}, insert_id_list length: {len(insert_id_list)}")
+
+        if ingested_up_to is not None:
+            set_watermark(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, name=PLAYER_MATCHES_STATS_WATERMARK,
+                          value=ingested_up_to)
 
     logging.info(f"END SERVICE: update_player_matches_stats")
 
 
-async def update_player_summarized_stats():
+@with_metrics
+@with_indexes
+async def update_player_summarized_stats(full_refresh=False):
     logging.info(f"START SERVICE: update_player_summarized_stats")
 
     # Fetch list of all players from db
     logging.info(f"Fetching data start: \n Get puuids data from db query")
     puuids_list = get_player_puuids()
-    logging.info(f"puuids_list sample: {puuids_list[0:10]}")
+    logging.info("puuids_list: %s", sample(puuids_list))
     logging.info(f"Fetching data end: success \n length: {len(puuids_list)}")
 
-    # Transform generate player matches stats from database
-    logging.info(f"Transform data start: \n Generate player_summarized_stats data from db query")
-    player_summarized_stats_list = []
-    for puuid in puuids_list:
-        player_summarized_stats = get_player_summarized_stats(player_puuid=puuid)
-        player_summarized_stats_list.extend(player_summarized_stats)
-    logging.info(f"Transform data end: success \n length: {len(player_summarized_stats_list)}")
+    # Incremental unless asked otherwise or this never ran: only players whose match rows changed
+    changed_since = None
+    if not full_refresh:
+        changed_since = get_player_summarized_stats_last_refresh()
 
-    # Validation
-    logging.info(f"Validating data start: \n need to implement validation...")
-    validation_check = True
-    logging.info(f"Validating data end: \n success")
+    # Transform + Insert
+    # the whole summary is grouped on the server and written with $out (full) or $merge (incremental)
+    logging.info(f"Materialize data start: \n database: {MONGO_DB_NAME}, collection: player_summarized_stats, "
+                 f"mode: {'full' if changed_since is None else f'incremental since {changed_since}'}")
+    refreshed_count = materialize_player_summarized_stats(player_puuids=puuids_list, changed_since=changed_since)
+    logging.info(f"Materialize data end: success \n players refreshed: {refreshed_count}")
 
-    # Insert records into player_matches_stats
-    logging.info(f"Inserting data start: \n database: {MONGO_DB_NAME}, collection: player_summarized_stats")
-    logging.info(f"Data trying to insert sample: {player_summarized_stats_list[0:10]}")
+    logging.info(f"END SERVICE: update_player_summarized_stats")
 
-    if validation_check:
-        insert_id_list = clear_and_insert_data(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, collection_name='player_summarized_stats',
-                                          data=player_summarized_stats_list)
-        logging.info(f"Inserting data end: success \n insert_id_list length: {len(insert_id_list)}")
 
-    logging.info(f"END SERVICE: update_player_summarized_stats")
+# Rebuilds match_detail from the local match response store (api/response_store.py) without any API call:
+# every stored match missing from match_detail is inserted and marked processed, in batches.
+@with_metrics
+async def rehydrate_match_detail():
+    logging.info(f"START SERVICE: rehydrate_match_detail")
+    start_time = time.time()
+
+    logging.info(f"Fetching data start: \n get match detail ids from db query")
+    match_detail_ids = set(iter_match_detail_ids())
+    logging.info(f"Fetching data end: success \n match_detail length: {len(match_detail_ids)}")
+
+    missing_match_ids = (match_id for match_id in iter_stored_match_ids() if match_id not in match_detail_ids)
+    counts = {"read": 0, "written": 0}
+
+    logging.info(f"Inserting data start: \n match store: {MATCH_STORE_DIR} -> match_detail and processed_match_id")
+    stored_matches = iter_stored_matches(match_ids=missing_match_ids)
+    while batch := list(itertools.islice(stored_matches, MATCH_DETAIL_BATCH_SIZE)):
+        match_details_batch = [match_details for match_id, match_details in batch
+                               if match_details.get("metadata", {}).get("matchId") == match_id]
+        counts["read"] += len(batch)
+        if MATCH_DETAIL_TRIM:
+            archive_match_details(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, data=match_details_batch)
+            match_details_batch = [trim_match_detail(match_details) for match_details in match_details_batch]
+        written_list = insert_data_unordered(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, collection_name='match_detail',
+                                             data=match_details_batch)
+        written_match_ids = [match_details["metadata"]["matchId"] for match_details in written_list]
+        stamp_current_date(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, collection_name='match_detail',
+                           key='metadata.matchId', values=written_match_ids, field='ingested_at')
+        insert_timestamp = datetime.now()
+        upsert_data(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, collection_name='match_id',
+                    data=[{"match_id": match_id, "inserted_at": insert_timestamp} for match_id in written_match_ids],
+                    key='match_id', set_on_insert=['inserted_at'])
+        upsert_data(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, collection_name='processed_match_id',
+                    data=[{"match_id": match_id, "processed_with_api_call": True} for match_id in written_match_ids],
+                    key='match_id')
+        complete_match_ids(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, match_ids=written_match_ids)
+        counts["written"] += len(written_list)
+        logging.info(f"Inserting data: {len(written_list)}/{len(batch)} match_detail written, {counts['written']} total")
+
+    logging.info(f"Inserting data end: success \n counts: {counts}")
+    logging.info(f"END SERVICE: rehydrate_match_detail | Duration: {time.time() - start_time:.2f} seconds")
+
+
+# One-off migration: processed_match_id markers used to be inserted on every re-fetch or rehydrate of a match.
+# Keeps the first marker of each match_id, then creates the unique match_id index the markers are upserted on.
+@with_metrics
+async def dedupe_processed_match_id():
+    logging.info(f"START SERVICE: dedupe_processed_match_id")
+
+    with span("insert"):
+        deleted_count = remove_duplicates(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME,
+                                          collection_name='processed_match_id', key='match_id')
+    logging.info(f"Inserting data end: success \n duplicate markers deleted: {deleted_count}")
+
+    applied = ensure_indexes(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, collection_names=['processed_match_id'])
+    logging.info(f"Indexes: {applied}")
+
+    logging.info(f"END SERVICE: dedupe_processed_match_id")
+
+
+# One-off migration: deployments that crawled match ids before the match_queue existed get a queue entry per
+# match_id, pending or done from processed_match_id. Runs server side with $merge and is idempotent.
+@with_metrics
+@with_indexes
+async def seed_match_queue_collection():
+    logging.info(f"START SERVICE: seed_match_queue_collection")
+
+    logging.info(f"Inserting data start: \n match_id and processed_match_id -> match_queue")
+    with span("insert"):
+        seed_match_queue(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME)
+    logging.info(f"Inserting data end: success \n match_queue status: {count_match_queue_status(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME)}")
+
+    logging.info(f"END SERVICE: seed_match_queue_collection")
+
+
+# One-off migration: deployments that stored league snapshots before league_latest existed get a pointer per
+# (platform, tier) from their newest full snapshot in league. Pointers that already exist are left untouched.
+@with_metrics
+@with_indexes
+async def seed_league_latest():
+    logging.info(f"START SERVICE: seed_league_latest")
+
+    logging.info(f"Fetching data start: \n newest full snapshot of every league from db query")
+    with span("fetch"):
+        snapshots = get_newest_league_snapshots()
+    logging.info("Fetching data end: success \n Data: %s", sample([(league['platform'], league['tier']) for league in snapshots]))
+
+    logging.info(f"Inserting data start: \n database: {MONGO_DB_NAME}, collection: league_latest")
+    with span("insert"):
+        upsert_counts = upsert_data(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, collection_name='league_latest',
+                                    data=snapshots, key=['platform', 'tier'],
+                                    set_on_insert=[field for league in snapshots for field in league])
+    logging.info(f"Inserting data end: success \n upsert counts: {upsert_counts}")
+
+    logging.info(f"END SERVICE: seed_league_latest")
+
+
+# One-off migration: archives the full payload of match_detail documents stored before trimming and
+# replaces them in place with their trimmed version (same _id and ingested_at, so incremental readers still hold).
+@with_metrics
+@with_indexes
+async def trim_match_detail_collection():
+    logging.info(f"START SERVICE: trim_match_detail_collection")
+    start_time = time.time()
+
+    trimmed_count = trim_stored_match_details(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME)
+    logging.info(f"Inserting data end: success \n trimmed: {trimmed_count}")
+
+    logging.info(f"END SERVICE: trim_match_detail_collection | Duration: {time.time() - start_time:.2f} seconds")
+
+
+# Flattens match_detail participants into the local columnar cache (analytics/columnar_cache.py) so ladder wide
+# stats are answered with NumPy instead of Mongo. Incremental by default: only matches ingested after the
+# ingested_at watermark stored in the cache manifest (minus MATCH_DETAIL_INGEST_OVERLAP_SECONDS) are read.
+# Appends are not idempotent, so the manifest also keeps the matches inside the overlap and they are skipped
+# on the next read. A cache without a watermark (or of an older manifest version) is rebuilt from scratch.
+@with_metrics
+async def update_columnar_cache(full_refresh=False):
+    logging.info(f"START SERVICE: update_columnar_cache")
+
+    manifest = read_manifest(COLUMNAR_CACHE_DIR)
+    incremental = (not full_refresh and manifest["watermark"] is not None
+                   and manifest.get("version") == COLUMNAR_MANIFEST_VERSION)
+    if not incremental and os.path.isdir(COLUMNAR_CACHE_DIR):
+        shutil.rmtree(COLUMNAR_CACHE_DIR)
+        manifest = read_manifest(COLUMNAR_CACHE_DIR)
+
+    overlap = timedelta(seconds=MATCH_DETAIL_INGEST_OVERLAP_SECONDS)
+    ingested_after = datetime.fromisoformat(manifest["watermark"]) - overlap if incremental else None
+    ingested_up_to = get_match_detail_max_ingested_at()
+    logging.info(f"Fetching data start: \n match_detail participant rows, mode: "
+                 f"{f'incremental after {ingested_after}' if incremental else 'full'}, up to {ingested_up_to}")
+
+    # matches already appended inside the overlap are skipped. The ones still inside the next overlap stay
+    # recorded, with the matches appended now that the next read will overlap (filled while rows are read)
+    skipped_match_ids = manifest.get("overlap_match_ids", {})
+    overlap_start = ingested_up_to - overlap if ingested_up_to is not None else None
+    overlap_match_ids = {match_id: ingested_at for match_id, ingested_at in skipped_match_ids.items()
+                         if overlap_start is not None and datetime.fromisoformat(ingested_at) > overlap_start}
+
+    def new_row_chunks():
+        row_chunks = iter_match_participant_rows(ingested_after=ingested_after,
+                                                 ingested_up_to=ingested_up_to if incremental else None,
+                                                 chunk_size=COLUMNAR_SEGMENT_ROWS)
+        for rows in row_chunks:
+            new_rows = []
+            for row in rows:
+                if row["match_id"] in skipped_match_ids:
+                    continue
+                ingested_at = row.pop("ingested_at", None)
+                if ingested_at is not None and overlap_start is not None and ingested_at > overlap_start:
+                    overlap_match_ids[row["match_id"]] = ingested_at.isoformat()
+                new_rows.append(row)
+            yield new_rows
+
+    appended = append_rows(new_row_chunks(), watermark=ingested_up_to, cache_dir=COLUMNAR_CACHE_DIR,
+                           overlap_match_ids=overlap_match_ids)
+    compacted = compact(COLUMNAR_CACHE_DIR)
+    logging.info(f"Inserting data end: success \n cache: {COLUMNAR_CACHE_DIR}, rows appended: {appended}, "
+                 f"total rows: {read_manifest(COLUMNAR_CACHE_DIR)['rows']}, compacted: {compacted}")
+
+    logging.info(f"END SERVICE: update_columnar_cache")
+
+
+# Ladder wide champion and position stats (games, win rate, averages, KDA and its percentiles) computed from the
+# columnar cache with NumPy, without reading match_detail. Run after update_columnar_cache, the collections are
+# replaced whole on every run.
+@with_metrics
+async def update_ladder_stats():
+    logging.info(f"START SERVICE: update_ladder_stats")
+
+    logging.info(f"Fetching data start: \n columnar cache: {COLUMNAR_CACHE_DIR}")
+    with span("fetch"):
+        table = load_table(COLUMNAR_CACHE_DIR)
+    logging.info(f"Fetching data end: success \n rows: {table.rows}, watermark: {table.watermark}")
+
+    with span("transform"):
+        computed_at = datetime.now()
+        kda_percentiles = {row["champion_name"]: row for row in
+                           percentiles(table, value="kda", q=(50, 90), by="champion_name", min_games=LADDER_STATS_MIN_GAMES)}
+        champion_stats = [
+            {**stats, "kda_p50": kda_percentiles[stats["champion_name"]]["p50"],
+             "kda_p90": kda_percentiles[stats["champion_name"]]["p90"], "computed_at": computed_at}
+            for stats in group_stats(table, by="champion_name", min_games=LADDER_STATS_MIN_GAMES)
+        ]
+        position_stats = [{**stats, "computed_at": computed_at}
+                          for stats in group_stats(table, by="team_position", min_games=LADDER_STATS_MIN_GAMES)]
+    logging.info("Transforming data end: success \n champion_stats: %s", sample(champion_stats))
+
+    logging.info(f"Inserting data start: \n database: {MONGO_DB_NAME}, collections: champion_stats, position_stats")
+    with span("insert"):
+        replace_collection_data(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, collection_name='champion_stats',
+                                data=champion_stats)
+        replace_collection_data(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, collection_name='position_stats',
+                                data=position_stats)
+    logging.info(f"Inserting data end: success \n champions: {len(champion_stats)}, positions: {len(position_stats)}")
+
+    logging.info(f"END SERVICE: update_ladder_stats")
 
 
 async def _dev_clean_unprocessed_matches():
@@ -367,6 +880,10 @@ async def _dev_clean_unprocessed_matches():
 
     logging.info(f"Removed bad records: {removed_records_count}")
 
+    # their queue entries say done, put them back so update_match_detail fetches them again
+    requeued_count = requeue_match_ids(db_uri=MONGO_DB_URI, db_name=MONGO_DB_NAME, match_ids=not_accounted_match_id)
+    logging.info(f"Requeued as pending: {requeued_count}")
+
     new_claim = get_processed_match_ids()
     logging.info(f"New claimed to be processed length: {len(new_claim)}")
 
@@ -397,6 +914,9 @@ async def _dev_clear_collection_data(collection_name="sample"):
 
 if __name__ == "__main__":
     import asyncio
+    # asyncio.run(seed_league_latest())  # once, after upgrading to league_latest
+    # asyncio.run(dedupe_processed_match_id())  # once, before the unique processed_match_id index
+    # asyncio.run(seed_match_queue_collection())  # once, after upgrading to the match_queue
     # asyncio.run(update_league_data())
     # asyncio.run(query_recent_players())
     # asyncio.run(update_player_ids_data())
@@ -405,6 +925,8 @@ if __name__ == "__main__":
     # asyncio.run(update_match_detail())
     # asyncio.run(update_player_matches_stats())
     # asyncio.run(update_player_summarized_stats())
+    # asyncio.run(update_columnar_cache())
+    # asyncio.run(update_ladder_stats())
 
     # asyncio.run(_dev_clean_unprocessed_matches())
     # asyncio.run(_dev_clear_collection_data())
@@ -0,0 +1,257 @@
+import asyncio
+import json
+import random
+import re
+import time
+from urllib.parse import parse_qs
+
+import httpx
+
+
+# ===============================
+# Fake Riot API
+# ===============================
+# Serves generated league-v4, summoner-v4, account-v1 and match-v5 payloads through an httpx transport,
+# so the services run end to end without an API key or network:
+#   set_transport(httpx.MockTransport(FakeRiotApi(players=1000).handle))
+# Every player plays in matches_per_player matches of 10 participants, matches are shared between players
+# the way a real ladder's are. Matches are match_interval seconds apart and the newest one ends at
+# last_game_creation, match id pages honour startTime/endTime like match-v5, so a second crawl only gets the
+# matches played after the first one's watermarks. Payloads are deterministic for a given size, seed and
+# last_game_creation.
+
+APEX_TIERS = {"challenger": "CHALLENGER", "grandmaster": "GRANDMASTER", "master": "MASTER"}
+# share of the ladder in each tier, roughly the real 300 / 700 / rest split of a large platform
+TIER_SHARES = {"challenger": 0.1, "grandmaster": 0.2, "master": 0.7}
+POSITIONS = ("TOP", "JUNGLE", "MIDDLE", "BOTTOM", "UTILITY")
+PARTICIPANTS_PER_MATCH = 10
+
+_ROUTES = [
+    ("league", re.compile(r"^/lol/league/v4/(challenger|grandmaster|master)leagues/by-queue/(?P<queue>[^/]+)$")),
+    ("summoner", re.compile(r"^/lol/summoner/v4/summoners/(?P<summoner_id>[^/]+)$")),
+    ("account", re.compile(r"^/riot/account/v1/accounts/by-puuid/(?P<puuid>[^/]+)$")),
+    ("match_ids", re.compile(r"^/lol/match/v5/matches/by-puuid/(?P<puuid>[^/]+)/ids$")),
+    ("match", re.compile(r"^/lol/match/v5/matches/(?P<match_id>[^/]+)$")),
+]
+
+
+class FakeRiotApi:
+    """
+    :param players: ladder size, number of players over the three apex tiers of the platform
+    :param matches_per_player: match ids returned for each player
+    :param platform: platform of the ladder, match ids carry its prefix (e.g. "NA1_")
+    :param challenge_fields: numeric fields in each participant's "challenges", pads match payloads
+        to the size of real ones (~100 fields)
+    :param latency: seconds every response is delayed by
+    :param rate_limit_every: answer every Nth request with a 429, 0 never does
+    :param retry_after: Retry-After header of the 429s, whole seconds
+    :param rate_limit_type: X-Rate-Limit-Type header of the 429s ("application", "method" or "service")
+    :param app_rate_limit: X-App-Rate-Limit header of every response
+    :param method_rate_limit: X-Method-Rate-Limit header of every response
+    :param seed: seed of the generated stats
+    :param match_interval: seconds between the gameCreation of consecutive matches
+    :param last_game_creation: gameCreation of the newest match in epoch seconds, None for the time the fake
+        API is created
+    """
+
+    def __init__(self, players, matches_per_player=20, platform="na1", challenge_fields=100, latency=0.0,
+                 rate_limit_every=0, retry_after=1, rate_limit_type="method", app_rate_limit="100000:1",
+                 method_rate_limit="100000:1", seed=0, match_interval=60, last_game_creation=None):
+        if players < PARTICIPANTS_PER_MATCH:
+            raise ValueError(f"players must be at least {PARTICIPANTS_PER_MATCH}")
+
+        self.players = players
+        self.platform = platform
+        self.challenge_fields = challenge_fields
+        self.latency = latency
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        self.rate_limit_type = rate_limit_type
+        self.rate_limit_headers = {"X-App-Rate-Limit": app_rate_limit, "X-Method-Rate-Limit": method_rate_limit}
+        self.seed = seed
+
+        self.request_count = 0
+        self.rate_limited_count = 0
+
+        # match k is played by players k, k + stride, k + 2 * stride, ... so every player is in
+        # matches_per_player matches and no match has the same player twice
+        match_count = -(-players * matches_per_player // PARTICIPANTS_PER_MATCH)
+        stride = players // PARTICIPANTS_PER_MATCH
+        self.match_ids = [f"{platform.upper()}_{5000000000 + k}" for k in range(match_count)]
+        if last_game_creation is None:
+            last_game_creation = int(time.time())
+        # gameCreation in epoch milliseconds, match k is played before match k + 1
+        self._game_creation = {match_id: (last_game_creation - (match_count - 1 - k) * match_interval) * 1000
+                               for k, match_id in enumerate(self.match_ids)}
+        self._match_players = {}
+        self._player_matches = [[] for _ in range(players)]
+        for k, match_id in enumerate(self.match_ids):
+            match_players = [(k + t * stride) % players for t in range(PARTICIPANTS_PER_MATCH)]
+            self._match_players[match_id] = match_players
+            for player in match_players:
+                self._player_matches[player].append(match_id)
+        for player_matches in self._player_matches:
+            player_matches.reverse()  # newest first, like match-v5
+
+    # ===============================
+    # Players
+    # ===============================
+
+    @staticmethod
+    def summoner_id(player):
+        return f"bench-summoner-{player:040d}"
+
+    @staticmethod
+    def puuid(player):
+        # real puuids are 78 characters
+        return f"bench-puuid-{player:066d}"
+
+    @staticmethod
+    def _player(value):
+        return int(value.rsplit("-", 1)[-1])
+
+    def _tier_players(self, apex_rank):
+        start = 0
+        for rank, share in TIER_SHARES.items():
+            count = round(self.players * share) if rank != "master" else self.players - start
+            if rank == apex_rank:
+                return range(start, start + count)
+            start += count
+        return range(0)
+
+    # ===============================
+    # Payloads
+    # ===============================
+
+    def league(self, apex_rank, queue):
+        rng = random.Random(f"{self.seed}-{apex_rank}")
+        entries = [{
+            "summonerId": self.summoner_id(player),
+            "leaguePoints": rng.randint(0, 2000),
+            "rank": "I",
+            "wins": rng.randint(50, 500),
+            "losses": rng.randint(50, 500),
+            "veteran": rng.random() < 0.3,
+            "inactive": False,
+            "freshBlood": rng.random() < 0.1,
+            "hotStreak": rng.random() < 0.2,
+        } for player in self._tier_players(apex_rank)]
+        return {"tier": APEX_TIERS[apex_rank], "leagueId": f"bench-league-{apex_rank}", "queue": queue,
+                "name": f"Benchmark {APEX_TIERS[apex_rank].title()}", "entries": entries}
+
+    def summoner(self, summoner_id):
+        player = self._player(summoner_id)
+        return {"id": summoner_id, "accountId": f"bench-account-{player:046d}", "puuid": self.puuid(player),
+                "profileIconId": player % 5000, "revisionDate": 1700000000000 + player, "summonerLevel": 100 + player % 900}
+
+    def account(self, puuid):
+        player = self._player(puuid)
+        return {"puuid": puuid, "gameName": f"Bench Player {player}", "tagLine": "BENCH"}
+
+    def match_ids_page(self, puuid, start, count, start_time=None, end_time=None):
+        """
+        :param start_time: only matches created at or after this time, epoch seconds (startTime)
+        :param end_time: only matches created at or before this time, epoch seconds (endTime)
+        """
+        match_ids = [match_id for match_id in self._player_matches[self._player(puuid)]
+                     if (start_time is None or self._game_creation[match_id] >= start_time * 1000)
+                     and (end_time is None or self._game_creation[match_id] <= end_time * 1000)]
+        return match_ids[start:start + count]
+
+    def match(self, match_id):
+        rng = random.Random(f"{self.seed}-{match_id}")
+        match_players = self._match_players[match_id]
+        game_creation = self._game_creation[match_id]
+        game_duration = rng.randint(900, 2400)
+        participants = []
+        for index, player in enumerate(match_players):
+            team_id = 100 if index < 5 else 200
+            participants.append({
+                "participantId": index + 1,
+                "puuid": self.puuid(player),
+                "riotIdGameName": f"Bench Player {player}",
+                "riotIdTagline": "BENCH",
+                "teamId": team_id,
+                "teamPosition": POSITIONS[index % 5],
+                "individualPosition": POSITIONS[index % 5],
+                "championId": rng.randint(1, 950),
+                "championName": f"Champion{rng.randint(1, 170)}",
+                "champLevel": rng.randint(10, 18),
+                "kills": rng.randint(0, 20),
+                "deaths": rng.randint(0, 15),
+                "assists": rng.randint(0, 25),
+                "goldEarned": rng.randint(5000, 20000),
+                "totalMinionsKilled": rng.randint(0, 300),
+                "neutralMinionsKilled": rng.randint(0, 200),
+                "totalDamageDealtToChampions": rng.randint(3000, 60000),
+                "visionScore": rng.randint(5, 100),
+                "win": team_id == 100,
+                "challenges": {f"challenge{field}": rng.random() * 100 for field in range(self.challenge_fields)},
+            })
+        return {
+            "metadata": {"dataVersion": "2", "matchId": match_id,
+                         "participants": [participant["puuid"] for participant in participants]},
+            "info": {
+                "gameCreation": game_creation,
+                "gameStartTimestamp": game_creation + 30000,
+                "gameEndTimestamp": game_creation + 30000 + game_duration * 1000,
+                "gameDuration": game_duration,
+                "gameVersion": "14.20.1",
+                "gameMode": "CLASSIC",
+                "queueId": 420,
+                "platformId": self.platform.upper(),
+                "teams": [{"teamId": 100, "win": True}, {"teamId": 200, "win": False}],
+                "participants": participants,
+            },
+        }
+
+    # ===============================
+    # Transport Handler
+    # ===============================
+
+    def _response(self, status_code, payload=None, headers=None):
+        content = json.dumps(payload).encode() if payload is not None else b""
+        return httpx.Response(status_code, content=content,
+                              headers={"Content-Type": "application/json", **self.rate_limit_headers, **(headers or {})})
+
+    async def handle(self, request):
+        """
+        httpx.MockTransport handler: answer a request like the Riot API would.
+
+        :param request: httpx.Request
+        :return: httpx.Response
+        """
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        self.request_count += 1
+        if self.rate_limit_every and self.request_count % self.rate_limit_every == 0:
+            self.rate_limited_count += 1
+            return self._response(429, {"status": {"message": "Rate limit exceeded", "status_code": 429}},
+                                  {"Retry-After": str(self.retry_after), "X-Rate-Limit-Type": self.rate_limit_type})
+
+        path = request.url.path
+        query = {key: values[0] for key, values in parse_qs(request.url.query.decode()).items()}
+        for route, pattern in _ROUTES:
+            match = pattern.match(path)
+            if match is None:
+                continue
+            try:
+                if route == "league":
+                    return self._response(200, self.league(match.group(1), match.group("queue")))
+                if route == "summoner":
+                    return self._response(200, self.summoner(match.group("summoner_id")))
+                if route == "account":
+                    return self._response(200, self.account(match.group("puuid")))
+                if route == "match_ids":
+                    start_time = int(query["startTime"]) if "startTime" in query else None
+                    end_time = int(query["endTime"]) if "endTime" in query else None
+                    return self._response(200, self.match_ids_page(match.group("puuid"), int(query.get("start", 0)),
+                                                                   int(query.get("count", 20)), start_time, end_time))
+                return self._response(200, self.match(match.group("match_id")))
+            except (KeyError, ValueError, IndexError):
+                break
+        return self._response(404, {"status": {"message": "Data not found", "status_code": 404}})
+
+    def transport(self):
+        return httpx.MockTransport(self.handle)
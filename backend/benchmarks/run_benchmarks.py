@@ -0,0 +1,221 @@
+import os
+
+# ===============================
+# Environment Variables Section
+# ===============================
+# Set before the app modules read their environment: the benchmark always runs against its own database
+# on a local mongod and never against the real API, whatever .env says.
+
+BENCHMARK_MONGO_URI = os.getenv("BENCHMARK_MONGO_URI", "mongodb://localhost:27017")
+BENCHMARK_MONGO_DB_NAME = os.getenv("BENCHMARK_MONGO_DB_NAME", "challenger_stats_benchmark")
+os.environ["MONGO_URI"] = BENCHMARK_MONGO_URI
+os.environ["MONGO_DB_NAME"] = BENCHMARK_MONGO_DB_NAME
+os.environ["DEFAULT_RIOT_API_KEY"] = "benchmark"
+os.environ.setdefault("SEASON_START_TIME_UNIX", "1704067200")
+os.environ.setdefault("MAX_RETRIES", "5")
+os.environ.setdefault("INITIAL_BACKOFF", "1")
+os.environ.setdefault("LEAGUE_PLATFORMS", "na1")
+os.environ.setdefault("MATCH_STORE_ENABLED", "false")  # every match is fetched, never read back from disk
+os.environ.setdefault("METRICS_EXPORT", "none")
+
+import argparse  # noqa: E402
+import asyncio  # noqa: E402
+import json  # noqa: E402
+import logging  # noqa: E402
+import resource  # noqa: E402
+import time  # noqa: E402
+import tracemalloc  # noqa: E402
+from datetime import datetime, timezone  # noqa: E402
+
+from backend.app.api.http_client import client_session, set_transport  # noqa: E402
+from backend.app.api.fetch_data import fetch_match_details_all  # noqa: E402
+from backend.app.db.db_connection import get_db_client  # noqa: E402
+from backend.app.db.db_indexes import ensure_indexes  # noqa: E402
+from backend.app.instrumentation import reset, snapshot  # noqa: E402
+from backend.app.services import services  # noqa: E402
+from backend.benchmarks.fake_riot_api import FakeRiotApi  # noqa: E402
+
+
+# ===============================
+# Benchmarks
+# ===============================
+# Run in this order on a fresh database for every ladder size, each service reads what the ones before it
+# wrote (league -> player_ids -> ... -> match_detail -> player stats). fetch_match_details_all is the api
+# layer alone, without the database. From the repository root:
+#   python -m backend.benchmarks.run_benchmarks --sizes 100,1000,5000 --rate-limit-every 50 --output benchmarks.jsonl
+
+async def _fetch_match_details_all(fake_api):
+    async with client_session():
+        await fetch_match_details_all(match_id_list=fake_api.match_ids)
+
+
+BENCHMARKS = {
+    "update_league_data": lambda fake_api: services.update_league_data(),
+    "update_player_ids_data": lambda fake_api: services.update_player_ids_data(),
+    "update_game_name_taglines": lambda fake_api: services.update_game_name_taglines(),
+    "update_match_ids_data": lambda fake_api: services.update_match_ids_data(),
+    # second crawl from the watermarks of the first: only the matches inside MATCH_ID_CRAWL_OVERLAP_SECONDS
+    "update_match_ids_data_incremental": lambda fake_api: services.update_match_ids_data(),
+    "fetch_match_details_all": _fetch_match_details_all,
+    "update_match_detail": lambda fake_api: services.update_match_detail(),
+    "update_player_matches_stats": lambda fake_api: services.update_player_matches_stats(),
+    "update_player_summarized_stats": lambda fake_api: services.update_player_summarized_stats(),
+}
+
+
+def _counter_total(metrics, name):
+    return sum(counter["value"] for counter in metrics["counters"] if counter["name"] == name)
+
+
+def reset_database():
+    """
+    Drop the benchmark database and recreate its indexes.
+    """
+    if "benchmark" not in BENCHMARK_MONGO_DB_NAME:
+        raise ValueError(f"Refusing to drop {BENCHMARK_MONGO_DB_NAME}: the benchmark database name must contain 'benchmark'")
+    client = get_db_client(BENCHMARK_MONGO_URI)
+    if client is None:
+        raise Exception("Could not connect to the benchmark mongod")
+    client.drop_database(BENCHMARK_MONGO_DB_NAME)
+    ensure_indexes(BENCHMARK_MONGO_URI, BENCHMARK_MONGO_DB_NAME)
+
+
+async def run_benchmark(name, fake_api, trace_memory=True):
+    """
+    :param name: key of BENCHMARKS
+    :param fake_api: FakeRiotApi the clients are wired to
+    :param trace_memory: measure peak Python memory with tracemalloc (slows the run down)
+    :return: dict of the measurements
+    """
+    reset()
+    if trace_memory:
+        tracemalloc.reset_peak()
+    start = time.perf_counter()
+    await BENCHMARKS[name](fake_api)
+    wall_seconds = time.perf_counter() - start
+    peak_bytes = tracemalloc.get_traced_memory()[1] if trace_memory else None
+
+    metrics = snapshot()
+    requests = _counter_total(metrics, "riot_api_requests_total")
+    documents = _counter_total(metrics, "mongo_documents_written_total")
+    return {
+        "benchmark": name,
+        "wall_seconds": round(wall_seconds, 3),
+        "requests": requests,
+        "requests_per_second": round(requests / wall_seconds, 1) if wall_seconds else None,
+        "rate_limited": _counter_total(metrics, "riot_api_rate_limited_total"),
+        "retries": _counter_total(metrics, "riot_api_retries_total"),
+        "documents": documents,
+        "documents_per_second": round(documents / wall_seconds, 1) if wall_seconds else None,
+        "peak_memory_mb": round(peak_bytes / 2 ** 20, 1) if peak_bytes is not None else None,
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2 ** 10, 1),
+    }
+
+
+async def run_ladder(sizes, benchmark_names, trace_memory=True, **fake_api_options):
+    """
+    Run the benchmarks once per ladder size, each size on a fresh database.
+
+    :param sizes: ladder sizes (players)
+    :param benchmark_names: keys of BENCHMARKS, run in BENCHMARKS order
+    :param trace_memory: measure peak Python memory with tracemalloc
+    :param fake_api_options: FakeRiotApi keyword arguments
+    :return: list of result dicts, one per size and benchmark
+    """
+    results = []
+    for size in sizes:
+        fake_api = FakeRiotApi(players=size, **fake_api_options)
+        set_transport(fake_api.transport())
+        reset_database()
+        for name in BENCHMARKS:
+            if name not in benchmark_names:
+                continue
+            result = {"players": size, "matches": len(fake_api.match_ids),
+                      **await run_benchmark(name, fake_api, trace_memory=trace_memory)}
+            print_result(result)
+            results.append(result)
+    set_transport(None)
+    return results
+
+
+# ===============================
+# Report
+# ===============================
+
+REPORT_COLUMNS = [
+    ("players", "players", 8),
+    ("benchmark", "benchmark", 34),
+    ("wall_seconds", "wall s", 9),
+    ("requests_per_second", "req/s", 9),
+    ("rate_limited", "429s", 6),
+    ("documents_per_second", "docs/s", 10),
+    ("peak_memory_mb", "peak MB", 9),
+    ("max_rss_mb", "rss MB", 8),
+]
+
+
+def print_header():
+    print(" ".join(f"{title:>{width}}" if key != "benchmark" else f"{title:<{width}}"
+                   for key, title, width in REPORT_COLUMNS))
+
+
+def print_result(result):
+    print(" ".join(f"{'-' if result[key] is None else result[key]:>{width}}" if key != "benchmark"
+                   else f"{result[key]:<{width}}" for key, _, width in REPORT_COLUMNS), flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks of the services against a fake Riot API and a local mongod "
+                                                 f"({BENCHMARK_MONGO_URI}, database {BENCHMARK_MONGO_DB_NAME}).")
+    parser.add_argument("--sizes", default="100,1000", help="comma separated ladder sizes (players), default 100,1000")
+    parser.add_argument("--benchmarks", default=",".join(BENCHMARKS),
+                        help="comma separated benchmarks to run, default all: " + ",".join(BENCHMARKS))
+    parser.add_argument("--matches-per-player", type=int, default=20)
+    parser.add_argument("--challenge-fields", type=int, default=100, help="padding fields per match participant")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="delay of every fake API response")
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="answer every Nth request with a 429, 0 never")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds of the 429s")
+    parser.add_argument("--rate-limit-type", default="method", choices=["application", "method", "service"])
+    parser.add_argument("--app-rate-limit", default="100000:1", help="X-App-Rate-Limit of the fake API, e.g. 20:1,100:120")
+    parser.add_argument("--method-rate-limit", default="100000:1", help="X-Method-Rate-Limit of the fake API")
+    parser.add_argument("--no-trace-memory", action="store_true", help="skip tracemalloc, faster but no peak memory")
+    parser.add_argument("--output", help="append the results to this JSON lines file")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+
+    benchmark_names = [name.strip() for name in args.benchmarks.split(",") if name.strip()]
+    unknown = [name for name in benchmark_names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(unknown)}")
+
+    # importing the services already configured the root logger to write INFO to services.log, replace that
+    # handler so the timed runs only log at --log-level, to stderr
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s - %(levelname)s - %(message)s", force=True)
+    trace_memory = not args.no_trace_memory
+    if trace_memory:
+        tracemalloc.start()
+
+    print_header()
+    results = asyncio.run(run_ladder(
+        sizes=[int(size) for size in args.sizes.split(",")],
+        benchmark_names=benchmark_names,
+        trace_memory=trace_memory,
+        matches_per_player=args.matches_per_player,
+        challenge_fields=args.challenge_fields,
+        latency=args.latency_ms / 1000,
+        rate_limit_every=args.rate_limit_every,
+        retry_after=args.retry_after,
+        rate_limit_type=args.rate_limit_type,
+        app_rate_limit=args.app_rate_limit,
+        method_rate_limit=args.method_rate_limit,
+    ))
+
+    if args.output:
+        run_at = datetime.now(timezone.utc).isoformat()
+        with open(args.output, "a") as f:
+            for result in results:
+                f.write(json.dumps({"run_at": run_at, **result}) + "\n")
+
+
+if __name__ == "__main__":
+    main()
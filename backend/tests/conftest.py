@@ -0,0 +1,7 @@
+import os
+
+# fetch_data reads these at import time and has no defaults, the values only matter for real api calls
+os.environ.setdefault("DEFAULT_RIOT_API_KEY", "RGAPI-test")
+os.environ.setdefault("SEASON_START_TIME_UNIX", "1704067200")
+os.environ.setdefault("MAX_RETRIES", "3")
+os.environ.setdefault("INITIAL_BACKOFF", "0")
@@ -0,0 +1,97 @@
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+
+from backend.app.analytics.columnar_cache import (append_rows, compact, group_stats, load_table, percentiles,
+                                                  read_manifest)
+
+
+def _row(match_id, puuid, champion_name, kills, win):
+    return {"match_id": match_id, "puuid": puuid, "champion_name": champion_name, "team_position": "MIDDLE",
+            "champion_id": 1, "player_index": 0, "kills": kills, "deaths": 1, "assists": 2, "win": win,
+            "game_creation": 1700000000000, "game_duration": 1800, "queue_id": 420}
+
+
+def test_append_rows_writes_segments_and_moves_the_watermark(tmp_path):
+    cache_dir = str(tmp_path)
+    first = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    second = datetime(2024, 1, 2, tzinfo=timezone.utc)
+
+    appended = append_rows([[_row("NA1_1", "a", "Ahri", 3, True), _row("NA1_1", "b", "Zed", 5, False)], []],
+                           watermark=first, cache_dir=cache_dir, overlap_match_ids={"NA1_1": first.isoformat()})
+    assert appended == 2
+    append_rows([[_row("NA1_2", "a", "Zed", 7, True)]], watermark=second, cache_dir=cache_dir)
+
+    manifest = read_manifest(cache_dir)
+    assert manifest["watermark"] == second.isoformat()
+    assert manifest["rows"] == 3
+    assert [segment["rows"] for segment in manifest["segments"]] == [2, 1]
+    # codes are stable across appends, "Zed" keeps the code it got in the first segment
+    assert manifest["dictionaries"]["champion_name"] == ["Ahri", "Zed"]
+    assert manifest["overlap_match_ids"] == {"NA1_1": first.isoformat()}
+
+    table = load_table(cache_dir)
+    assert table.rows == 3
+    assert list(table.columns["kills"]) == [3, 5, 7]
+    assert list(table.dictionaries["champion_name"][table.columns["champion_name"]]) == ["Ahri", "Zed", "Zed"]
+
+
+def test_compact_merges_segments_past_the_limit(tmp_path):
+    cache_dir = str(tmp_path)
+    for k in range(3):
+        append_rows([[_row(f"NA1_{k}", "a", "Ahri", k, True)]], watermark=None, cache_dir=cache_dir)
+    before = load_table(cache_dir)
+    kills = np.asarray(before.columns["kills"]).copy()
+
+    assert compact(cache_dir, max_segments=3) is False
+    assert compact(cache_dir, max_segments=2) is True
+
+    manifest = read_manifest(cache_dir)
+    assert len(manifest["segments"]) == 1
+    assert sorted(path.name for path in tmp_path.iterdir() if path.is_dir()) == [manifest["segments"][0]["name"]]
+    after = load_table(cache_dir)
+    assert after.rows == 3
+    assert np.array_equal(after.columns["kills"], kills)
+
+
+def _table(tmp_path):
+    rows = [
+        _row("NA1_1", "a", "Ahri", 10, True),
+        _row("NA1_1", "b", "Zed", 2, False),
+        _row("NA1_2", "a", "Ahri", 4, False),
+        _row("NA1_2", "c", "Ahri", 6, True),
+        _row("NA1_3", "b", "Zed", 8, True),
+    ]
+    append_rows([rows], watermark=None, cache_dir=str(tmp_path))
+    return load_table(str(tmp_path))
+
+
+def test_group_stats_by_champion(tmp_path):
+    stats = group_stats(_table(tmp_path), by="champion_name")
+
+    assert [row["champion_name"] for row in stats] == ["Ahri", "Zed"]
+    ahri = stats[0]
+    assert ahri["games"] == 3 and ahri["wins"] == 2
+    assert ahri["average_kills"] == pytest.approx(20 / 3)
+    # kda: (kills + assists) / max(deaths, 1) over the summed columns
+    assert ahri["kda"] == pytest.approx((20 + 6) / 3)
+
+
+def test_group_stats_filters_and_min_games(tmp_path):
+    table = _table(tmp_path)
+
+    assert [row["champion_name"] for row in group_stats(table, by="champion_name", min_games=3)] == ["Ahri"]
+    by_player = group_stats(table, by=("puuid", "champion_name"), where={"puuid": ["a", "b"]})
+    assert sorted((row["puuid"], row["champion_name"], row["games"]) for row in by_player) == [
+        ("a", "Ahri", 2), ("b", "Zed", 2)]
+    assert group_stats(table, where={"puuid": "unknown"}) == []
+
+
+def test_percentiles(tmp_path):
+    table = _table(tmp_path)
+
+    assert percentiles(table, value="kills", q=(0, 50, 100)) == {0: 2.0, 50: 6.0, 100: 10.0}
+    by_champion = percentiles(table, value="kills", q=(50,), by="champion_name")
+    assert by_champion == [{"champion_name": "Ahri", "games": 3, "p50": 6.0},
+                           {"champion_name": "Zed", "games": 2, "p50": 5.0}]
@@ -0,0 +1,85 @@
+import mongomock
+import pytest
+from pymongo import IndexModel
+
+from backend.app.db import db_actions
+from backend.app.db.db_actions import replace_collection_data, upsert_data
+
+DB = ("mongodb://test", "test")
+
+
+@pytest.fixture
+def db(monkeypatch):
+    database = mongomock.MongoClient()["test"]
+    monkeypatch.setattr(db_actions, "get_db", lambda db_uri, db_name: database)
+    return database
+
+
+def _documents(db, collection_name):
+    return sorted(db[collection_name].find({}, {"_id": 0}), key=lambda document: str(document))
+
+
+def test_upsert_data_inserts_then_updates_in_place(db):
+    counts = upsert_data(*DB, "player_ids", [{"puuid": "a", "tier": "MASTER"}, {"puuid": "b", "tier": "MASTER"}],
+                         key="puuid")
+    assert counts == {"matched": 0, "modified": 0, "upserted": 2}
+
+    counts = upsert_data(*DB, "player_ids", [{"puuid": "a", "tier": "CHALLENGER"}, {"puuid": "b", "tier": "MASTER"}],
+                         key="puuid")
+    assert counts == {"matched": 2, "modified": 1, "upserted": 0}
+    assert _documents(db, "player_ids") == [{"puuid": "a", "tier": "CHALLENGER"}, {"puuid": "b", "tier": "MASTER"}]
+
+
+def test_upsert_data_set_on_insert_keeps_the_first_value(db):
+    upsert_data(*DB, "match_id", [{"match_id": "NA1_1", "inserted_at": 1, "source": "crawl"}],
+                key="match_id", set_on_insert=["inserted_at"])
+    upsert_data(*DB, "match_id", [{"match_id": "NA1_1", "inserted_at": 2, "source": "rehydrate"}],
+                key="match_id", set_on_insert=["inserted_at"])
+
+    assert _documents(db, "match_id") == [{"match_id": "NA1_1", "inserted_at": 1, "source": "rehydrate"}]
+
+
+def test_upsert_data_with_every_field_set_on_insert_leaves_existing_documents(db):
+    upsert_data(*DB, "league_latest", [{"platform": "na1", "tier": "MASTER", "snapshot": 1}],
+                key=["platform", "tier"])
+
+    counts = upsert_data(*DB, "league_latest", [{"platform": "na1", "tier": "MASTER", "snapshot": 2},
+                                                {"platform": "euw1", "tier": "MASTER", "snapshot": 2}],
+                         key=["platform", "tier"], set_on_insert=["platform", "tier", "snapshot"])
+
+    assert counts["upserted"] == 1 and counts["modified"] == 0
+    assert _documents(db, "league_latest") == [{"platform": "euw1", "tier": "MASTER", "snapshot": 2},
+                                               {"platform": "na1", "tier": "MASTER", "snapshot": 1}]
+
+
+def test_upsert_data_dotted_key(db):
+    match = {"metadata": {"matchId": "NA1_1"}, "info": {"gameDuration": 1800}}
+    upsert_data(*DB, "match_detail", [match], key="metadata.matchId")
+    upsert_data(*DB, "match_detail", [{**match, "info": {"gameDuration": 1900}}], key="metadata.matchId")
+
+    assert _documents(db, "match_detail") == [{"metadata": {"matchId": "NA1_1"}, "info": {"gameDuration": 1900}}]
+
+
+def test_replace_collection_data_swaps_in_a_staging_collection(db, monkeypatch):
+    monkeypatch.setitem(db_actions.INDEXES, "champion_stats", [IndexModel([("games", -1)], name="games_-1")])
+    db["champion_stats"].insert_many([{"champion_name": "Ahri", "games": 1}, {"champion_name": "Zed", "games": 2}])
+    db["champion_stats"].create_index("champion_name", name="champion_name_1", unique=True)
+    db["champion_stats__staging"].insert_one({"left": "over"})  # interrupted earlier run
+
+    inserted_ids = replace_collection_data(*DB, "champion_stats", [{"champion_name": "Lux", "games": 3}])
+
+    assert len(inserted_ids) == 1
+    assert _documents(db, "champion_stats") == [{"champion_name": "Lux", "games": 3}]
+    assert "champion_stats__staging" not in db.list_collection_names()
+    indexes = db["champion_stats"].index_information()
+    assert indexes["champion_name_1"]["unique"] is True
+    assert "games_-1" in indexes
+
+
+def test_replace_collection_data_with_no_documents_empties_the_collection(db):
+    db["champion_stats"].insert_one({"champion_name": "Ahri"})
+
+    assert replace_collection_data(*DB, "champion_stats", []) == []
+
+    assert "champion_stats" in db.list_collection_names()
+    assert db["champion_stats"].count_documents({}) == 0
@@ -0,0 +1,36 @@
+from types import SimpleNamespace
+
+import pytest
+
+from backend.app.db.db_connection import _MetricsListener
+from backend.app.instrumentation import reset, snapshot
+
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    reset()
+    yield
+    reset()
+
+
+def _counters():
+    return {(counter["name"], tuple(counter["labels"].items())): counter["value"] for counter in snapshot()["counters"]}
+
+
+def test_listener_feeds_the_exported_counters():
+    listener = _MetricsListener()
+    listener.connection_created(None)
+    listener.connection_checked_out(None)
+    listener.succeeded(SimpleNamespace(command_name="find", duration_micros=1500))
+    listener.failed(SimpleNamespace(command_name="insert", duration_micros=500))
+    listener.connection_check_out_failed(None)
+
+    counters = _counters()
+    assert counters[("mongo_commands_total", (("command", "find"),))] == 1
+    assert counters[("mongo_command_seconds_total", (("command", "find"),))] == pytest.approx(0.0015)
+    assert counters[("mongo_command_failures_total", (("command", "insert"),))] == 1
+    assert ("mongo_command_failures_total", (("command", "find"),)) not in counters
+    assert counters[("mongo_connections_created_total", ())] == 1
+    assert counters[("mongo_connection_checkout_failures_total", ())] == 1
+
+    assert listener.snapshot()["connections_in_use"] == 1
@@ -0,0 +1,106 @@
+import gzip
+import json
+from datetime import datetime
+
+import mongomock
+import pytest
+
+from backend.app.api.response_store import get_match
+from backend.app.db import db_match_archive
+from backend.app.db.db_match_archive import (get_full_match_details, restore_full_match_details, trim_match_detail,
+                                             trim_stored_match_details)
+
+DB = ("mongodb://test", "test")
+
+
+def _match():
+    return {
+        "metadata": {"matchId": "NA1_1", "participants": ["a", "b"], "dataVersion": "2"},
+        "info": {
+            "gameCreation": 1700000000000,
+            "gameDuration": 1800,
+            "queueId": 420,
+            "frames": [{"timestamp": 0}],
+            "teams": [{"teamId": 100, "win": True, "bans": [{"championId": 1}]}],
+            "participants": [
+                {"puuid": puuid, "kills": 3, "deaths": 1, "assists": 2, "championName": "Ahri", "championId": 103,
+                 "teamPosition": "MIDDLE", "win": True, "challenges": {"kda": 5.0}, "perks": {"styles": []}}
+                for puuid in ("a", "b")
+            ],
+        },
+    }
+
+
+def test_trim_match_detail_keeps_the_declared_fields():
+    trimmed = trim_match_detail(_match())
+
+    assert trimmed["trimmed"] is True
+    assert trimmed["metadata"] == {"matchId": "NA1_1", "participants": ["a", "b"], "dataVersion": "2"}
+    assert set(trimmed["info"]) == {"gameCreation", "gameDuration", "queueId", "teams", "participants"}
+    assert trimmed["info"]["teams"] == [{"teamId": 100, "win": True}]
+    assert [participant["puuid"] for participant in trimmed["info"]["participants"]] == ["a", "b"]
+    assert trimmed["info"]["participants"][0] == {"puuid": "a", "kills": 3, "deaths": 1, "assists": 2,
+                                                  "championName": "Ahri", "championId": 103,
+                                                  "teamPosition": "MIDDLE", "win": True}
+
+
+def test_trim_match_detail_with_fields():
+    match = _match()
+
+    trimmed = trim_match_detail(match, fields=["metadata.matchId", "info.participants.challenges.kda"])
+
+    assert trimmed == {
+        "metadata": {"matchId": "NA1_1"},
+        "info": {"participants": [{"challenges": {"kda": 5.0}}, {"challenges": {"kda": 5.0}}]},
+        "trimmed": True,
+    }
+    # the payload itself is left untouched
+    assert "frames" in match["info"]
+
+
+@pytest.fixture
+def db(monkeypatch):
+    database = mongomock.MongoClient()["test"]
+    monkeypatch.setattr(db_match_archive, "get_db", lambda db_uri, db_name: database)
+    return database
+
+
+INGESTED_AT = datetime(2024, 1, 1, 12, 0)
+
+
+def test_trim_stored_match_details_keeps_ingested_at(db):
+    db["match_detail"].insert_one({**_match(), "ingested_at": INGESTED_AT})
+
+    assert trim_stored_match_details(*DB, use_store=False) == 1
+
+    document = db["match_detail"].find_one()
+    assert document["trimmed"] is True
+    assert document["ingested_at"] == INGESTED_AT
+    assert "frames" not in document["info"]
+
+
+def test_restore_keeps_the_live_fields(db):
+    db["match_detail"].insert_one({**_match(), "ingested_at": INGESTED_AT})
+    trim_stored_match_details(*DB, use_store=False)
+
+    archived = json.loads(gzip.decompress(db[db_match_archive.ARCHIVE_COLLECTION].find_one()["payload"]))
+    assert "ingested_at" not in archived and "trimmed" not in archived
+
+    assert restore_full_match_details(*DB, ["NA1_1"], use_store=False) == 1
+    document = db["match_detail"].find_one()
+    assert document["info"]["frames"] == [{"timestamp": 0}]
+    assert document["ingested_at"] == INGESTED_AT
+    assert document["trimmed"] is True
+    # already trimmed once, the migration leaves it alone
+    assert trim_stored_match_details(*DB, use_store=False) == 0
+
+
+def test_response_store_is_the_cold_copy_when_enabled(db, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    db["match_detail"].insert_one({**_match(), "ingested_at": INGESTED_AT})
+
+    trim_stored_match_details(*DB, use_store=True)
+
+    assert db[db_match_archive.ARCHIVE_COLLECTION].count_documents({}) == 0
+    assert get_match("NA1_1") == _match()
+    assert [match["metadata"]["matchId"] for match in get_full_match_details(*DB, ["NA1_1"], use_store=True)] == ["NA1_1"]
@@ -0,0 +1,72 @@
+import mongomock
+import pytest
+
+from backend.app.db import db_match_queue
+from backend.app.db.db_match_queue import (DONE, FAILED, LEASED, PENDING, claim_match_ids, complete_match_ids,
+                                           count_match_queue_status, enqueue_match_ids, fail_match_ids,
+                                           requeue_match_ids)
+
+DB = ("mongodb://test", "test")
+
+
+@pytest.fixture
+def queue(monkeypatch):
+    database = mongomock.MongoClient()["test"]
+    monkeypatch.setattr(db_match_queue, "get_db", lambda db_uri, db_name: database)
+    return database[db_match_queue.QUEUE_COLLECTION]
+
+
+def _status(queue, match_id):
+    return queue.find_one({"match_id": match_id})["status"]
+
+
+def test_enqueue_leaves_queued_matches_untouched(queue):
+    assert enqueue_match_ids(*DB, ["NA1_1", "NA1_2"]) == 2
+    queue.update_one({"match_id": "NA1_1"}, {"$set": {"status": DONE}})
+
+    assert enqueue_match_ids(*DB, ["NA1_1", "NA1_3"]) == 1
+    assert _status(queue, "NA1_1") == DONE
+
+
+def test_claim_complete_fail_cycle(queue):
+    enqueue_match_ids(*DB, ["NA1_1", "NA1_2", "NA1_3"])
+
+    first = claim_match_ids(*DB, worker_id="w1", batch_size=2)
+    second = claim_match_ids(*DB, worker_id="w2", batch_size=2)
+    assert len(first) == 2 and len(second) == 1
+    assert set(first) | set(second) == {"NA1_1", "NA1_2", "NA1_3"}
+    assert claim_match_ids(*DB, worker_id="w3") == []
+    assert count_match_queue_status(*DB) == {LEASED: 3}
+
+    assert complete_match_ids(*DB, first) == 2
+    assert fail_match_ids(*DB, {second[0]: "HTTP 500"}, max_attempts=2) == 1
+    entry = queue.find_one({"match_id": second[0]})
+    assert entry["status"] == PENDING
+    assert entry["last_error"] == "HTTP 500"
+    assert "lease_id" not in entry
+
+    # the released match is claimed again, and given up on once it reaches max_attempts
+    assert claim_match_ids(*DB, worker_id="w1") == second
+    assert fail_match_ids(*DB, {second[0]: "HTTP 500"}, max_attempts=2) == 1
+    assert _status(queue, second[0]) == FAILED
+    assert claim_match_ids(*DB, worker_id="w1") == []
+    assert count_match_queue_status(*DB) == {DONE: 2, FAILED: 1}
+
+
+def test_expired_lease_is_claimable_again(queue):
+    enqueue_match_ids(*DB, ["NA1_1"])
+
+    assert claim_match_ids(*DB, worker_id="w1", lease_seconds=-1) == ["NA1_1"]
+    assert claim_match_ids(*DB, worker_id="w2") == ["NA1_1"]
+    assert queue.find_one({"match_id": "NA1_1"})["attempts"] == 2
+
+
+def test_requeue_makes_done_and_unknown_matches_claimable(queue):
+    enqueue_match_ids(*DB, ["NA1_1"])
+    complete_match_ids(*DB, claim_match_ids(*DB, worker_id="w1"))
+    assert _status(queue, "NA1_1") == DONE
+
+    assert requeue_match_ids(*DB, ["NA1_1", "NA1_2"]) == 2
+
+    assert sorted(claim_match_ids(*DB, worker_id="w1")) == ["NA1_1", "NA1_2"]
+    assert queue.find_one({"match_id": "NA1_1"})["attempts"] == 1
@@ -0,0 +1,47 @@
+import mongomock
+import pytest
+
+from backend.app.db import db_actions
+from backend.app.db.db_queries import get_player_stats_match_details
+
+
+def _participant(puuid, kills):
+    return {"puuid": puuid, "kills": kills, "deaths": 1, "assists": 2, "championName": "Ahri", "championId": 103,
+            "teamPosition": "MIDDLE", "win": kills > 5, "challenges": {"damagePerMinute": 700.0}}
+
+
+def _match(match_id, kills_by_puuid):
+    return {
+        "metadata": {"matchId": match_id, "participants": list(kills_by_puuid)},
+        "info": {"participants": [_participant(puuid, kills) for puuid, kills in kills_by_puuid.items()]},
+    }
+
+
+@pytest.fixture
+def db(monkeypatch):
+    database = mongomock.MongoClient()["test"]
+    monkeypatch.setattr(db_actions, "get_db", lambda db_uri, db_name: database)
+    return database
+
+
+def test_get_player_stats_match_details_returns_only_the_players_fields(db):
+    db["match_detail"].insert_many([
+        _match("NA1_1", {"a": 3, "b": 7}),
+        _match("NA1_2", {"c": 1, "a": 9}),
+        _match("NA1_3", {"b": 2, "c": 4}),
+    ])
+
+    rows = get_player_stats_match_details("mongodb://test", "test", player_puuid="a")
+
+    assert sorted(rows, key=lambda row: row["match_id"]) == [
+        {"match_id": "NA1_1", "player_index": 0, "puuid": "a", "kills": 3, "deaths": 1, "assists": 2,
+         "champion_name": "Ahri", "champion_id": 103, "team_position": "MIDDLE", "win": False},
+        {"match_id": "NA1_2", "player_index": 1, "puuid": "a", "kills": 9, "deaths": 1, "assists": 2,
+         "champion_name": "Ahri", "champion_id": 103, "team_position": "MIDDLE", "win": True},
+    ]
+
+
+def test_get_player_stats_match_details_unknown_player(db):
+    db["match_detail"].insert_one(_match("NA1_1", {"a": 3}))
+
+    assert get_player_stats_match_details("mongodb://test", "test", player_puuid="z") == []
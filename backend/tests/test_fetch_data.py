@@ -0,0 +1,89 @@
+import asyncio
+
+from backend.app.api.fetch_data import bounded_call_stream
+
+
+def _collect(call, keys, concurrency):
+    async def run():
+        return [item async for item in bounded_call_stream(call, keys, concurrency=concurrency)]
+
+    return asyncio.run(run())
+
+
+def _tracked_call(in_flight):
+    async def call(key):
+        in_flight["now"] += 1
+        in_flight["max"] = max(in_flight["max"], in_flight["now"])
+        await asyncio.sleep(0.01)
+        in_flight["now"] -= 1
+        return key * 2
+
+    return call
+
+
+def test_bounded_call_stream_caps_calls_in_flight():
+    in_flight = {"now": 0, "max": 0}
+
+    results = _collect(_tracked_call(in_flight), range(1, 21), concurrency=4)
+
+    assert in_flight["max"] == 4
+    assert sorted(results) == [(key, key * 2, None) for key in range(1, 21)]
+
+
+def test_bounded_call_stream_accepts_async_keys():
+    in_flight = {"now": 0, "max": 0}
+    consumed = []
+
+    async def keys():
+        for key in range(1, 11):
+            consumed.append(key)
+            yield key
+
+    results = _collect(_tracked_call(in_flight), keys(), concurrency=3)
+
+    assert in_flight["max"] == 3
+    assert consumed == list(range(1, 11))
+    assert sorted(results) == [(key, key * 2, None) for key in range(1, 11)]
+
+
+def test_bounded_call_stream_consumes_keys_lazily():
+    in_flight = {"now": 0, "max": 0}
+    consumed = []
+
+    def keys():
+        for key in range(1, 101):
+            consumed.append(key)
+            yield key
+
+    async def run():
+        stream = bounded_call_stream(_tracked_call(in_flight), keys(), concurrency=5)
+        first = await anext(stream)
+        await stream.aclose()
+        return first
+
+    asyncio.run(run())
+
+    # the first calls plus their refills, not the whole key list
+    assert len(consumed) <= 10
+
+
+def test_bounded_call_stream_yields_errors_and_continues():
+    async def call(key):
+        if key == 2:
+            raise ValueError("bad key")
+        return key
+
+    results = sorted(_collect(call, [1, 2, 3], concurrency=2), key=lambda item: item[0])
+
+    assert [(key, result) for key, result, _ in results] == [(1, 1), (2, None), (3, 3)]
+    assert isinstance(results[1][2], ValueError)
+    assert results[0][2] is None and results[2][2] is None
+
+
+def test_bounded_call_stream_stops_at_none_key():
+    async def call(key):
+        return key
+
+    results = _collect(call, [1, 2, None, 3], concurrency=2)
+
+    assert sorted(key for key, _, _ in results) == [1, 2]
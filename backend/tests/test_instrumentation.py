@@ -0,0 +1,61 @@
+import json
+
+import pytest
+
+from backend.app import instrumentation
+from backend.app.instrumentation import delta, export_metrics, increment, reset, snapshot, span
+
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    reset()
+    yield
+    reset()
+
+
+def test_delta_keeps_only_what_changed():
+    increment("riot_api_requests_total", 3, method="league")
+    with span("update_league_data"):
+        pass
+    before = snapshot()
+
+    increment("riot_api_requests_total", 2, method="league")
+    increment("mongo_documents_written_total", 10, collection="league")
+    with span("update_player_ids_data"):
+        pass
+
+    recorded = delta(before, snapshot())
+
+    assert recorded["counters"] == [
+        {"name": "mongo_documents_written_total", "labels": {"collection": "league"}, "value": 10},
+        {"name": "riot_api_requests_total", "labels": {"method": "league"}, "value": 2},
+    ]
+    assert list(recorded["spans"]) == ["update_player_ids_data"]
+    assert recorded["spans"]["update_player_ids_data"]["count"] == 1
+
+
+def test_export_metrics_jsonl_holds_one_run(tmp_path, monkeypatch):
+    path = tmp_path / "metrics.jsonl"
+    monkeypatch.setattr(instrumentation, "METRICS_JSONL_PATH", str(path))
+
+    increment("riot_api_requests_total", 5)
+    export_metrics(service_name="first", export="jsonl")
+    started = snapshot()
+    increment("riot_api_requests_total", 1)
+    export_metrics(service_name="second", since=started, export="jsonl")
+
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [line["service"] for line in lines] == ["first", "second"]
+    assert [line["counters"][0]["value"] for line in lines] == [5, 1]
+
+
+def test_export_metrics_prometheus_stays_cumulative(tmp_path, monkeypatch):
+    path = tmp_path / "challenger_stats.prom"
+    monkeypatch.setattr(instrumentation, "METRICS_PROMETHEUS_PATH", str(path))
+
+    increment("riot_api_requests_total", 5)
+    started = snapshot()
+    increment("riot_api_requests_total", 1)
+    export_metrics(service_name="second", since=started, export="prometheus")
+
+    assert "challenger_stats_riot_api_requests_total 6" in path.read_text()
@@ -0,0 +1,104 @@
+import asyncio
+import inspect
+import threading
+
+from backend.app.services import services
+from backend.app.services.pipeline import run_pipeline
+
+
+async def _items(values, delay=0.0):
+    for value in values:
+        if delay:
+            await asyncio.sleep(delay)
+        yield value
+
+
+def _run(source, transform=lambda item: item, **kwargs):
+    batches = []
+    asyncio.run(run_pipeline(source=source, transform=transform, flush=lambda batch: batches.append(list(batch)),
+                             **kwargs))
+    return batches
+
+
+def test_run_pipeline_flushes_full_batches_then_the_rest():
+    batches = _run(_items(range(10)), batch_size=4, flush_seconds=60)
+
+    assert batches == [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]]
+
+
+def test_run_pipeline_flushes_partial_batch_after_flush_seconds():
+    # the source stalls longer than flush_seconds between items, so each item is flushed on its own
+    batches = _run(_items(range(3), delay=0.1), batch_size=100, flush_seconds=0.02)
+
+    assert batches == [[0], [1], [2]]
+
+
+def test_run_pipeline_drops_items_transformed_to_none():
+    batches = _run(_items(range(10)), transform=lambda item: item if item % 2 else None, batch_size=100)
+
+    assert batches == [[1, 3, 5, 7, 9]]
+
+
+def test_run_pipeline_flushes_off_the_event_loop():
+    flush_threads = []
+
+    def flush(batch):
+        flush_threads.append(threading.current_thread())
+
+    asyncio.run(run_pipeline(source=_items(range(3)), transform=lambda item: item, flush=flush, batch_size=1))
+
+    assert len(flush_threads) == 3
+    assert threading.main_thread() not in flush_threads
+
+
+def test_run_pipeline_with_empty_source_never_flushes():
+    assert _run(_items([])) == []
+
+
+# ===============================
+# update_match_detail
+# ===============================
+def _match(match_id):
+    return {"metadata": {"matchId": match_id}, "info": {}}
+
+
+def test_update_match_detail_marks_only_written_matches_processed(monkeypatch):
+    fetched = [
+        ("NA1_1", _match("NA1_1"), None),
+        ("NA1_2", _match("NA1_2"), None),  # rejected by the insert below
+        ("NA1_3", None, RuntimeError("503")),
+        ("NA1_4", _match("NA1_5"), None),  # not the match we asked for
+    ]
+    calls = {}
+
+    def fetch_match_details_stream(match_id_list):
+        return _items(fetched)
+
+    def insert_data_unordered(db_uri, db_name, collection_name, data):
+        return [match for match in data if match["metadata"]["matchId"] != "NA1_2"]
+
+    def record(name):
+        def call(*args, **kwargs):
+            calls.setdefault(name, []).append(kwargs)
+        return call
+
+    monkeypatch.setattr(services, "MATCH_DETAIL_TRIM", False)
+    monkeypatch.setattr(services, "count_match_queue_status", lambda db_uri, db_name: {})
+    monkeypatch.setattr(services, "iter_claimed_match_ids", lambda **kwargs: iter([]))
+    monkeypatch.setattr(services, "fetch_match_details_stream", fetch_match_details_stream)
+    monkeypatch.setattr(services, "insert_data_unordered", insert_data_unordered)
+    monkeypatch.setattr(services, "stamp_current_date", record("stamp_current_date"))
+    monkeypatch.setattr(services, "upsert_data", record("upsert_data"))
+    monkeypatch.setattr(services, "complete_match_ids", record("complete_match_ids"))
+    monkeypatch.setattr(services, "fail_match_ids", record("fail_match_ids"))
+
+    # skip the metrics, index and http client decorators, only the pipeline is under test
+    asyncio.run(inspect.unwrap(services.update_match_detail)())
+
+    assert [call["data"] for call in calls["upsert_data"]] == [[{"match_id": "NA1_1", "processed_with_api_call": True}]]
+    assert [call["match_ids"] for call in calls["complete_match_ids"]] == [["NA1_1"]]
+    assert [call["values"] for call in calls["stamp_current_date"]] == [["NA1_1"]]
+    failures = {}
+    for call in calls["fail_match_ids"]:
+        failures.update(call["failures"])
+    assert sorted(failures) == ["NA1_3", "NA1_4"]
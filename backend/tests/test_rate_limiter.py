@@ -0,0 +1,83 @@
+import httpx
+import pytest
+
+from backend.app.api import rate_limiter
+from backend.app.api.rate_limiter import RateLimiter, RateWindow, parse_rate_limit_header, update_from_response
+
+
+@pytest.fixture(autouse=True)
+def fresh_limiters(monkeypatch):
+    monkeypatch.setattr(rate_limiter, "_app_limiters", {})
+    monkeypatch.setattr(rate_limiter, "_method_limiters", {})
+
+
+def test_parse_rate_limit_header():
+    assert parse_rate_limit_header("20:1,100:120") == [(20, 1), (100, 120)]
+    assert parse_rate_limit_header("3:1, 40:120") == [(3, 1), (40, 120)]
+    assert parse_rate_limit_header("") == []
+    assert parse_rate_limit_header(None) == []
+
+
+def test_window_refills_each_token_one_window_after_it_was_spent():
+    window = RateWindow(limit=2, seconds=10)
+    window.spend(0.0)
+    window.spend(1.0)
+
+    assert window.wait_time(2.0) == 8.0
+    # the first token is back, the second one only at 11
+    assert window.wait_time(10.0) == 0.0
+    window.spend(10.0)
+    assert window.wait_time(10.5) == 0.5
+
+
+def test_limiter_waits_for_its_slowest_window():
+    limiter = RateLimiter([(2, 1), (3, 120)])
+    for now in (0.0, 0.1, 1.5):
+        assert limiter.wait_time(now) <= 0
+        limiter.spend(now)
+
+    assert limiter.wait_time(2.0) == 118.0
+
+
+def test_limiter_syncs_counts_and_keeps_spent_tokens_on_new_limits():
+    limiter = RateLimiter([(20, 1), (100, 120)])
+    limiter.spend(0.0)
+
+    limiter.update_counts([(1, 1), (100, 120)], now=0.5)
+    assert limiter.wait_time(0.5) == 119.5
+
+    limiter.update_limits([(10, 1), (200, 120)])
+    assert [(window.limit, window.seconds) for window in limiter.windows] == [(10, 1), (200, 120)]
+    assert len(limiter.windows[1].spent) == 100
+
+
+def _response(status_code, headers):
+    return httpx.Response(status_code, headers=headers)
+
+
+def test_update_from_response_reads_the_limit_headers():
+    update_from_response("americas", "match-v5.matches", _response(200, {
+        "X-App-Rate-Limit": "500:10",
+        "X-App-Rate-Limit-Count": "500:10",
+        "X-Method-Rate-Limit": "2000:10",
+        "X-Method-Rate-Limit-Count": "1:10",
+    }))
+
+    app_limiter = rate_limiter.get_app_limiter("americas")
+    method_limiter = rate_limiter.get_method_limiter("americas", "match-v5.matches")
+    assert [(window.limit, window.seconds) for window in app_limiter.windows] == [(500, 10)]
+    assert app_limiter.wait_time(rate_limiter.time.monotonic()) > 0
+    assert method_limiter.wait_time(rate_limiter.time.monotonic()) <= 0
+
+
+def test_update_from_response_blocks_the_limiter_named_by_a_429():
+    update_from_response("americas", "match-v5.matches", _response(429, {
+        "Retry-After": "5", "X-Rate-Limit-Type": "method"}))
+
+    now = rate_limiter.time.monotonic()
+    assert rate_limiter.get_method_limiter("americas", "match-v5.matches").wait_time(now) > 4
+    assert rate_limiter.get_app_limiter("americas").wait_time(now) <= 0
+
+    update_from_response("americas", "match-v5.matches", _response(429, {
+        "Retry-After": "5", "X-Rate-Limit-Type": "application"}))
+    assert rate_limiter.get_app_limiter("americas").wait_time(now) > 4
@@ -0,0 +1,38 @@
+from backend.app.api.transform_data import league_snapshot_delta
+
+
+def _entry(summoner_id, league_points, wins=10, losses=5, hot_streak=False):
+    return {"summonerId": summoner_id, "leaguePoints": league_points, "wins": wins, "losses": losses,
+            "hotStreak": hot_streak}
+
+
+def _league(entries):
+    return {"tier": "CHALLENGER", "queue": "RANKED_SOLO_5x5", "platform": "na1", "entries": entries}
+
+
+def test_league_snapshot_delta_without_previous_snapshot_is_full():
+    league = _league([_entry("a", 1000), _entry("b", 900)])
+
+    delta = league_snapshot_delta(league, None)
+
+    assert delta == {"tier": "CHALLENGER", "queue": "RANKED_SOLO_5x5", "platform": "na1", "snapshot_type": "full",
+                     "entries": league["entries"], "removed_summoner_ids": []}
+
+
+def test_league_snapshot_delta_keeps_only_changes():
+    previous_entries = [_entry("a", 1000), _entry("b", 900), _entry("c", 800)]
+    league = _league([
+        _entry("a", 1000, hot_streak=True),  # only a field outside LEAGUE_DELTA_FIELDS changed
+        _entry("b", 920, wins=11),
+        _entry("d", 700),
+    ])
+
+    delta = league_snapshot_delta(league, previous_entries)
+
+    assert delta["snapshot_type"] == "delta"
+    assert delta["entries"] == [
+        {"summonerId": "b", "leaguePoints": 920, "wins": 11, "losses": 5},
+        _entry("d", 700),
+    ]
+    assert delta["removed_summoner_ids"] == ["c"]
+    assert delta["tier"] == "CHALLENGER"